@@ -42,6 +42,7 @@ def convert_town_center_to_VCD4():
 
     orig_file_name = "./etc/townCentreXVID_groundTruth.top"
     vcd = core.VCD()
+    object_data_list = []
     with open(orig_file_name, newline='') as csvfile:
         my_reader = csv.reader(csvfile, delimiter=',')
         for row in my_reader:
@@ -73,15 +74,13 @@ def convert_town_center_to_VCD4():
             if not vcd.has(core.ElementType.object, personNumber):
                 vcd.add_object(name="", semantic_type="Pedestrian",
                                uid=personNumber, frame_value=frameNumber)
-                if bodyValid:
-                        vcd.add_object_data(personNumber, body, frameNumber)
-                if headValid:
-                        vcd.add_object_data(personNumber, head, frameNumber)
-            else:
-                if bodyValid:
-                    vcd.add_object_data(personNumber, body, frameNumber)
-                if headValid:
-                    vcd.add_object_data(personNumber, head, frameNumber)
+            if bodyValid:
+                object_data_list.append((personNumber, body, frameNumber))
+            if headValid:
+                object_data_list.append((personNumber, head, frameNumber))
+
+    # All the boxes are added at once
+    vcd.add_object_data_batch(object_data_list)
 
     vcd_json_file_name = "./etc/vcd430_towncenter.json"
     vcd.save(vcd_json_file_name, False)
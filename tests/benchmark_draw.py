@@ -0,0 +1,41 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import time
+import vcd.scl as scl
+import vcd.draw as draw
+
+from test_draw import create_rig, create_images
+
+
+def benchmark_bev(topViewSize=(1024, 1024), num_frames=50):
+    # Frames per second of the BEV compositing of the rig, with float and with fixed-point remap tables
+    scene = scl.Scene(create_rig())
+    imgs = create_images()
+    for bev_fixed_point in [False, True]:
+        params = draw.TopView.Params(topViewSize=topViewSize, rangeX=(-20.0, 20.0), rangeY=(-20.0, 20.0),
+                                     bev_fixed_point=bev_fixed_point)
+        drawer = draw.TopView(scene, "vehicle-iso8855", params=params)
+        drawer.add_images(imgs, frameNum=0)
+
+        start = time.time()
+        for i in range(0, num_frames):
+            drawer.draw_BEVs(0)
+        elapsed = time.time() - start
+        print("draw_BEVs, bev_fixed_point=%s, %d cameras: %.1f fps" % (bev_fixed_point, len(imgs),
+                                                                      num_frames / elapsed))
+
+
+if __name__ == '__main__':
+    print("Running benchmark_draw.py...")
+    benchmark_bev()
@@ -0,0 +1,90 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import os
+import time
+import multiprocessing
+import numpy as np
+import cv2 as cv
+import vcd.types as types
+import vcd.poly2d as poly
+
+from test_poly2d import mapillary_path, get_label_contours
+
+
+def benchmark_chain_codes():
+    # Contours per second of the chain code encoders and decoders, on the contours of the Mapillary label images
+    contours = []
+    for img_name in sorted(os.listdir(mapillary_path + 'labels')):
+        contours += get_label_contours(img_name)
+    num_points = sum(len(contour) // 2 for contour in contours)
+
+    start = time.time()
+    rs6 = [poly.computeRS6FCC(contour) for contour in contours]
+    elapsed = time.time() - start
+    print("computeRS6FCC, %d contours (%d points): %.0f contours/s" % (len(contours), num_points,
+                                                                       len(contours) / elapsed))
+
+    start = time.time()
+    srf6 = [poly.computeSRF6DCC(contour) for contour in contours]
+    elapsed = time.time() - start
+    print("computeSRF6DCC: %.0f contours/s" % (len(contours) / elapsed))
+
+    start = time.time()
+    for chaincode, low, high, xinit, yinit in rs6:
+        poly.extractRS6FCC2Points(chaincode, xinit, yinit, low, high)
+    elapsed = time.time() - start
+    print("extractRS6FCC2Points: %.0f contours/s" % (len(contours) / elapsed))
+
+    start = time.time()
+    for chaincode, xinit, yinit in srf6:
+        poly.extractSRF6DCC2Points(chaincode, xinit, yinit)
+    elapsed = time.time() - start
+    print("extractSRF6DCC2Points: %.0f contours/s" % (len(contours) / elapsed))
+
+
+def benchmark_masks():
+    # Images per second of the conversion of the Mapillary instance masks to poly2d, and back, compared to reading them
+    img_names = sorted(os.listdir(mapillary_path + 'instances'))
+    start = time.time()
+    imgs = [cv.imread(mapillary_path + 'instances/' + img_name, cv.IMREAD_UNCHANGED) for img_name in img_names]
+    elapsed = time.time() - start
+    print("cv.imread, %d images: %.1f images/s" % (len(imgs), len(imgs) / elapsed))
+
+    start = time.time()
+    polys = [poly.encodeLabelMask(img, types.Poly2DType.MODE_POLY2D_RS6FCC) for img in imgs]
+    elapsed = time.time() - start
+    print("encodeLabelMask: %.1f images/s" % (len(imgs) / elapsed))
+
+    # Files read and encoded in a pool of processes
+    file_names = [mapillary_path + 'instances/' + img_name for img_name in img_names]
+    start = time.time()
+    for img_polys in poly.encodeLabelMasks(file_names, types.Poly2DType.MODE_POLY2D_RS6FCC):
+        pass
+    elapsed = time.time() - start
+    print("encodeLabelMasks (read and encode), %d processes: %.1f images/s" % (multiprocessing.cpu_count(),
+                                                                             len(imgs) / elapsed))
+
+    start = time.time()
+    for img, img_polys in zip(imgs, polys):
+        mask = np.zeros_like(img)
+        for label, label_polys in img_polys.items():
+            poly.drawPoly2D(mask, label_polys, label)
+    elapsed = time.time() - start
+    print("drawPoly2D: %.1f images/s" % (len(imgs) / elapsed))
+
+
+if __name__ == '__main__':
+    print("Running benchmark_poly2d.py...")
+    benchmark_chain_codes()
+    benchmark_masks()
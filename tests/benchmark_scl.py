@@ -0,0 +1,88 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import time
+import numpy as np
+
+import vcd.scl as scl
+
+
+def create_camera_radial(name="Camera1"):
+    # Radial distortion with a limit radius (see utils.get_distortion_radius)
+    return scl.CameraPinhole({'camera_matrix_3x4': [1000.0, 0.0, 640.0, 0.0,
+                                                    0.0, 1000.0, 480.0, 0.0,
+                                                    0.0, 0.0, 1.0, 0.0],
+                              'distortion_coeffs_1xN': [-0.4, 0.2, 0.0, 0.0, -0.05],
+                              'width_px': 1280, 'height_px': 960}, name, "", "")
+
+
+def r_limit_filter_loop(camera, points3d_4xN):
+    # Point by point filtering of the distortion radius (previous implementation)
+    idx_valid = points3d_4xN[2, :] > 1e-8
+    for i in range(0, points3d_4xN.shape[1]):
+        if idx_valid[i]:
+            xp = points3d_4xN[0, i] / points3d_4xN[2, i]
+            yp = points3d_4xN[1, i] / points3d_4xN[2, i]
+            if np.sqrt(xp * xp + yp * yp) >= camera.r_limit * 0.8:
+                idx_valid[i] = False
+    return idx_valid
+
+
+def r_limit_filter(camera, points3d_4xN):
+    # Vectorised filtering of the distortion radius, as done in CameraPinhole.project_points3d
+    idx_valid = points3d_4xN[2, :] > 1e-8
+    rays3d_3xN = np.full([3, points3d_4xN.shape[1]], np.nan)
+    rays3d_3xN[:, idx_valid] = points3d_4xN[0:3, idx_valid] / points3d_4xN[2, idx_valid]
+    xp = rays3d_3xN[0, :] / rays3d_3xN[2, :]
+    yp = rays3d_3xN[1, :] / rays3d_3xN[2, :]
+    r = np.sqrt(xp * xp + yp * yp)
+    idx_valid[r >= camera.r_limit * 0.8] = False
+    return idx_valid
+
+
+def benchmark_r_limit_filter(sizes=(10000, 100000, 1000000)):
+    # Old (point by point) vs new (vectorised) filtering of the distortion radius, on the same input
+    camera = create_camera_radial()
+    for n in sizes:
+        points3d_4xN = np.ones((4, n))
+        points3d_4xN[0:3, :] = np.random.uniform(-50, 50, (3, n))
+
+        start = time.time()
+        idx_valid_loop = r_limit_filter_loop(camera, points3d_4xN)
+        elapsed_loop = time.time() - start
+
+        start = time.time()
+        idx_valid = r_limit_filter(camera, points3d_4xN)
+        elapsed = time.time() - start
+
+        assert np.array_equal(idx_valid, idx_valid_loop)
+        print("r_limit filtering, %d points: loop %.3f s, vectorised %.3f s (x%.1f)"
+              % (n, elapsed_loop, elapsed, elapsed_loop / elapsed))
+
+
+def benchmark_project_points3d(sizes=(10000, 100000, 1000000)):
+    # Throughput of the whole CameraPinhole.project_points3d for point clouds of different sizes
+    camera = create_camera_radial()
+    for n in sizes:
+        points3d_4xN = np.ones((4, n))
+        points3d_4xN[0:3, :] = np.random.uniform(-50, 50, (3, n))
+        start = time.time()
+        camera.project_points3d(points3d_4xN)
+        elapsed = time.time() - start
+        print("project_points3d, %d points: %.3f s (%.1f Mpoints/s)" % (n, elapsed, n / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    print("Running benchmark_scl.py...")
+    benchmark_r_limit_filter()
+    benchmark_project_points3d()
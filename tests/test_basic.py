@@ -13,9 +13,12 @@ VCD is distributed under MIT License. See LICENSE.
 
 import unittest
 import os
+import json
+import numpy as np
 import vcd.core as core
 import vcd.schema as schema
 import vcd.types as types
+import vcd.jsonio as jsonio
 
 vcd_version_name = "vcd" + schema.vcd_schema_version.replace(".", "")
 
@@ -205,6 +208,90 @@ class TestBasic(unittest.TestCase):
 
         self.assertEqual(vcd_read.stringify(), vcd.stringify())
 
+    def test_add_object_data_batch(self):
+        # Detections of a tracker: some objects appear, disappear and re-appear
+        detections = []
+        for frame_num in range(0, 30):
+            for track_id in range(0, 4):
+                if (frame_num + track_id) % 7 != 0:
+                    detections.append((track_id, frame_num, frame_num * 10 + track_id))
+
+        vcd_a = core.VCD()
+        vcd_b = core.VCD()
+        for track_id in range(0, 4):
+            vcd_a.add_object(name='ped' + str(track_id), semantic_type='#Pedestrian', uid=track_id)
+            vcd_b.add_object(name='ped' + str(track_id), semantic_type='#Pedestrian', uid=track_id)
+            vcd_a.add_object_data(track_id, types.text('gender', 'unknown'))
+            vcd_b.add_object_data(track_id, types.text('gender', 'unknown'))
+
+        # One call per detection
+        for track_id, frame_num, x in detections:
+            vcd_a.add_object_data(track_id, types.bbox('body', (x, 0, 10, 20)), frame_num)
+            vcd_a.add_object_data(track_id, types.num('score', 0.5), frame_num)
+
+        # A single call
+        batch = []
+        for track_id, frame_num, x in detections:
+            batch.append((track_id, types.bbox('body', (x, 0, 10, 20)), frame_num))
+            batch.append((track_id, types.num('score', 0.5), frame_num))
+        vcd_b.add_object_data_batch(batch)
+
+        self.assertEqual(json.loads(vcd_a.stringify(False)), json.loads(vcd_b.stringify(False)))
+        self.assertEqual(vcd_b.get_object_data_frame_intervals(1, 'body').get(),
+                         [(0, 5), (7, 12), (14, 19), (21, 26), (28, 29)])
+        self.assertEqual(vcd_b.get_object_data(3, 'body', 8)['val'], (83, 0, 10, 20))
+
+    def test_indexes(self):
+        vcd = core.VCD()
+        vcd.set_use_indexes(True)
+        ont_uid = vcd.add_ontology("http://www.vicomtech.org/viulib/ontology")
+        for i in range(0, 100):
+            semantic_type = '#Car' if i % 2 == 0 else '#Pedestrian'
+            uid = vcd.add_object('obj' + str(i), semantic_type, frame_value=(i, i + 5),
+                                 ont_uid=ont_uid if i % 10 == 0 else None)
+            if i % 3 == 0:
+                vcd.add_object_data(uid, types.bbox('box', (0, 0, 10, 10)), frame_value=i)
+
+        self.assertEqual(vcd.get_object_uid_by_name('obj37'), '37')
+        self.assertEqual(vcd.get_object_uid_by_name('obj100'), None)
+        self.assertEqual(len(vcd.get_elements_of_type(core.ElementType.object, '#Car')), 50)
+        self.assertEqual(vcd.get_elements_with_ontology_uid(core.ElementType.object, ont_uid)[0:3], ['0', '10', '20'])
+        self.assertEqual(len(vcd.get_objects_with_object_data_name('box')), 34)
+
+        # Modifications through the API
+        vcd.add_object('obj37', '#Car', uid=37)
+        self.assertEqual(len(vcd.get_elements_of_type(core.ElementType.object, '#Car')), 51)
+        vcd.rm_object(0)
+        vcd.rm_object_by_type('#Pedestrian')
+        self.assertEqual(vcd.get_num_objects(), 50)
+        self.assertEqual(len(vcd.get_objects_with_object_data_name('box')), 16)
+        self.assertEqual(vcd.get_object_uid_by_name('obj0'), None)
+
+        # Direct modifications of the content
+        vcd.data['vcd']['objects']['2']['name'] = 'renamed'
+        self.assertEqual(vcd.get_object_uid_by_name('obj2'), None)
+        self.assertEqual(vcd.get_object_uid_by_name('renamed'), '2')  # indexes rebuilt, as obj2 was not valid
+        vcd.data['vcd']['objects']['4']['name'] = 'renamed4'
+        self.assertEqual(vcd.get_object_uid_by_name('renamed4'), '4')  # found by a scan, which rebuilds indexes
+        vcd.data['vcd']['objects']['6']['type'] = '#Bus'
+        self.assertEqual(vcd.get_elements_of_type(core.ElementType.object, '#Bus'), ['6'])
+        self.assertEqual(vcd.get_elements_of_type(core.ElementType.object, '#Bus'), ['6'])
+        vcd.data['vcd']['objects']['8']['object_data_pointers'] = {'mask': {'type': 'poly2d', 'frame_intervals': []}}
+        self.assertEqual(vcd.get_objects_with_object_data_name('mask'), ['8'])
+        vcd.data['vcd']['objects']['10']['type'] = '#Bus'
+        vcd.set_use_indexes(True)  # needed, as another Element has that type
+        self.assertEqual(vcd.get_elements_of_type(core.ElementType.object, '#Bus'), ['6', '10'])
+        vcd.data['vcd']['objects']['1000'] = {'name': 'obj1000', 'type': '#Truck'}
+        self.assertEqual(vcd.get_elements_of_type(core.ElementType.object, '#Truck'), ['1000'])
+
+        # Same results without indexes
+        vcd_no_indexes = core.VCD()
+        vcd_no_indexes.data = vcd.data
+        self.assertEqual(vcd_no_indexes.get_elements_of_type(core.ElementType.object, '#Car'),
+                         vcd.get_elements_of_type(core.ElementType.object, '#Car'))
+        self.assertEqual(vcd_no_indexes.get_objects_with_object_data_name('box'),
+                         vcd.get_objects_with_object_data_name('box'))
+
     def test_metadata(self):
         vcd = core.VCD()
         annotator = "Algorithm001"
@@ -343,6 +430,76 @@ class TestBasic(unittest.TestCase):
         #print(vcd_stringified)
         self.assertEqual(vcd_read_stringified, vcd_stringified)
 
+    def test_numpy_arrays(self):
+        # Numeric content can be held as numpy arrays, and is written as if it was given as lists
+        points3d_4xN = np.vstack((np.random.rand(3, 1000) * 10.0, np.ones((1, 1000))))
+        signals = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+        polygon3d = np.arange(12, dtype=float).reshape(4, 3)
+        polygon2d = np.array([[5, 5], [10, 5], [11, 6], [11, 8], [9, 10], [5, 10], [3, 8], [3, 6], [4, 5]],
+                             dtype=np.int32)
+
+        vcds = []
+        for use_arrays in [True, False]:
+            def val(array):
+                return array if use_arrays else array.ravel().tolist()
+            vcd = core.VCD()
+            uid = vcd.add_object(name="car1", semantic_type="car")
+            vcd.add_object_data(uid, types.mat("points", val(points3d_4xN), channels=1, width=1000, height=4,
+                                               dataType="float"), frame_value=0)
+            vcd.add_object_data(uid, types.vec("signals", val(signals)))
+            vcd.add_object_data(uid, types.poly3d("poly3d", val(polygon3d), closed=True))
+            vcd.add_object_data(uid, types.poly2d("poly2d", val(polygon2d), types.Poly2DType.MODE_POLY2D_ABSOLUTE,
+                                                  closed=False))
+            vcd.add_object_data(uid, types.poly2d("poly2d_rs6", val(polygon2d),
+                                                  types.Poly2DType.MODE_POLY2D_RS6FCC, closed=True))
+            vcds.append(vcd)
+
+        # Arrays are copied when added, and read back without copy
+        mat = vcds[0].get_object_data(uid, 'points', frame_num=0)
+        self.assertFalse(np.shares_memory(mat['val'], points3d_4xN))
+        mat_array = types.get_mat_array(mat)
+        self.assertEqual(mat_array.shape, (4, 1000))
+        self.assertTrue(np.shares_memory(mat_array, mat['val']))
+        poly3d = vcds[0].get_object_data(uid, 'poly3d')
+        self.assertTrue(np.shares_memory(types.get_poly3d_array(poly3d), poly3d['val']))
+
+        # So buffers reused for each frame don't modify the content already added
+        buffer = np.zeros((4, 2))
+        vcd = core.VCD()
+        uid_buffer = vcd.add_object(name="lidar", semantic_type="points")
+        for frame_num in range(0, 3):
+            buffer[:] = frame_num
+            vcd.add_object_data(uid_buffer, types.mat("points", buffer, channels=1, width=2, height=4,
+                                                      dataType="float"), frame_value=frame_num)
+            vcd.add_object_data(uid_buffer, types.vec("signal", buffer[0]), frame_value=frame_num)
+            vcd.add_object_data(uid_buffer, types.poly3d("poly3d", buffer[0:3].T, closed=True), frame_value=frame_num)
+            vcd.add_object_data(uid_buffer, types.poly2d("poly2d", buffer[0:2].T, types.Poly2DType.MODE_POLY2D_ABSOLUTE,
+                                                         closed=True), frame_value=frame_num)
+        for frame_num in range(0, 3):
+            for name in ['points', 'signal', 'poly3d', 'poly2d']:
+                val = vcd.get_object_data(uid_buffer, name, frame_num=frame_num)['val']
+                self.assertTrue(np.all(val == frame_num))
+        self.assertTrue(np.array_equal(types.get_vec_array(vcds[0].get_object_data(uid, 'signals')), signals))
+        for vcd in vcds:
+            self.assertTrue(np.array_equal(types.get_poly2d_array(vcd.get_object_data(uid, 'poly2d')), polygon2d))
+        self.assertEqual(types.get_poly2d_array(vcds[0].get_object_data(uid, 'poly2d_rs6')).shape, (15, 2))
+
+        # Same text with both JSON backends, and same content when loaded
+        backend = jsonio.BACKEND
+        try:
+            for backend_name in ['json', 'orjson'] if jsonio.orjson is not None else ['json']:
+                jsonio.set_backend(backend_name)
+                self.assertEqual(vcds[0].stringify(pretty=True, validate=True), vcds[1].stringify(pretty=True))
+                self.assertEqual(vcds[0].stringify_frame(0), vcds[1].stringify_frame(0))
+        finally:
+            jsonio.set_backend(backend)
+
+        vcds[0].save('./etc/test_numpy_arrays.json')
+        vcd_read = core.VCD('./etc/test_numpy_arrays.json', validation=True)
+        os.remove('./etc/test_numpy_arrays.json')
+        self.assertTrue(np.array_equal(types.get_mat_array(vcd_read.get_object_data(uid, 'points', frame_num=0)),
+                                       points3d_4xN))
+
 
 if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
     print("Running " + os.path.basename(__file__))
@@ -0,0 +1,321 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import os
+import shutil
+import warnings
+import numpy as np
+import cv2 as cv
+import vcd.core as core
+import vcd.types as types
+import vcd.utils as utils
+import vcd.scl as scl
+import vcd.draw as draw
+
+
+def create_rig():
+    # Vehicle with a front and a rear pinhole camera (see draw/vcd_draw_pinhole.py)
+    vcd = core.VCD()
+    vcd.add_coordinate_system("vehicle-iso8855", cs_type=types.CoordinateSystemType.local_cs)
+    T_scs_to_scsics = np.array([[0.0, -1.0, 0.0, 0.0],
+                                [0.0, 0.0, -1.0, 0.0],
+                                [1.0, 0.0, 0.0, 0.0],
+                                [0.0, 0.0, 0.0, 1.0]])
+    for cam_name, yaw_rad, C_lcs in [("CAM_FRONT", 0.0, [[2.3], [0.0], [1.3]]),
+                                     ("CAM_REAR", np.pi, [[-0.725], [0.0], [0.4]])]:
+        P_scs_wrt_lcs = utils.create_pose(utils.euler2R([yaw_rad, (10.0 * np.pi) / 180.0, 0.0]), np.array(C_lcs))
+        P_scs_wrt_lcs = utils.inv(T_scs_to_scsics.dot(utils.inv(P_scs_wrt_lcs)))
+        vcd.add_stream(stream_name=cam_name, uri="", description="Virtual camera", stream_type=core.StreamType.camera)
+        vcd.add_stream_properties(stream_name=cam_name,
+                                  intrinsics=types.IntrinsicsPinhole(
+                                      width_px=320, height_px=200,
+                                      camera_matrix_3x4=[200.0, 0.0, 160.0, 0.0, 0.0, 200.0, 100.0, 0.0,
+                                                         0.0, 0.0, 1.0, 0.0],
+                                      distortion_coeffs_1xN=[-0.4, 0.2, 0.0, 0.0, -0.05]))
+        vcd.add_coordinate_system(cam_name, cs_type=types.CoordinateSystemType.sensor_cs,
+                                  parent_name="vehicle-iso8855", pose_wrt_parent=list(P_scs_wrt_lcs.flatten()))
+    vcd.add_frame_properties(frame_num=0)
+    return vcd
+
+
+def create_images():
+    imgs = {}
+    for cam_name in ["CAM_FRONT", "CAM_REAR"]:
+        imgs[cam_name] = np.random.RandomState(len(cam_name)).randint(1, 256, (200, 320, 3)).astype(np.uint8)
+    return imgs
+
+
+def compute_maps_row_loop(scene, params, cam_name):
+    # Row by row projection of the top view, as reference
+    h = params.topViewSize[1]
+    w = params.topViewSize[0]
+    cam = scene.get_camera(cam_name)
+    mapX = np.zeros((h, w), dtype=np.float32)
+    mapY = np.zeros((h, w), dtype=np.float32)
+    weights = np.zeros((h, w), dtype=np.float32)
+    for i in range(0, h):
+        points2d_z0_3xN = np.array([np.linspace(0, w - 1, num=w), i * np.ones(w), np.ones(w)])
+        temp = utils.inv(params.S).dot(points2d_z0_3xN)
+        points3d_z0_4xN = np.vstack((temp[0, :], temp[1, :], np.zeros(w), temp[2, :]))
+        t_ref_to_cam_4x4, static = scene.get_transform("vehicle-iso8855", cam_name)
+        points3d_cam_4xN = t_ref_to_cam_4x4.dot(points3d_z0_4xN)
+        weights[i, :] = 1.0 / np.linalg.norm(points3d_cam_4xN, axis=0)
+        points2d_dist_3xN, idx_valid = cam.project_points3d(points3d_cam_4xN)
+        mapX[i, :] = points2d_dist_3xN[0, :]
+        mapY[i, :] = points2d_dist_3xN[1, :]
+    return mapX, mapY, weights
+
+
+def create_render_function(scene):
+    # Renders the bboxes of the objects in the image of CAM_FRONT (or in a black image)
+    drawer = draw.Image(scene, "CAM_FRONT")
+    params = draw.Image.Params(_colorMap={'Car': (0, 0, 255)})
+
+    def render(frame_num, img):
+        if img is None:
+            img = np.zeros((200, 320, 3), np.uint8)
+        drawer.draw(img, frame_num, _params=params)
+        return img
+    return render
+
+
+def draw_trajectory_loop(vcd, img, uid, frame_num):
+    # Frame by frame lines between the centers of the bboxes of an object, as reference
+    for name in ['box', 'box2']:
+        prev_center = None
+        for f in range(0, frame_num + 1):
+            bbox = vcd.get_object_data(uid, name, f)['val']
+            center = (int(round(bbox[0])), int(round(bbox[1])))
+            if prev_center is not None:
+                cv.line(img, prev_center, center, (0, 0, 0), 1, cv.LINE_AA)
+            prev_center = center
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_topview_maps(self):
+        scene = scl.Scene(create_rig())
+        params = draw.TopView.Params(topViewSize=(200, 100), rangeX=(-20.0, 20.0), rangeY=(-10.0, 10.0))
+        drawer = draw.TopView(scene, "vehicle-iso8855", params=params)
+        drawer.add_images(create_images(), frameNum=0)
+
+        weights_acc = np.zeros((100, 200), dtype=np.float32)
+        for cam_name in ["CAM_FRONT", "CAM_REAR"]:
+            mapX, mapY, weights = compute_maps_row_loop(scene, params, cam_name)
+            self.assertTrue(np.allclose(drawer.images[cam_name]['mapX'], mapX, equal_nan=True))
+            self.assertTrue(np.allclose(drawer.images[cam_name]['mapY'], mapY, equal_nan=True))
+            self.assertTrue(np.allclose(drawer.images[cam_name]['weights'][:, :, 0], weights))
+            self.assertEqual(drawer.images[cam_name]['weights'].shape, (100, 200, 3))
+            weights_acc += weights
+        self.assertTrue(np.allclose(drawer.images['weights_acc'][:, :, 2], weights_acc))
+
+        # With a single camera there are no weights
+        drawer = draw.TopView(scene, "vehicle-iso8855", params=params)
+        drawer.add_images({"CAM_FRONT": create_images()["CAM_FRONT"]}, frameNum=0)
+        self.assertFalse('weights' in drawer.images["CAM_FRONT"])
+        self.assertEqual(drawer.draw(frameNum=0).shape, (100, 200, 3))
+
+    def test_topview_maps_cache(self):
+        cache_dir = './etc/topview_maps_cache'
+        scene = scl.Scene(create_rig())
+        params = draw.TopView.Params(topViewSize=(200, 100), rangeX=(-20.0, 20.0), rangeY=(-10.0, 10.0),
+                                     maps_cache_dir=cache_dir)
+        drawer = draw.TopView(scene, "vehicle-iso8855", params=params)
+        drawer.add_images(create_images(), frameNum=0)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        topview = drawer.draw(frameNum=0)
+
+        # Maps of static cameras are read from the cache
+        drawer_cached = draw.TopView(scl.Scene(create_rig()), "vehicle-iso8855", params=params)
+        drawer_cached.add_images(create_images(), frameNum=0)
+        for cam_name in ["CAM_FRONT", "CAM_REAR"]:
+            for name in ['mapX', 'mapY', 'weights']:
+                self.assertTrue(np.array_equal(drawer_cached.images[cam_name][name], drawer.images[cam_name][name],
+                                               equal_nan=True))
+        self.assertTrue(np.array_equal(drawer_cached.draw(frameNum=0), topview))
+
+        # Truncated or corrupt cache files (e.g. written by a killed process) are computed and written again
+        cache_file_names = sorted(os.listdir(cache_dir))
+        with open(os.path.join(cache_dir, cache_file_names[0]), 'r+b') as file:
+            file.truncate(100)
+        with open(os.path.join(cache_dir, cache_file_names[1]), 'wb') as file:
+            file.write(b'not a npz file')
+        drawer_recomputed = draw.TopView(scl.Scene(create_rig()), "vehicle-iso8855", params=params)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            drawer_recomputed.add_images(create_images(), frameNum=0)
+            self.assertEqual(len([x for x in w if 'remap cache' in str(x.message)]), 2)
+        self.assertTrue(np.array_equal(drawer_recomputed.draw(frameNum=0), topview))
+        self.assertEqual(sorted(os.listdir(cache_dir)), cache_file_names)
+        drawer_cached = draw.TopView(scl.Scene(create_rig()), "vehicle-iso8855", params=params)
+        drawer_cached.add_images(create_images(), frameNum=0)
+        self.assertTrue(np.array_equal(drawer_cached.draw(frameNum=0), topview))
+
+        # Other ranges of the top view need other maps
+        params = draw.TopView.Params(topViewSize=(200, 100), rangeX=(-40.0, 40.0), rangeY=(-20.0, 20.0),
+                                     maps_cache_dir=cache_dir)
+        draw.TopView(scene, "vehicle-iso8855", params=params).add_images(create_images(), frameNum=0)
+        self.assertEqual(len(os.listdir(cache_dir)), 4)
+        shutil.rmtree(cache_dir)
+
+    def test_topview_bev_fixed_point(self):
+        scene = scl.Scene(create_rig())
+        imgs = create_images()
+        for cam_names in [["CAM_FRONT", "CAM_REAR"], ["CAM_REAR"]]:
+            topviews = []
+            for bev_fixed_point in [False, True]:
+                params = draw.TopView.Params(topViewSize=(200, 100), rangeX=(-20.0, 20.0), rangeY=(-10.0, 10.0),
+                                             draw_grid=False, bev_fixed_point=bev_fixed_point)
+                drawer = draw.TopView(scene, "vehicle-iso8855", params=params)
+                drawer.add_images({cam_name: imgs[cam_name] for cam_name in cam_names}, frameNum=0)
+                topviews.append(drawer.draw(frameNum=0).astype(int))
+                # Buffers are reused at each frame
+                self.assertTrue(np.array_equal(drawer.draw(frameNum=0), topviews[-1]))
+
+            # Fixed-point interpolation and normalised weights only differ in a few gray levels (except at the borders
+            # of the BEVs, where pixels can turn from black to background)
+            diff = np.abs(topviews[1] - topviews[0])
+            self.assertTrue(np.mean(diff > 8) < 0.005)
+            self.assertTrue(diff.mean() < 0.5)
+
+    def test_frame_renderer(self):
+        vcd = create_rig()
+        for i in range(0, 5):
+            uid = vcd.add_object(name='car' + str(i), semantic_type='Car')
+            for frame_num in range(0, 20):
+                vcd.add_object_data(uid, types.bbox('box', (20 * i + frame_num, 50, 30, 20)), frame_value=frame_num)
+        frame_nums = [3, 1, 2, 0] + list(range(4, 20))
+
+        # Processes return the frames in order, as rendered in a single process
+        rendered = list(draw.FrameRenderer(vcd, create_render_function, num_processes=1).render(frame_nums))
+        rendered_pool = list(draw.FrameRenderer(vcd, create_render_function, num_processes=2,
+                                                max_pending=3).render(frame_nums))
+        self.assertEqual([frame_num for frame_num, img in rendered_pool], frame_nums)
+        for (frame_num, img), (frame_num_pool, img_pool) in zip(rendered, rendered_pool):
+            self.assertTrue(np.array_equal(img, img_pool))
+        self.assertFalse(np.array_equal(rendered[0][1], rendered[1][1]))
+
+        # Several renderers in a single process don't share their render function
+        vcd_van = create_rig()
+        uid = vcd_van.add_object(name='van', semantic_type='Car')
+        for frame_num in range(0, 20):
+            vcd_van.add_object_data(uid, types.bbox('box', (200, 100, 40, 30)), frame_value=frame_num)
+        rendered_van = list(draw.FrameRenderer(vcd_van, create_render_function, num_processes=1).render(frame_nums))
+        rendered_both = zip(draw.FrameRenderer(vcd, create_render_function, num_processes=1).render(frame_nums),
+                            draw.FrameRenderer(vcd_van, create_render_function, num_processes=1).render(frame_nums))
+        for ((frame_num, img), (frame_num_van, img_van)), (frame_num_a, img_a), (frame_num_b, img_b) in zip(
+                rendered_both, rendered, rendered_van):
+            self.assertTrue(np.array_equal(img, img_a))
+            self.assertTrue(np.array_equal(img_van, img_b))
+        self.assertFalse(np.array_equal(rendered[0][1], rendered_van[0][1]))
+
+        # Input images
+        imgs = create_images()
+        renderer = draw.FrameRenderer(vcd, create_render_function, num_processes=2)
+        rendered_imgs = list(renderer.render((frame_num, imgs["CAM_FRONT"].copy()) for frame_num in frame_nums))
+        self.assertEqual(rendered_imgs[0][1][0, 0].tolist(), imgs["CAM_FRONT"][0, 0].tolist())
+        self.assertFalse(np.array_equal(rendered_imgs[0][1], imgs["CAM_FRONT"]))
+
+        # Image sequences and videos
+        os.makedirs('./etc/test_frame_renderer', exist_ok=True)
+        file_names = renderer.write_images('./etc/test_frame_renderer/img_%04d.png', frame_nums)
+        self.assertEqual(file_names[0], './etc/test_frame_renderer/img_0003.png')
+        self.assertEqual(len(os.listdir('./etc/test_frame_renderer')), 20)
+        self.assertEqual(renderer.write_video('./etc/test_frame_renderer/video.avi', frame_nums, fourcc='MJPG'), 20)
+        self.assertTrue(os.path.getsize('./etc/test_frame_renderer/video.avi') > 0)
+        shutil.rmtree('./etc/test_frame_renderer')
+
+    def test_trajectories(self):
+        vcd = create_rig()
+        uid = vcd.add_object(name='car', semantic_type='Car')
+        for frame_num in range(0, 30):
+            vcd.add_object_data(uid, types.bbox('box', (10 + 7 * frame_num + (frame_num % 3) * 2,
+                                                        50 + 3 * frame_num - (frame_num % 4), 30, 20)),
+                                frame_value=frame_num)
+            vcd.add_object_data(uid, types.bbox('box2', (100 + 3 * frame_num, 150 - 2 * frame_num, 30, 20)),
+                                frame_value=frame_num)
+        drawer = draw.Image(scl.Scene(vcd), "CAM_FRONT")
+
+        # Same lines as drawn frame by frame
+        for frame_num in [0, 1, 20, 29]:
+            img = np.full((200, 320, 3), 255, np.uint8)
+            drawer.draw_trajectory(img, uid, frame_num, None)
+            img_ref = np.full((200, 320, 3), 255, np.uint8)
+            draw_trajectory_loop(vcd, img_ref, uid, frame_num)
+            self.assertTrue(np.array_equal(img, img_ref))
+
+        # New frames of the object are taken into account
+        vcd.add_object_data(uid, types.bbox('box', (300, 190, 30, 20)), frame_value=30)
+        vcd.add_object_data(uid, types.bbox('box2', (10, 10, 30, 20)), frame_value=30)
+        img = np.full((200, 320, 3), 255, np.uint8)
+        drawer.draw_trajectory(img, uid, 30, None)
+        img_ref = np.full((200, 320, 3), 255, np.uint8)
+        draw_trajectory_loop(vcd, img_ref, uid, 30)
+        self.assertTrue(np.array_equal(img, img_ref))
+
+        # And also modified ones
+        vcd.add_object_data(uid, types.bbox('box', (150, 10, 30, 20)), frame_value=10)
+        img = np.full((200, 320, 3), 255, np.uint8)
+        drawer.draw_trajectory(img, uid, 30, None)
+        img_ref = np.full((200, 320, 3), 255, np.uint8)
+        draw_trajectory_loop(vcd, img_ref, uid, 30)
+        self.assertTrue(np.array_equal(img, img_ref))
+
+    def test_topview_trajectories(self):
+        vcd = core.VCD()
+        vcd.add_coordinate_system("odom", cs_type=types.CoordinateSystemType.scene_cs)
+        vcd.add_coordinate_system("vehicle-iso8855", cs_type=types.CoordinateSystemType.local_cs,
+                                  parent_name="odom", pose_wrt_parent=list(utils.identity(4).flatten()))
+        uid = vcd.add_object(name='car', semantic_type='Car')
+        for frame_num in range(0, 10):
+            odometry = utils.create_pose(utils.euler2R([0.05 * frame_num, 0.0, 0.0]),
+                                         np.array([[2.0 * frame_num, 0.5 * frame_num, 0.0]]).T)
+            vcd.add_transform(frame_num, transform=types.Transform(src_name="vehicle-iso8855", dst_name="odom",
+                                                                   transform_src_to_dst_4x4=list(odometry.flatten())))
+            vcd.add_object_data(uid, types.cuboid('box', (10.0, 1.0 + 0.2 * frame_num, 0.0, 0.0, 0.0, 0.0,
+                                                          4.0, 2.0, 1.5), coordinate_system="vehicle-iso8855"),
+                                frame_value=frame_num)
+        scene = scl.Scene(vcd)
+        params = draw.TopView.Params(topViewSize=(400, 200), rangeX=(0.0, 60.0), rangeY=(-15.0, 15.0),
+                                     colorMap={'Car': (0, 0, 255)}, draw_grid=False)
+        drawer = draw.TopView(scene, "odom", params=params)
+
+        # The centers of the cuboids, in odom at each frame, are drawn
+        for frame_num in [3, 9]:
+            topview = drawer.draw(frameNum=frame_num)
+            for f in range(0, frame_num + 1):
+                cuboid = vcd.get_object_data(uid, 'box', f)['val']
+                t_4x4, static = scene.get_transform("vehicle-iso8855", "odom", f)
+                center = utils.transform_cuboid(list(cuboid), t_4x4)[0:2]
+                pixel = drawer.point2Pixel(center)
+                self.assertEqual(topview[pixel[1], pixel[0]].tolist(), [0, 0, 255])
+
+        # Cuboids and transforms modified through the API are taken into account
+        vcd.add_object_data(uid, types.cuboid('box', (15.0, 3.0, 0.0, 0.0, 0.0, 0.0, 4.0, 2.0, 1.5),
+                                              coordinate_system="vehicle-iso8855"), frame_value=2)
+        odometry = utils.create_pose(utils.euler2R([0.0, 0.0, 0.0]), np.array([[30.0, 8.0, 0.0]]).T)
+        vcd.add_transform(4, transform=types.Transform(src_name="vehicle-iso8855", dst_name="odom",
+                                                       transform_src_to_dst_4x4=list(odometry.flatten())))
+        topview = drawer.draw(frameNum=9)
+        for f in [2, 4]:
+            cuboid = vcd.get_object_data(uid, 'box', f)['val']
+            t_4x4, static = scene.get_transform("vehicle-iso8855", "odom", f)
+            center = utils.transform_cuboid(list(cuboid), t_4x4)[0:2]
+            pixel = drawer.point2Pixel(center)
+            self.assertEqual(topview[pixel[1], pixel[0]].tolist(), [0, 0, 255])
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running " + os.path.basename(__file__))
+    unittest.main()
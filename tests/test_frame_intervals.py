@@ -0,0 +1,117 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import vcd.core as core
+import vcd.types as types
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_frame_intervals_fusion(self):
+        # Overlapping and consecutive intervals are fused, and the result is sorted
+        fis = core.FrameIntervals([(20, 25), (0, 5), (3, 7), (8, 10)])
+        self.assertEqual(fis.get(), [(0, 10), (20, 25)])
+        self.assertEqual(fis.get_dict(), [{'frame_start': 0, 'frame_end': 10}, {'frame_start': 20, 'frame_end': 25}])
+        self.assertEqual(fis.get_length(), 17)
+        self.assertEqual(fis.get_outer(), {'frame_start': 0, 'frame_end': 25})
+
+        fis_dict = core.FrameIntervals([{'frame_start': 4, 'frame_end': 6}, {'frame_start': 0, 'frame_end': 3}])
+        self.assertEqual(fis_dict.get(), [(0, 6)])
+
+    def test_frame_intervals_has_frame(self):
+        fis = core.FrameIntervals([(i * 10, i * 10 + 4) for i in range(0, 1000)])
+        self.assertEqual(len(fis.get()), 1000)
+        self.assertTrue(fis.has_frame(0))
+        self.assertTrue(fis.has_frame(4))
+        self.assertFalse(fis.has_frame(5))
+        self.assertTrue(fis.has_frame(9994))
+        self.assertFalse(fis.has_frame(9995))
+        self.assertFalse(fis.has_frame(-1))
+
+    def test_frame_intervals_set_algebra(self):
+        fis_a = core.FrameIntervals([(0, 10), (20, 30)])
+        fis_b = core.FrameIntervals([(5, 22), (40, 41)])
+
+        self.assertEqual(fis_a.union(fis_b).get(), [(0, 30), (40, 41)])
+        self.assertEqual(fis_a.intersection(fis_b).get(), [(5, 10), (20, 22)])
+        self.assertEqual(fis_a.union(core.FrameIntervals(11)).get(), [(0, 11), (20, 30)])
+        self.assertEqual(fis_a.difference(fis_b).get(), [(0, 4), (23, 30)])
+        self.assertEqual(fis_b.difference(fis_a).get(), [(11, 19), (40, 41)])
+        self.assertTrue(fis_a.contains(core.FrameIntervals((2, 4))))
+        self.assertFalse(fis_a.contains(fis_b))
+        self.assertTrue(core.FrameIntervals((21, 22)).is_contained_by(fis_a))
+        self.assertTrue(fis_a.equals(core.FrameIntervals([(20, 30), (0, 5), (6, 10)])))
+        self.assertTrue(fis_a.intersection(core.FrameIntervals((11, 19))).empty())
+
+    def test_frame_intervals_rm_frame(self):
+        fis = core.FrameIntervals([(0, 10), (20, 20)])
+        fis.rm_frame(5)
+        self.assertEqual(fis.get(), [(0, 4), (6, 10), (20, 20)])
+        fis.rm_frame(0)
+        fis.rm_frame(10)
+        fis.rm_frame(20)
+        fis.rm_frame(15)
+        self.assertEqual(fis.get(), [(1, 4), (6, 9)])
+
+    def test_vcd_frame_intervals_incremental(self):
+        vcd = core.VCD()
+        uid1 = vcd.add_object(name='car1', semantic_type='#Car')
+
+        # Detections arrive frame by frame, with some gaps
+        for frame_num in list(range(0, 100)) + list(range(200, 300)) + list(range(150, 160)):
+            vcd.add_object_data(uid=uid1, object_data=types.bbox('box', (0, 0, 10, 10)), frame_value=frame_num)
+        self.assertEqual(vcd.data['vcd']['frame_intervals'], [{'frame_start': 0, 'frame_end': 99},
+                                                              {'frame_start': 150, 'frame_end': 159},
+                                                              {'frame_start': 200, 'frame_end': 299}])
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 99), (150, 159), (200, 299)])
+
+        # Filling a gap fuses the neighbouring intervals
+        vcd.add_frame_properties(frame_num=100, properties={'weather': 'sunny'})
+        vcd.add_frame_properties(frame_num=101, properties={'weather': 'sunny'})
+        vcd.add_object(name='car2', semantic_type='#Car', frame_value=(102, 149))
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 159), (200, 299)])
+
+        # Removing frames keeps both representations in sync
+        uid3 = vcd.add_object(name='car3', semantic_type='#Car', frame_value=(400, 402))
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 159), (200, 299), (400, 402)])
+        vcd.rm_object(uid3)
+        self.assertEqual(vcd.data['vcd']['frame_intervals'], [{'frame_start': 0, 'frame_end': 159},
+                                                              {'frame_start': 200, 'frame_end': 299}])
+
+        # Direct manipulation of the content is also taken into account
+        vcd.data['vcd']['frame_intervals'] = [{'frame_start': 0, 'frame_end': 299}]
+        vcd.add_frame_properties(frame_num=300)
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 300)])
+
+        # Also if the list is modified in place
+        vcd.data['vcd']['frame_intervals'].append({'frame_start': 500, 'frame_end': 510})
+        vcd.add_frame_properties(frame_num=400)
+        self.assertEqual(vcd.data['vcd']['frame_intervals'], [{'frame_start': 0, 'frame_end': 300},
+                                                              {'frame_start': 400, 'frame_end': 400},
+                                                              {'frame_start': 500, 'frame_end': 510}])
+        vcd.data['vcd']['frame_intervals'][1]['frame_end'] = 420
+        vcd.add_frame_properties(frame_num=421)
+        vcd.add_frame_properties(frame_num=350)
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 300), (350, 350), (400, 421), (500, 510)])
+        vcd.data['vcd']['frame_intervals'][3:4] = [{'frame_start': 430, 'frame_end': 440}]
+        self.assertEqual(vcd.get_frame_intervals().get(), [(0, 300), (350, 350), (400, 421), (430, 440)])
+        vcd.data['vcd']['frame_intervals'][0]['frame_start'] = 10
+        vcd.add_frame_properties(frame_num=5)
+        self.assertEqual(vcd.data['vcd']['frame_intervals'][0:2], [{'frame_start': 5, 'frame_end': 5},
+                                                                   {'frame_start': 10, 'frame_end': 300}])
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running test_frame_intervals.py...")
+    unittest.main()
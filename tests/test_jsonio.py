@@ -0,0 +1,237 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import os
+import io
+import json
+import vcd.core as core
+import vcd.schema as schema
+import vcd.jsonio as jsonio
+import vcd.types as types
+
+vcd_version_name = "vcd" + schema.vcd_schema_version.replace(".", "")
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_load_frame_by_frame(self):
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        with open(vcd_file_name, 'r') as file:
+            data = json.load(file)
+
+        # Small chunks force values to be split across reads
+        data_read = jsonio.load(vcd_file_name, chunk_size=100)
+        self.assertEqual(list(data_read['vcd'].keys()), list(data['vcd'].keys()))
+        self.assertEqual(data_read['vcd']['objects'], data['vcd']['objects'])
+        self.assertEqual(list(data_read['vcd']['frames'].keys()), [int(key) for key in data['vcd']['frames']])
+        self.assertEqual(json.dumps(jsonio.as_json_frames(data_read)), json.dumps(data))
+
+        frame_nums = [frame_num for frame_num, frame in jsonio.iter_frames(vcd_file_name)]
+        self.assertEqual(frame_nums, list(data_read['vcd']['frames'].keys()))
+
+    def test_load_chunked(self):
+        # Large files are read chunk by chunk, decoding the values with orjson if available
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        with open(vcd_file_name, 'r') as file:
+            data = json.load(file)
+        max_size = jsonio.LOAD_AT_ONCE_MAX_SIZE
+        try:
+            jsonio.LOAD_AT_ONCE_MAX_SIZE = 0
+            self.assertEqual(json.dumps(jsonio.as_json_frames(jsonio.load(vcd_file_name))), json.dumps(data))
+        finally:
+            jsonio.LOAD_AT_ONCE_MAX_SIZE = max_size
+
+        # Values split across chunks, non-ASCII text, and values orjson can't decode
+        text = json.dumps({'vcd': {'a': 12345678, 'b': [1.5e-07, -3, None, True], 'cé': '€' * 50,
+                                   'd': {'e': float('nan'), 'f': [float('inf')]}, 'g': 'x\\"y' * 30, 'h': 7},
+                           'i': 'end'}, ensure_ascii=False)
+        for use_orjson in [False, True]:
+            for chunk_size in [1, 3, 7, 100, 4096]:
+                reader = jsonio.JSONChunkReader(io.StringIO(text), chunk_size, use_orjson=use_orjson)
+                self.assertEqual(json.dumps(reader.value(), ensure_ascii=False), text)
+
+    def test_load_frame_callback(self):
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        vcd = core.VCD(vcd_file_name, validation=True)
+
+        # Frames are passed to the callback, and not stored
+        frames = dict()
+
+        def callback(frame_num, frame):
+            frames[frame_num] = frame
+        vcd_static = core.VCD(vcd_file_name, frame_callback=callback)
+        self.assertEqual(vcd_static.get_frame(0), None)
+        self.assertEqual(vcd_static.get_num_objects(), vcd.get_num_objects())
+        self.assertEqual(frames, vcd.data['vcd']['frames'])
+
+    def test_load_lazy(self):
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        index_file_name = './etc/' + vcd_version_name + '_sample_3dod_lazy.idx'
+        vcd = core.VCD(vcd_file_name)
+
+        # Frames are not parsed while loading
+        vcd_lazy = core.VCD(vcd_file_name, lazy=True, frame_index_file=index_file_name)
+        frames = vcd_lazy.data['vcd']['frames']
+        self.assertIsInstance(frames, jsonio.LazyFrames)
+        self.assertEqual(list(frames.keys()), list(vcd.data['vcd']['frames'].keys()))
+        self.assertEqual(vcd_lazy.get_num_objects(), vcd.get_num_objects())
+
+        # Frames read by get_frame are cached, with a bounded size
+        frames.cache_size = 2
+        for frame_num in frames:
+            self.assertEqual(vcd_lazy.get_frame(frame_num), vcd.get_frame(frame_num))
+        self.assertEqual(len(frames.cache), 2)
+        self.assertEqual(vcd_lazy.get_frame(1000), None)
+
+        # The persisted index is reused
+        self.assertTrue(os.path.isfile(index_file_name))
+        vcd_lazy = core.VCD(vcd_file_name, lazy=True, frame_index_file=index_file_name)
+        os.remove(index_file_name)
+
+        # Modifications and serialization work as usual
+        self.assertEqual(vcd_lazy.stringify(False), vcd.stringify(False))
+        uid = '0'
+        vcd.add_object_data(uid, types.num('score', 0.5), frame_value=10)
+        vcd_lazy.add_object_data(uid, types.num('score', 0.5), frame_value=10)
+        vcd_lazy.data['vcd']['frames'].cache_size = 0
+        self.assertEqual(vcd_lazy.get_object_data(uid, 'score', frame_num=10), types.num('score', 0.5).data)
+        self.assertEqual(vcd_lazy.stringify(False), vcd.stringify(False))
+
+    def test_load_lazy_element_data(self):
+        # Element_data of lazy frames are looked up by name without keeping evicted frames in memory
+        vcd = core.VCD()
+        uid = vcd.add_object('face1', '#Face')
+        for frame_num in range(0, 5):
+            for i in range(0, 20):
+                vcd.add_object_data(uid, types.point2d('landmark' + str(i), (i, frame_num)), frame_num)
+        vcd.save('./etc/test_load_lazy_element_data.json')
+
+        vcd_lazy = core.VCD('./etc/test_load_lazy_element_data.json', lazy=True)
+        frames = vcd_lazy.data['vcd']['frames']
+        for cache_size in [0, 2]:
+            frames.cache_size = cache_size
+            for frame_num in range(0, 5):
+                self.assertEqual(vcd_lazy.get_object_data(uid, 'landmark7', frame_num)['val'], [7, frame_num])
+                self.assertEqual(vcd_lazy.get_object_data(uid, 'landmark19', frame_num)['val'], [19, frame_num])
+                self.assertTrue(all(key is None or key in frames.cache for key in vcd_lazy._VCD__ed_index))
+        os.remove('./etc/test_load_lazy_element_data.json')
+
+    def test_backends(self):
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        vcd = core.VCD(vcd_file_name)
+        backend = jsonio.BACKEND
+        try:
+            jsonio.set_backend('json')
+            vcd_json = core.VCD(vcd_file_name)
+            self.assertEqual(vcd_json.data, vcd.data)
+            stringified_pretty = vcd.stringify(pretty=True, validate=False)
+            stringified = vcd.stringify(pretty=False, validate=False)
+            frame = vcd.stringify_frame(0, pretty=True)
+
+            # Compact frames are written as json.dumps does by default, with all backends
+            frame_num = list(vcd.data['vcd']['frames'].keys())[0]
+            self.assertEqual(vcd.stringify_frame(frame_num), json.dumps(vcd.get_frame(frame_num)))
+            frame_static_dynamic = vcd.stringify_frame(frame_num, dynamic_only=False)
+            self.assertEqual(frame_static_dynamic, json.dumps(json.loads(frame_static_dynamic)))
+            if jsonio.orjson is not None:
+                jsonio.set_backend('orjson')
+                # Same text, except maybe the notation of floats, and same content
+                self.assertEqual(vcd.stringify(pretty=True, validate=False), stringified_pretty)
+                self.assertEqual(vcd.stringify_frame(0, pretty=True), frame)
+                self.assertEqual(vcd.stringify_frame(frame_num), json.dumps(vcd.get_frame(frame_num)))
+                self.assertEqual(json.loads(vcd.stringify(pretty=False, validate=False)), json.loads(stringified))
+                self.assertEqual(core.VCD(vcd_file_name).data, vcd.data)
+
+                # Content not supported by orjson falls back to the stdlib
+                self.assertEqual(jsonio.dumps({0: [2 ** 70]}), '{"0":[1180591620717411303424]}')
+            self.assertRaises(Exception, jsonio.set_backend, 'unknown')
+        finally:
+            jsonio.set_backend(backend)
+
+    def test_non_finite_floats(self):
+        # NaN and infinite floats are kept, with all backends
+        vcd = core.VCD()
+        uid = vcd.add_object('car1', 'car')
+        vcd.add_object_data(uid, types.vec('values', [float('nan'), float('inf'), -float('inf'), 1.0]))
+        vcd.add_object_data(uid, types.num('score', float('nan')), frame_value=0)
+        backend = jsonio.BACKEND
+        try:
+            for backend_name in ['json', 'orjson'] if jsonio.orjson is not None else ['json']:
+                jsonio.set_backend(backend_name)
+                text = vcd.stringify(pretty=False, validate=False)
+                self.assertIn('[NaN,Infinity,-Infinity,1.0]', text)
+                self.assertEqual(jsonio.dumps({'a': [1, None]}), '{"a":[1,null]}')
+
+                vcd.save('./etc/test_non_finite_floats.json')
+                for vcd_read in [core.VCD('./etc/test_non_finite_floats.json'),
+                                 core.VCD('./etc/test_non_finite_floats.json', lazy=True)]:
+                    self.assertEqual(vcd_read.stringify(pretty=False, validate=False), text)
+                os.remove('./etc/test_non_finite_floats.json')
+        finally:
+            jsonio.set_backend(backend)
+
+    def test_save_streaming(self):
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        vcd = core.VCD(vcd_file_name)
+        vcd.add_frame_properties(frame_num=500)  # an empty frame
+
+        # Saved text is the same as the stringified one
+        for pretty in [True, False]:
+            vcd.save('./etc/test_save_streaming.json', pretty=pretty, validate=True)
+            with open('./etc/test_save_streaming.json', 'r') as file:
+                self.assertEqual(file.read(), vcd.stringify(pretty=pretty, validate=False))
+
+        # Compressed files
+        vcd.save('./etc/test_save_streaming.json.gz')
+        vcd_read = core.VCD('./etc/test_save_streaming.json.gz', validation=True)
+        self.assertEqual(vcd_read.stringify(False), vcd.stringify(False))
+        frame_nums = [frame_num for frame_num, frame in jsonio.iter_frames('./etc/test_save_streaming.json.gz')]
+        self.assertEqual(frame_nums, list(vcd.data['vcd']['frames'].keys()))
+
+        # Lazy frames are written without keeping them
+        vcd_lazy = core.VCD('./etc/test_save_streaming.json', lazy=True)
+        vcd_lazy.data['vcd']['frames'].cache_size = 1
+        vcd_lazy.save('./etc/test_save_streaming_lazy.json')
+        self.assertEqual(len(vcd_lazy.data['vcd']['frames'].cache), 1)
+        self.assertEqual(core.VCD('./etc/test_save_streaming_lazy.json').stringify(False), vcd.stringify(False))
+
+        os.remove('./etc/test_save_streaming.json')
+        os.remove('./etc/test_save_streaming.json.gz')
+        os.remove('./etc/test_save_streaming_lazy.json')
+
+    def test_save_lazy_same_file(self):
+        # A lazy VCD can be saved into the file its frames are read from
+        vcd_file_name = './etc/' + vcd_version_name + '_sample_3dod.json'
+        vcd = core.VCD(vcd_file_name)
+        vcd.save('./etc/test_save_lazy_same_file.json')
+
+        vcd_lazy = core.VCD('./etc/test_save_lazy_same_file.json', lazy=True)
+        vcd_lazy.data['vcd']['frames'].cache_size = 1
+        vcd_lazy.add_object_data('0', types.num('score', 0.5), frame_value=10)
+        vcd.add_object_data('0', types.num('score', 0.5), frame_value=10)
+        for pretty in [True, False]:
+            vcd_lazy.save('./etc/test_save_lazy_same_file.json', pretty=pretty)
+            self.assertEqual(core.VCD('./etc/test_save_lazy_same_file.json').stringify(False),
+                             vcd.stringify(False))
+
+            # Frames not loaded yet are read from the new file
+            self.assertEqual(vcd_lazy.stringify(False), vcd.stringify(False))
+        self.assertEqual([name for name in os.listdir('./etc') if 'test_save_lazy_same_file' in name],
+                         ['test_save_lazy_same_file.json'])
+        os.remove('./etc/test_save_lazy_same_file.json')
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running " + os.path.basename(__file__))
+    unittest.main()
@@ -259,6 +259,54 @@ class TestBasic(unittest.TestCase):
         self.assertEqual(len(vcd.get_relation(uid_relation2)['rdf_objects']), 1)
 
 
+    def test_element_data_many_names(self):
+        # Objects with many element_data per frame are looked up by name through an index
+        vcd = core.VCD()
+        uid1 = vcd.add_object(name='face1', semantic_type='#Face')
+        for frame_num in range(0, 3):
+            for i in range(0, 20):
+                vcd.add_object_data(uid1, types.point2d('landmark' + str(i), (i, frame_num)), frame_num)
+                vcd.add_object_data(uid1, types.num('score' + str(i), 0.5), frame_num)
+        self.assertEqual(len(vcd.get_frame(1)['objects'][uid1]['object_data']['point2d']), 20)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark7', 2)['val'], (7, 2))
+        self.assertEqual(vcd.get_object_data(uid1, 'score19', 0)['val'], 0.5)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark20', 0), None)
+
+        # Substitution
+        vcd.add_object_data(uid1, types.point2d('landmark7', (70, 2)), 2)
+        self.assertEqual(len(vcd.get_frame(2)['objects'][uid1]['object_data']['point2d']), 20)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark7', 2)['val'], (70, 2))
+
+        # Removal shifts the positions of the remaining element_data
+        vcd.rm_element_data_from_frames_by_name(core.ElementType.object, core.UID(uid1), 'landmark3',
+                                                core.FrameIntervals((0, 2)))
+        self.assertEqual(len(vcd.get_frame(0)['objects'][uid1]['object_data']['point2d']), 19)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark3', 0), None)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark7', 2)['val'], (70, 2))
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark19', 1)['val'], (19, 1))
+
+        # Direct manipulation of the content is detected
+        vcd.get_frame(1)['objects'][uid1]['object_data']['point2d'].reverse()
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark19', 1)['val'], (19, 1))
+        del vcd.get_frame(1)['objects'][uid1]['object_data']['point2d'][0]
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark19', 1), None)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark18', 1)['val'], (18, 1))
+
+        # Names modified in place, and same names with other types
+        vcd.get_frame(2)['objects'][uid1]['object_data']['point2d'][4]['name'] = 'nose'
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark5', 2), None)  # the index is rebuilt
+        self.assertEqual(vcd.get_object_data(uid1, 'nose', 2)['val'], (5, 2))
+        vcd.add_object_data(uid1, types.point2d('nose', (50, 2)), 2)
+        self.assertEqual(len(vcd.get_frame(2)['objects'][uid1]['object_data']['point2d']), 19)
+        vcd.add_object_data(uid1, types.num('landmark9', 0.9), 2)
+        vcd.add_object_data(uid1, types.num('landmark9', 0.8), 2)
+        self.assertEqual(len(vcd.get_frame(2)['objects'][uid1]['object_data']['num']), 21)
+        self.assertEqual(vcd.get_object_data(uid1, 'landmark9', 2)['val'], (9, 2))
+
+        # Indexes of removed frames are dropped
+        vcd.rm_object(uid1)
+        self.assertEqual(vcd._VCD__ed_index, {})
+
 if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
     print("Running " + os.path.basename(__file__))
     unittest.main()
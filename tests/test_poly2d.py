@@ -0,0 +1,202 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import os
+import json
+import numpy as np
+import cv2 as cv
+import vcd.core as core
+import vcd.types as types
+import vcd.poly2d as poly
+
+mapillary_path = '../converters/mapillaryConverter/'
+
+
+def get_label_contours(img_name):
+    # Contours of all the classes of a Mapillary label image
+    with open(mapillary_path + 'config.json') as file:
+        labels = json.load(file)['labels']
+    img = cv.imread(mapillary_path + 'labels/' + img_name)
+    contours_all = []
+    for label in labels:
+        color = tuple(label['color'][::-1])
+        seg = cv.inRange(img, color, color)
+        if cv.countNonZero(seg):
+            contours, hierarchy = cv.findContours(seg, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
+            contours_all += [contour.flatten().tolist() for contour in contours]
+    return contours_all
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_chain_codes(self):
+        # Reference encodings, obtained with the original (per-pixel) implementation of the encoders
+        with open('./etc/poly2d_chain_codes_reference.json') as file:
+            reference = json.load(file)
+
+        contours = get_label_contours(reference['image'])
+        self.assertEqual(len(contours), len(reference['rs6']))
+        cases = [(contour, reference['rs6'][i], reference['srf6'][i]) for i, contour in enumerate(contours)]
+        cases += [(case['coords'], case['rs6'], case['srf6']) for case in reference['synthetic']]
+
+        for coords, val_rs6, val_srf6 in cases:
+            rs6 = types.poly2d('rs6', coords, types.Poly2DType.MODE_POLY2D_RS6FCC, closed=True)
+            srf6 = types.poly2d('srf6', coords, types.Poly2DType.MODE_POLY2D_SRF6DCC, closed=True)
+            self.assertEqual(rs6.data['val'], val_rs6)
+            self.assertEqual(srf6.data['val'], val_srf6)
+
+            # Decoded polygons start at the initial point, and encode again to the same polygons (the chain codes
+            # can differ, as the vertices of the decoded polygons are not the original ones)
+            x, y, low, high, rest, encoded = val_rs6
+            points = poly.getVecFromEncodedRS6(int(x), int(y), int(low), int(high), int(rest), encoded)
+            self.assertEqual(points[0:2], [int(x), int(y)])
+            x, y, low, high, rest, encoded = types.poly2d('rs6', points, types.Poly2DType.MODE_POLY2D_RS6FCC,
+                                                          closed=True).data['val']
+            self.assertEqual(poly.getVecFromEncodedRS6(int(x), int(y), int(low), int(high), int(rest), encoded),
+                             points)
+
+            x, y, rest, encoded = val_srf6
+            points = poly.getVecFromEncodedSRF6(int(x), int(y), int(rest), encoded)
+            self.assertEqual(points[0:2], [int(x), int(y)])
+            x, y, rest, encoded = types.poly2d('srf6', points, types.Poly2DType.MODE_POLY2D_SRF6DCC,
+                                               closed=True).data['val']
+            self.assertEqual(poly.getVecFromEncodedSRF6(int(x), int(y), int(rest), encoded), points)
+
+    def test_base64(self):
+        # 3 bits digits are packed in pairs, padded with zeros
+        chaincode = [0, 1, 2, 3, 4, 5, 7]
+        encoded, rest = poly.chainCodeBase64Encoder(chaincode, 3)
+        self.assertEqual((encoded, rest), ("BTl4", 1))
+        self.assertEqual(chaincode, [0, 1, 2, 3, 4, 5, 7])  # not modified
+        self.assertEqual(poly.chainCodeBase64Decoder(encoded, 3, rest), chaincode)
+
+        for bits in [1, 2, 3]:
+            chaincode = [(i * 7 + i // 3) % (2 ** bits) for i in range(0, 1001)]
+            encoded, rest = poly.chainCodeBase64Encoder(chaincode, bits)
+            self.assertEqual(len(encoded), -(-len(chaincode) * bits // 6))
+            self.assertEqual(poly.chainCodeBase64Decoder(encoded, bits, rest), chaincode)
+        self.assertEqual(poly.chainCodeBase64Encoder([], 3), ("", 0))
+        self.assertEqual(poly.chainCodeBase64Decoder("", 3, 0), [])
+
+    def test_masks(self):
+        # Mask of labels with holes, and labels inside the holes
+        mask = np.zeros((120, 160), np.uint16)
+        cv.rectangle(mask, (10, 10), (100, 90), 3, thickness=-1)
+        cv.circle(mask, (55, 50), 25, 0, thickness=-1)
+        cv.circle(mask, (55, 50), 10, 3, thickness=-1)
+        cv.rectangle(mask, (50, 20), (60, 30), 700, thickness=-1)
+        cv.fillPoly(mask, [np.array([[110, 5], [155, 40], [120, 110], [140, 50]], np.int32)], 1)
+
+        for mode in [types.Poly2DType.MODE_POLY2D_RS6FCC, types.Poly2DType.MODE_POLY2D_SRF6DCC,
+                     types.Poly2DType.MODE_POLY2D_ABSOLUTE]:
+            polys = poly.encodeLabelMask(mask, mode)
+            self.assertEqual(list(polys.keys()), [1, 3, 700])
+            self.assertEqual(len(polys[3]), 3)  # outer contour, hole, and the circle in the hole
+            self.assertTrue(all(p.data['mode'] == mode.name and 'hierarchy' in p.data for p in polys[3]))
+
+            mask_out = np.zeros_like(mask)
+            for label, label_polys in polys.items():
+                poly.drawPoly2D(mask_out, label_polys, label)
+            self.assertTrue(np.array_equal(mask_out, mask))
+
+        # Binary masks, and labels not in the mask
+        polys = poly.encodeMask(mask == 3, types.Poly2DType.MODE_POLY2D_RS6FCC)
+        self.assertEqual([p.data['name'] for p in polys], ['contour0', 'contour1', 'contour2'])
+        polys = poly.encodeLabelMask(mask, types.Poly2DType.MODE_POLY2D_RS6FCC, labels=[700, 5])
+        self.assertEqual(list(polys.keys()), [700, 5])
+        self.assertEqual(polys[5], [])
+
+        # Poly2d from a VCD are rasterised from their data
+        vcd = core.VCD()
+        img = cv.imread(mapillary_path + 'instances/-4jzRzGfKmQg8RBNlNqnGQ.png', cv.IMREAD_UNCHANGED)
+        for label, label_polys in poly.encodeLabelMask(img, types.Poly2DType.MODE_POLY2D_SRF6DCC).items():
+            uid = vcd.add_object('', str(label))
+            for p in label_polys:
+                vcd.add_object_data(uid, p)
+        data = json.loads(vcd.stringify(False))
+        img_out = np.zeros_like(img)
+        for object_val in data['vcd']['objects'].values():
+            poly.drawPoly2D(img_out, object_val['object_data']['poly2d'], int(object_val['type']))
+        self.assertTrue(np.array_equal(img_out, img))
+
+    def test_masks_mixed(self):
+        # Polygons of several calls to encodeMask are drawn with the hierarchy of each call
+        mask_a = np.zeros((100, 100), np.uint8)
+        cv.rectangle(mask_a, (5, 5), (60, 60), 255, thickness=-1)
+        cv.rectangle(mask_a, (20, 20), (40, 40), 0, thickness=-1)
+        cv.rectangle(mask_a, (70, 70), (90, 90), 255, thickness=-1)
+        mask_b = np.zeros((100, 100), np.uint8)
+        cv.circle(mask_b, (70, 30), 20, 255, thickness=-1)
+        cv.circle(mask_b, (70, 30), 8, 0, thickness=-1)
+        polys_a = poly.encodeMask(mask_a, types.Poly2DType.MODE_POLY2D_SRF6DCC)
+        polys_b = poly.encodeMask(mask_b, types.Poly2DType.MODE_POLY2D_RS6FCC)
+        polys_c = [types.poly2d('square', [2, 80, 12, 80, 12, 90, 2, 90], types.Poly2DType.MODE_POLY2D_ABSOLUTE,
+                                closed=True)]
+        for polys in [polys_b + polys_a, polys_a + polys_c + polys_b, polys_c + polys_b + polys_a]:
+            mask_out = poly.drawPoly2D(np.zeros((100, 100), np.uint8), polys)
+            mask_expected = np.zeros((100, 100), np.uint8)
+            for polys_x in [polys_a, polys_b, polys_c]:
+                if polys_x[0] in polys:
+                    poly.drawPoly2D(mask_expected, polys_x)
+            self.assertTrue(np.array_equal(mask_out, mask_expected))
+        self.assertEqual(cv.countNonZero(poly.drawPoly2D(np.zeros((100, 100), np.uint8), polys_a) != mask_a), 0)
+
+        # Inconsistent hierarchies are ignored, so the holes are filled
+        polys = [dict(p.data, hierarchy=[5, -1, -1, -1]) for p in polys_a]
+        mask_out = poly.drawPoly2D(np.zeros((100, 100), np.uint8), polys)
+        self.assertEqual(mask_out[30, 30], 255)
+
+    def test_masks_parallel(self):
+        # VCD built from masks encoded in a pool of processes are the same as those built sequentially
+        file_names = [mapillary_path + 'instances/' + img_name
+                      for img_name in sorted(os.listdir(mapillary_path + 'instances'))[0:4]]
+        vcd_strings = []
+        for num_processes in [1, 2]:
+            vcd = core.VCD()
+            for frame_num, polys in enumerate(poly.encodeLabelMasks(file_names, types.Poly2DType.MODE_POLY2D_RS6FCC,
+                                                                    num_processes=num_processes, max_pending=1)):
+                for label, label_polys in polys.items():
+                    uid = vcd.add_object('', str(label), frame_value=frame_num)
+                    for p in label_polys:
+                        vcd.add_object_data(uid, p, frame_value=frame_num)
+            vcd_strings.append(vcd.stringify(False))
+        self.assertEqual(vcd_strings[0], vcd_strings[1])
+
+        # Polygons encoded in chunks
+        contours = get_label_contours(sorted(os.listdir(mapillary_path + 'labels'))[0])
+        hierarchies = [[idx, -1, -1, -1] for idx in range(0, len(contours))]
+        polys = poly.encodePolygons(contours, types.Poly2DType.MODE_POLY2D_SRF6DCC, hierarchies=hierarchies,
+                                    num_processes=2, chunk_size=50)
+        self.assertEqual(len(polys), len(contours))
+        for idx, p in enumerate(polys):
+            self.assertEqual(p.data, types.poly2d('contour' + str(idx), contours[idx],
+                                                  types.Poly2DType.MODE_POLY2D_SRF6DCC, closed=True,
+                                                  hierarchy=hierarchies[idx]).data)
+
+    def test_chain_codes_degenerate(self):
+        # A single point, and a polygon which goes back over its own path
+        for coords in [[3, 4], [0, 0, 5, 0, 0, 0]]:
+            rs6, low, high, xinit, yinit = poly.computeRS6FCC(coords)
+            self.assertEqual((xinit, yinit), (coords[0], coords[1]))
+            points = poly.extractRS6FCC2Points(rs6, xinit, yinit, low, high)
+            self.assertEqual(points[0:2], coords[0:2])
+
+            srf6, xinit, yinit = poly.computeSRF6DCC(coords)
+            points = poly.extractSRF6DCC2Points(srf6, xinit, yinit)
+            self.assertEqual(points[0:2], coords[0:2])
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running " + os.path.basename(__file__))
+    unittest.main()
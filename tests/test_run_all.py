@@ -33,7 +33,13 @@ os.system("python test_basic.py && "
           "python test_stream_frame_properties.py &&"
           "python test_action_properties.py &&"
           "python test_semantics.py &&"
-          "python test_modify.py")
+          "python test_modify.py &&"
+          "python test_frame_intervals.py &&"
+          "python test_jsonio.py &&"
+          "python test_validation.py &&"
+          "python test_scl.py &&"
+          "python test_draw.py &&"
+          "python test_poly2d.py")
 
 # Clean existing json or txt files at etc
 #dir_name = "./etc/"
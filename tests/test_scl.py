@@ -0,0 +1,196 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import os
+import numpy as np
+import vcd.core as core
+import vcd.types as types
+import vcd.utils as utils
+import vcd.scl as scl
+
+
+def create_setup():
+    vcd = core.VCD()
+    vcd.add_coordinate_system("odom", cs_type=types.CoordinateSystemType.scene_cs)
+    vcd.add_coordinate_system("vehicle-iso8855", cs_type=types.CoordinateSystemType.local_cs,
+                              parent_name="odom",
+                              pose_wrt_parent=list(utils.create_pose(utils.identity(3), np.array([[1.0, 0.0, 0.0]]).T)
+                                                   .flatten()))
+    vcd.add_coordinate_system("Camera1", cs_type=types.CoordinateSystemType.sensor_cs,
+                              parent_name="vehicle-iso8855",
+                              pose_wrt_parent=list(utils.create_pose(utils.euler2R([0.1, 0.2, 0.3]),
+                                                                     np.array([[2.0, 0.5, 1.5]]).T).flatten()))
+    vcd.add_coordinate_system("Camera2", cs_type=types.CoordinateSystemType.sensor_cs,
+                              parent_name="vehicle-iso8855",
+                              pose_wrt_parent=list(utils.create_pose(utils.euler2R([-0.1, 0.2, 0.0]),
+                                                                     np.array([[2.0, -0.5, 1.5]]).T).flatten()))
+    return vcd
+
+
+def create_camera_radial(name="Camera1"):
+    # Radial distortion with a limit radius (see utils.get_distortion_radius)
+    return scl.CameraPinhole({'camera_matrix_3x4': [1000.0, 0.0, 640.0, 0.0,
+                                                    0.0, 1000.0, 480.0, 0.0,
+                                                    0.0, 0.0, 1.0, 0.0],
+                              'distortion_coeffs_1xN': [-0.4, 0.2, 0.0, 0.0, -0.05],
+                              'width_px': 1280, 'height_px': 960}, name, "", "")
+
+
+def project_points3d_r_limit_loop(camera, points3d_4xN):
+    # Point by point filtering of the distortion radius, as reference
+    idx_valid = points3d_4xN[2, :] > 1e-8
+    for i in range(0, points3d_4xN.shape[1]):
+        if idx_valid[i]:
+            xp = points3d_4xN[0, i] / points3d_4xN[2, i]
+            yp = points3d_4xN[1, i] / points3d_4xN[2, i]
+            if np.sqrt(xp * xp + yp * yp) >= camera.r_limit * 0.8:
+                idx_valid[i] = False
+    return idx_valid
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_transform_chain(self):
+        vcd = create_setup()
+        scene = scl.Scene(vcd)
+
+        # Camera1 -> vehicle -> Camera2 (through the common parent)
+        pose_1 = np.array(vcd.data['vcd']['coordinate_systems']['Camera1']['pose_wrt_parent']).reshape(4, 4)
+        pose_2 = np.array(vcd.data['vcd']['coordinate_systems']['Camera2']['pose_wrt_parent']).reshape(4, 4)
+        t_4x4, static = scene.get_transform("Camera1", "Camera2")
+        self.assertTrue(static)
+        self.assertTrue(np.allclose(t_4x4, utils.inv(pose_2).dot(pose_1)))
+
+        # Returned transforms are copies of the cached ones
+        t_4x4[0, 0] = 100
+        self.assertTrue(np.allclose(scene.get_transform("Camera1", "Camera2")[0], utils.inv(pose_2).dot(pose_1)))
+        t_inv, static = scene.get_transform("Camera2", "odom")
+        self.assertTrue(np.allclose(t_inv, utils.inv(scene.get_transform("odom", "Camera2")[0])))
+
+        # Changes in the coordinate systems are taken into account
+        vcd.add_coordinate_system("Camera2", cs_type=types.CoordinateSystemType.sensor_cs,
+                                  parent_name="odom", pose_wrt_parent=list(pose_2.flatten()))
+        t_4x4, static = scene.get_transform("Camera1", "Camera2")
+        pose_vehicle = np.array(vcd.data['vcd']['coordinate_systems']['vehicle-iso8855']['pose_wrt_parent'])
+        self.assertTrue(np.allclose(t_4x4, utils.inv(pose_2).dot(pose_vehicle.reshape(4, 4)).dot(pose_1)))
+
+        # Transforms at frames
+        odometry = utils.create_pose(utils.identity(3), np.array([[5.0, 0.0, 0.0]]).T)
+        vcd.add_transform(3, transform=types.Transform(src_name="vehicle-iso8855", dst_name="odom",
+                                                       transform_src_to_dst_4x4=list(odometry.flatten())))
+        t_4x4, static = scene.get_transform("Camera1", "odom", frameNum=3)
+        self.assertFalse(static)
+        self.assertTrue(np.allclose(t_4x4, odometry.dot(pose_1)))
+        t_4x4, static = scene.get_transform("odom", "Camera1", frameNum=3)
+        self.assertTrue(np.allclose(t_4x4, utils.inv(odometry.dot(pose_1))))
+        t_4x4, static = scene.get_transform("Camera1", "odom", frameNum=4)
+        self.assertTrue(static)
+        self.assertTrue(np.allclose(t_4x4, pose_vehicle.reshape(4, 4).dot(pose_1)))
+
+    def test_transform_cache_frames(self):
+        vcd = create_setup()
+        scene = scl.Scene(vcd)
+        pose_1 = np.array(vcd.data['vcd']['coordinate_systems']['Camera1']['pose_wrt_parent']).reshape(4, 4)
+        for frame_num in range(0, 5):
+            odometry = utils.create_pose(utils.identity(3), np.array([[float(frame_num), 0.0, 0.0]]).T)
+            vcd.add_transform(frame_num, transform=types.Transform(src_name="vehicle-iso8855", dst_name="odom",
+                                                                   transform_src_to_dst_4x4=list(odometry.flatten())))
+            for i in range(0, 3):  # cached after the first time
+                t_4x4, static = scene.get_transform("Camera1", "odom", frameNum=frame_num)
+                self.assertFalse(static)
+                self.assertTrue(np.allclose(t_4x4, odometry.dot(pose_1)))
+
+        # Modifying the transforms of a frame invalidates the cached ones
+        odometry = utils.create_pose(utils.euler2R([0.5, 0.0, 0.0]), np.array([[1.0, 2.0, 0.0]]).T)
+        vcd.add_transform(2, transform=types.Transform(src_name="vehicle-iso8855", dst_name="odom",
+                                                       transform_src_to_dst_4x4=list(odometry.flatten())))
+        t_4x4, static = scene.get_transform("Camera1", "odom", frameNum=2)
+        self.assertTrue(np.allclose(t_4x4, odometry.dot(pose_1)))
+        t_4x4, static = scene.get_transform("odom", "Camera2", frameNum=2)
+        pose_2 = np.array(vcd.data['vcd']['coordinate_systems']['Camera2']['pose_wrt_parent']).reshape(4, 4)
+        self.assertTrue(np.allclose(t_4x4, utils.inv(pose_2).dot(utils.inv(odometry))))
+
+    def test_transforms_batch(self):
+        vcd = create_setup()
+        scene = scl.Scene(vcd)
+        for frame_num in range(0, 10, 2):
+            odometry = utils.create_pose(utils.euler2R([0.1 * frame_num, 0.0, 0.0]),
+                                         np.array([[float(frame_num), 1.0, 0.0]]).T)
+            vcd.add_transform(frame_num, transform=types.Transform(src_name="odom", dst_name="vehicle-iso8855",
+                                                                   transform_src_to_dst_4x4=list(odometry.flatten())))
+
+        # Same transforms as frame by frame, for frames with and without transforms
+        t_4x4xN, static = scene.get_transforms("Camera1", "odom", (0, 11))
+        self.assertEqual(t_4x4xN.shape, (4, 4, 12))
+        for frame_num in range(0, 12):
+            t_4x4, static_frame = scene.get_transform("Camera1", "odom", frameNum=frame_num)
+            self.assertTrue(np.allclose(t_4x4xN[:, :, frame_num], t_4x4))
+            self.assertEqual(static[frame_num], static_frame)
+            self.assertEqual(static_frame, frame_num % 2 == 1 or frame_num >= 10)
+        t_4x4xN, static = scene.get_transforms("odom", "odom", [(0, 2), (5, 6)])
+        self.assertTrue(np.allclose(t_4x4xN, np.tile(np.identity(4)[:, :, None], (1, 1, 5))))
+
+        # Points of several frames at once
+        points3d_4xN = np.array([[1.0, 2.0, 3.0, 4.0], [0.0, 1.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0], [1.0, 1.0, 1.0, 1.0]])
+        frame_nums = [4, 0, 4, 7]
+        points3d_dst_4xN = scene.transform_points3d_4xN_frames(points3d_4xN, frame_nums, "Camera1", "odom")
+        for i, frame_num in enumerate(frame_nums):
+            point3d_dst_4x1 = scene.transform_points3d_4xN(points3d_4xN[:, i:i + 1], "Camera1", "odom", frame_num)
+            self.assertTrue(np.allclose(points3d_dst_4xN[:, i:i + 1], point3d_dst_4x1))
+
+    def test_project_points3d_distortion_radius(self):
+        camera = create_camera_radial()
+        self.assertIsNotNone(camera.r_limit)
+        np.random.seed(0)
+        points3d_4xN = np.ones((4, 1000))
+        points3d_4xN[0:3, :] = np.random.uniform(-10, 10, (3, 1000))
+
+        points2d_3xN, idx_valid = camera.project_points3d(points3d_4xN)
+        idx_valid_loop = project_points3d_r_limit_loop(camera, points3d_4xN)
+        self.assertTrue(np.array_equal(idx_valid, idx_valid_loop))
+        self.assertTrue(np.all(np.isnan(points2d_3xN[:, ~idx_valid])))
+        self.assertFalse(np.any(np.isnan(points2d_3xN[:, idx_valid])))
+        self.assertTrue(0 < np.count_nonzero(idx_valid) < np.count_nonzero(points3d_4xN[2, :] > 0))
+
+    def test_reproject_points2d(self):
+        # Rays through the origin and a plane, including rays parallel to it
+        rays3d_3xN = np.array([[0.0, 1.0, -2.0, 1.0], [1.0, 1.0, 3.0, 0.0], [1.0, 2.0, 1.0, 0.0]])
+        plane = (0.0, 1.0, 0.0, -1.5)
+        points3d_4xN, idx_valid = utils.intersect_rays3d_plane(rays3d_3xN, plane)
+        self.assertEqual(idx_valid.tolist(), [True, True, True, False])
+        for i in range(0, 3):
+            # Plucker intersection, as reference
+            P1 = np.array([[0.0], [0.0], [0.0], [1.0]])
+            P2 = np.vstack((rays3d_3xN[:, i:i + 1], [[1.0]]))
+            point3d_4x1 = (P1.dot(P2.T) - P2.dot(P1.T)).dot(np.array(plane).reshape(4, 1))
+            self.assertTrue(np.allclose(points3d_4xN[:, i], point3d_4x1[:, 0] / point3d_4x1[3, 0]))
+            self.assertAlmostEqual(np.dot(plane, points3d_4xN[:, i]), 0.0)
+        self.assertTrue(np.allclose(points3d_4xN[:, 3], [1.0, 0.0, 0.0, 0.0]))
+
+        # Reprojection of a grid of pixels into the ground, and back
+        camera = create_camera_radial()
+        xs, ys = np.meshgrid(np.arange(0, 1280, 40), np.arange(0, 960, 40))
+        points2d_3xN = np.vstack((xs.flatten(), ys.flatten(), np.ones(xs.size)))
+        points3d_4xN, idx_valid = camera.reproject_points2d(points2d_3xN, (0.0, 1.0, 0.0, -1.5),
+                                                            apply_undistorsion=False)
+        self.assertTrue(np.all(idx_valid))
+        points2d_re_3xN, idx_valid_re = camera.project_points3d(points3d_4xN[:, ys.flatten() > 480],
+                                                                apply_distortion=False)
+        self.assertTrue(np.allclose(points2d_re_3xN[0:2, :] / points2d_re_3xN[2, :],
+                                    points2d_3xN[0:2, ys.flatten() > 480]))
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running " + os.path.basename(__file__))
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import unittest
+import os
+from jsonschema.exceptions import ValidationError
+import vcd.core as core
+import vcd.types as types
+import vcd.schema as schema
+import vcd.validation as validation
+
+vcd_version_name = "vcd" + schema.vcd_schema_version.replace(".", "")
+
+
+class TestBasic(unittest.TestCase):
+
+    def test_validate(self):
+        # The validator is compiled once
+        self.assertIs(validation.get_validator(), validation.get_validator(schema.vcd_schema))
+
+        vcd = core.VCD('./etc/' + vcd_version_name + '_sample_3dod.json', validation=True)
+        uid = vcd.add_object(name='car', semantic_type='#Car')
+        vcd.add_object_data(uid, types.bbox('box', (0, 0, 10, 10)), frame_value=(0, 5))  # val is a tuple
+        vcd.validate()
+        vcd.validate(structural_only=True)
+        vcd.validate(vcd.stringify(pretty=False))
+
+        # Invalid content is detected by both
+        vcd.data['vcd']['objects'][uid]['name'] = 5
+        self.assertRaises(ValidationError, vcd.validate)
+        self.assertRaises(ValidationError, vcd.validate, None, True)
+        vcd.data['vcd']['objects'][uid]['name'] = 'car'
+
+        vcd.data['vcd']['frames'][3]['objects']['1000'] = {}
+        self.assertRaises(ValidationError, vcd.validate, None, True)
+        del vcd.data['vcd']['frames'][3]['objects']['1000']
+
+        vcd.data['vcd']['frame_intervals'].append({'frame_start': 10, 'frame_end': 5})
+        self.assertRaises(ValidationError, validation.validate_structure, vcd.data)
+
+    def test_validate_frames(self):
+        vcd = core.VCD()
+        uid = vcd.add_object(name='car', semantic_type='#Car')
+        self.assertIs(validation.get_validator(definition='frame'), validation.get_validator(definition='frame'))
+
+        # Frames are validated as they are produced
+        for frame_num in range(0, 10):
+            vcd.add_object_data(uid, types.bbox('box', (frame_num, 0, 10, 10)), frame_value=frame_num)
+            vcd.validate_frame(frame_num)
+            vcd.stringify_frame(frame_num, validate=True)
+        vcd.validate_element(core.ElementType.object, uid)
+
+        vcd.data['vcd']['frames'][5]['objects'][uid]['object_data']['bbox'][0]['name'] = 5
+        self.assertRaises(ValidationError, vcd.validate_frame, 5)
+        vcd.validate_frame(5, structural_only=True)
+        vcd.validate_frame(4)
+        vcd.data['vcd']['frames'][5]['objects'][uid]['object_data']['bbox'][0]['name'] = 'box'
+
+        vcd.data['vcd']['frames'][6]['objects']['1000'] = {}
+        self.assertRaises(ValidationError, vcd.validate_frame, 6, True)
+        del vcd.data['vcd']['frames'][6]['objects']['1000']
+
+        vcd.data['vcd']['objects'][uid]['type'] = 1
+        self.assertRaises(ValidationError, vcd.validate_element, core.ElementType.object, uid)
+        self.assertRaises(Exception, validation.get_validator, None, 'unknown')
+
+
+if __name__ == '__main__':  # This changes the command-line entry point to call unittest.main()
+    print("Running " + os.path.basename(__file__))
+    unittest.main()
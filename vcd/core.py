@@ -12,10 +12,10 @@ VCD is distributed under MIT License. See LICENSE.
 """
 
 
+import bisect
 import copy
-import json
+import math
 import warnings
-from jsonschema import validate
 from enum import Enum
 
 import re
@@ -25,6 +25,15 @@ import vcd.types as types
 import vcd.utils as utils
 import vcd.schema as schema
 import vcd.converter as converter
+import vcd.jsonio as jsonio
+import vcd.validation as validation
+
+
+# Separators of the compact output of VCD.stringify_frame, as json.dumps by default
+FRAME_SEPARATORS = (', ', ': ')
+
+# Element_data containers with more entries than this are looked up by name through a cached index
+ELEMENT_DATA_INDEX_MIN_SIZE = 8
 
 
 class ElementType(Enum):
@@ -59,53 +68,52 @@ class RDF(Enum):
 
 class FrameIntervals:
     """
-    FrameIntervals class aims to simplify management of frame intervals
+    FrameIntervals class aims to simplify management of frame intervals.
+    Internally, frame intervals are stored as a sorted list of non-overlapping (frame_start, frame_end) tuples,
+    so membership is resolved with a binary search and union/intersection are linear merges. The list of dict
+    form used in the JSON content is only created when get_dict() is called.
     """
     def __init__(self, frame_value=None):
-        self.fis_dict = []
         self.fis_num = []
 
         if frame_value is not None:
             if isinstance(frame_value, int):
-                self.fis_dict = [{'frame_start': frame_value, 'frame_end': frame_value}]
                 self.fis_num = [(frame_value, frame_value)]
             elif isinstance(frame_value, list):
                 if len(frame_value) == 0:
                     return
                 if all(isinstance(x, tuple) for x in frame_value):
                     # Then, frame_value is an array of tuples
-                    self.fis_dict = utils.as_frame_intervals_array_dict(frame_value)
-                    self.fis_dict = utils.fuse_frame_intervals(self.fis_dict)
-                    self.fis_num = utils.as_frame_intervals_array_tuples(self.fis_dict)
+                    self.fis_num = utils.fuse_frame_interval_tuples(frame_value)
                 elif all(isinstance(x, list) for x in frame_value):
                     # This is possibly a list of list, e.g. [[0, 10], [12, 15]], instead of the above case list of tupl
-                    self.fis_dict = utils.as_frame_intervals_array_dict(frame_value)
-                    self.fis_dict = utils.fuse_frame_intervals(self.fis_dict)
-                    self.fis_num = utils.as_frame_intervals_array_tuples(self.fis_dict)
+                    self.fis_num = utils.fuse_frame_interval_tuples(frame_value)
                 elif all(isinstance(x, dict) for x in frame_value):
                     # User provided a list of dict
-                    self.fis_dict = frame_value
-                    self.fis_dict = utils.fuse_frame_intervals(self.fis_dict)
-                    self.fis_num = utils.as_frame_intervals_array_tuples(self.fis_dict)
+                    self.fis_num = utils.fuse_frame_interval_tuples(
+                        utils.as_frame_intervals_array_tuples(frame_value)
+                    )
             elif isinstance(frame_value, tuple):
                 # Then, frame_value is a tuple (one single frame interval)
                 self.fis_num = [frame_value]
-                self.fis_dict = utils.as_frame_intervals_array_dict(self.fis_num)
             elif isinstance(frame_value, dict):
                 # User provided a single dict
-                self.fis_dict = [frame_value]
-                self.fis_num = utils.as_frame_intervals_array_tuples(self.fis_dict)
+                self.fis_num = utils.as_frame_intervals_array_tuples([frame_value])
             else:
                 warnings.warn("ERROR: Unsupported FrameInterval format.")
 
+    @staticmethod
+    def __from_tuples(fis_num):
+        # Creates a FrameIntervals from an already sorted and fused list of tuples, without re-checking it
+        fis = FrameIntervals()
+        fis.fis_num = fis_num
+        return fis
+
     def empty(self):
-        if len(self.fis_dict) == 0 or len(self.fis_num) == 0:
-            return True
-        else:
-            return False
+        return len(self.fis_num) == 0
 
     def get_dict(self):
-        return self.fis_dict
+        return utils.as_frame_intervals_array_dict(self.fis_num)
 
     def get(self):
         return self.fis_num
@@ -117,25 +125,32 @@ class FrameIntervals:
         return length
 
     def rm_frame(self, frame_num):
-        self.fis_dict = utils.rm_frame_from_frame_intervals(self.fis_dict, frame_num)
-        self.fis_num = utils.as_frame_intervals_array_tuples(self.fis_dict)
+        idx = utils.find_frame_interval(frame_num, self.fis_num)
+        if idx == -1:
+            return
+        fi = self.fis_num[idx]
+        fis_split = []
+        if fi[0] < frame_num:
+            fis_split.append((fi[0], frame_num - 1))
+        if frame_num < fi[1]:
+            fis_split.append((frame_num + 1, fi[1]))
+        self.fis_num[idx:idx + 1] = fis_split
 
     def union(self, frame_intervals):
-        fis_union = utils.fuse_frame_intervals(frame_intervals.get_dict() + self.fis_dict)
-        return FrameIntervals(fis_union)
+        return FrameIntervals.__from_tuples(utils.union_sorted_frame_intervals(self.fis_num, frame_intervals.get()))
 
     def intersection(self, frame_intervals):
-        fis_int = utils.intersection_between_frame_interval_arrays(self.fis_num, frame_intervals.get())
-        return FrameIntervals(fis_int)
+        return FrameIntervals.__from_tuples(
+            utils.intersection_sorted_frame_intervals(self.fis_num, frame_intervals.get())
+        )
 
-    def equals(self, frame_intervals):
-        fis_int = self.intersection(frame_intervals)
-        fis_union = self.union(frame_intervals)
+    def difference(self, frame_intervals):
+        return FrameIntervals.__from_tuples(
+            utils.difference_sorted_frame_intervals(self.fis_num, frame_intervals.get())
+        )
 
-        if fis_int.get_length() == fis_union.get_length():
-            return True
-        else:
-            return False
+    def equals(self, frame_intervals):
+        return self.fis_num == frame_intervals.get()
 
     def contains(self, frame_intervals):
         fis_int = self.intersection(frame_intervals)
@@ -154,10 +169,12 @@ class FrameIntervals:
             return False
 
     def get_outer(self):
-        return utils.get_outer_frame_interval(self.fis_dict)
+        if self.empty():
+            return None
+        return {'frame_start': self.fis_num[0][0], 'frame_end': self.fis_num[-1][1]}
 
     def has_frame(self, frame_num):
-        return utils.is_inside_frame_intervals(frame_num, self.fis_num)
+        return utils.find_frame_interval(frame_num, self.fis_num) != -1
 
     def to_str(self):
         text = "["
@@ -247,17 +264,37 @@ class VCD:
     ##################################################
     # Constructor
     ##################################################
-    def __init__(self, file_name=None, validation=False):
+    def __init__(self, file_name=None, validation=False, frame_callback=None, lazy=False, frame_index_file=None):
+        """
+        Creates an empty VCD, or loads it from file_name. Files are read frame by frame (see jsonio.load).
+        If frame_callback is provided, it is called as frame_callback(frame_num, frame) for each frame of the file,
+        and frames are not kept in memory (only the static content is loaded).
+        If lazy is True, only the static content is loaded, and each frame is parsed when accessed for the first
+        time (see jsonio.LazyFrames). Frames returned by get_frame are then kept in a bounded cache, so they should
+        not be modified directly. The frame offset index is stored into frame_index_file, if provided, and reused
+        the next time the same file is opened.
+        """
         self.use_uuid = False
+        self.use_indexes = False
+        self.__indexes = dict()  # secondary indexes of elements, see set_use_indexes
+        self.__fis = FrameIntervals()  # live frame intervals of the VCD, see __sync_vcd_frame_intervals
+        self.__fis_dict = None
+        self.__ed_index = dict()  # name index of element_data, see __get_element_data_index
+        self.__cs_version = 0  # number of changes of coordinate systems, see get_coordinate_systems_version
+        self.__transforms_versions = dict()  # number of changes of transforms per frame, see get_transforms_version
+        self.__element_data_versions = dict()  # number of changes of element_data, see get_element_data_version
         if file_name is not None:
-            json_file = open(file_name)
             # In VCD 4.2.0, uids and frames were ints, so, parsing needed a lambda function to do the job
             # self.data = json.load(
             #    json_file,
             #    object_hook=lambda d: {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}
             # )
 
-            read_data = json.load(json_file)  # Open without converting strings to integers
+            # Uids are not converted to integers, but frame numbers are, while frames are read
+            if lazy:
+                read_data = jsonio.load_lazy(file_name, index_file_name=frame_index_file)
+            else:
+                read_data = jsonio.load(file_name, frame_callback)
             # Check VERSION
             if 'vcd' in read_data:
                 # This is 4.x
@@ -266,11 +303,6 @@ class VCD:
                     if read_data['vcd']['version'] == "4.2.0":
                         # This is VCD 4.2.0
                         warnings.warn("WARNING: Converting VCD 4.2.0 to VCD 4.3.1. A full revision is recommended.")
-                        # Convert frame entries to int
-                        frames = read_data['vcd']['frames']
-                        if frames:  # So frames is not empty
-                            read_data['vcd']['frames'] = {int(key): value for key, value in frames.items()}
-
                         self.reset()  # to init object
                         converter.ConverterVCD420toVCD431(read_data, self)  # self is modified internally
 
@@ -283,19 +315,14 @@ class VCD:
                         if read_data['vcd']['metadata']['schema_version'] == "4.3.0" or \
                                 read_data['vcd']['metadata']['schema_version'] == "4.3.1":
                             # This is VCD 4.3.0 or VCD 4.3.1
+                            # In VCD 4.3.1 uids are strings, because they can be numeric strings, or UUIDs
+                            # but frames are still ints (already converted while reading)
                             self.data = read_data
+                            if isinstance(self.data['vcd'].get('frames'), jsonio.LazyFrames):
+                                # Indexes of the element_data of evicted frames are dropped with them
+                                self.data['vcd']['frames'].on_evict = self.__rm_frame_element_data_index
                             if validation:
-                                if not hasattr(self, 'schema'):
-                                    self.schema = schema.vcd_schema
-                                validate(instance=self.data, schema=self.schema)  # Raises errors if not validated
-                                json_file.close()
-
-                            # In VCD 4.3.1 uids are strings, because they can be numeric strings, or UUIDs
-                            # but frames are still ints, so let's parse like that
-                            if 'frames' in self.data['vcd']:
-                                frames = self.data['vcd']['frames']
-                                if frames:  # So frames is not empty
-                                    self.data['vcd']['frames'] = {int(key): value for key, value in frames.items()}
+                                self.validate()
                         else:
                             raise Exception("ERROR: This vcd file does not seem to be 4.3.0, 4.3.1 nor 4.2.0")
                     else:
@@ -307,9 +334,6 @@ class VCD:
                 self.reset()  # to init object
                 converter.ConverterVCD330toVCD431(read_data, self)  # self is modified internally
 
-            # Close file
-            json_file.close()
-
             # Final set-up
             self.__compute_last_uid()
         else:
@@ -319,6 +343,21 @@ class VCD:
         assert(isinstance(val, bool))
         self.use_uuid = val
 
+    def set_use_indexes(self, val):
+        """
+        Enables indexes of Elements by name, semantic type, ontology_uid and element_data name, so queries like
+        get_element_uid_by_name or get_elements_of_type don't need to loop over all the Elements.
+        Indexes are maintained by all add and rm functions, and are rebuilt if the Elements of self.data are replaced
+        or added/removed directly. Names, types, ontology_uids and element_data_pointers of existing Elements can also
+        be modified directly in self.data: the Elements returned by the indexes are checked, and queries with no
+        result fall back to a scan of the Elements, which rebuilds the indexes if needed. The only case not detected is
+        an Element modified directly to match a key which other Elements still have: call this function again to
+        rebuild the indexes after such modifications.
+        """
+        assert(isinstance(val, bool))
+        self.use_indexes = val
+        self.__indexes = dict()
+
     def reset(self):
         # Main VCD data
         self.data = {'vcd': {}}
@@ -336,6 +375,13 @@ class VCD:
         self.__lastUID[ElementType.context] = -1
         self.__lastUID[ElementType.relation] = -1
 
+        self.__fis = FrameIntervals()
+        self.__fis_dict = None
+        self.__ed_index = dict()
+        self.__indexes = dict()
+        self.__cs_version += 1
+        self.__transforms_versions = dict()
+
     def convert_to_vcd330(self):
         return converter.ConverterVCD430toVCD330(self.data)
 
@@ -370,20 +416,54 @@ class VCD:
 
         return uid_to_assign
 
-    def __set_vcd_frame_intervals(self, frame_intervals):
-        assert(isinstance(frame_intervals, FrameIntervals))
-        if not frame_intervals.empty():
-            self.data['vcd']['frame_intervals'] = frame_intervals.get_dict()
+    def __sync_vcd_frame_intervals(self, frame_interval=None):
+        # The VCD keeps a live FrameIntervals next to the list of dict at self.data['vcd']['frame_intervals'], and
+        # both are patched together. If the list has been replaced or resized (e.g. loading a file, or direct
+        # manipulation of self.data), the live structure is rebuilt from it. If frame_interval is not None, the dicts
+        # of the intervals next to it (i.e. those that a change of frame_interval would patch) are also checked, to
+        # detect in-place modifications of the list
+        fis_dict = self.data['vcd'].get('frame_intervals')
+        valid = fis_dict is self.__fis_dict
+        if valid and fis_dict is not None:
+            fis_num = self.__fis.get()
+            valid = len(fis_dict) == len(fis_num)
+            if valid and frame_interval is not None:
+                lo = max(bisect.bisect_right(fis_num, (frame_interval[0] - 1, math.inf)) - 1, 0)
+                hi = min(bisect.bisect_right(fis_num, (frame_interval[1] + 1, math.inf)) + 1, len(fis_num))
+                valid = self.__check_vcd_frame_intervals(lo, hi)
+        if not valid:
+            self.__fis = FrameIntervals(fis_dict)
+            if fis_dict is not None:
+                self.data['vcd']['frame_intervals'] = self.__fis.get_dict()
+            self.__fis_dict = self.data['vcd'].get('frame_intervals')
+        return self.__fis
+
+    def __check_vcd_frame_intervals(self, lo, hi):
+        # Returns True if the dicts from lo to hi of the frame intervals of the VCD match the live ones
+        fis_num = self.__fis.get()
+        for i in range(lo, hi):
+            fi_dict = self.__fis_dict[i]
+            if not isinstance(fi_dict, dict) or fi_dict.get('frame_start') != fis_num[i][0] or \
+                    fi_dict.get('frame_end') != fis_num[i][1]:
+                return False
+        return True
 
     def __update_vcd_frame_intervals(self, frame_intervals):
         # This function creates the union of existing VCD with the input frameIntervals
+        # Each interval is inserted in place (binary search + splice), so no re-fusing of the entire list is needed
         assert (isinstance(frame_intervals, FrameIntervals))
-        if not frame_intervals.empty():
+        fis_num = self.__sync_vcd_frame_intervals().get()
+        for fi in frame_intervals.get():
+            idx = utils.find_frame_interval(fi[0], fis_num)
+            if idx != -1 and fis_num[idx][1] >= fi[1] and self.__check_vcd_frame_intervals(idx, idx + 1):
+                # Already there (e.g. the frame intervals of an Element which has been extended)
+                continue
+            fis_num = self.__sync_vcd_frame_intervals(fi).get()
             if 'frame_intervals' not in self.data['vcd']:
                 self.data['vcd']['frame_intervals'] = []
-            fis_current = FrameIntervals(self.data['vcd']['frame_intervals'])
-            fis_union = fis_current.union(frame_intervals)
-            self.__set_vcd_frame_intervals(fis_union)
+                self.__fis_dict = self.data['vcd']['frame_intervals']
+            lo, hi = utils.insert_frame_interval(fi, fis_num)
+            self.__fis_dict[lo:hi] = [{'frame_start': fis_num[lo][0], 'frame_end': fis_num[lo][1]}]
 
     def __add_frame(self, frame_num):
         if 'frames' not in self.data['vcd']:
@@ -424,6 +504,101 @@ class VCD:
                 if int(uid) > self.__lastUID[ElementType.relation]:  # uid is a string!
                     self.__lastUID[ElementType.relation] = int(uid)
 
+    def __get_indexes(self, element_type):
+        # Returns the indexes of the Elements of the given type, (re)building them if needed
+        elements = self.data['vcd'].get(element_type.name + 's', {})
+        indexes = self.__indexes.get(element_type)
+        if indexes is not None and indexes['elements'] is elements and indexes['size'] == len(elements):
+            return indexes
+
+        indexes = {'elements': elements, 'size': 0, 'keys': dict(),
+                   'name': dict(), 'type': dict(), 'ontology_uid': dict(), 'data_name': dict()}
+        self.__indexes[element_type] = indexes
+        for uid_str, element in elements.items():
+            self.__index_element_keys(element_type, indexes, uid_str, element)
+        indexes['size'] = len(elements)
+        return indexes
+
+    def __get_valid_indexes(self, element_type, size_before):
+        # Returns the indexes of the Elements of the given type, if they were up to date before a change which has
+        # modified the number of Elements from size_before. Otherwise, they are dropped to be rebuilt on demand
+        if not self.use_indexes or element_type not in self.__indexes:
+            return None
+        indexes = self.__indexes[element_type]
+        if indexes['elements'] is not self.data['vcd'].get(element_type.name + 's') or indexes['size'] != size_before:
+            del self.__indexes[element_type]
+            return None
+        return indexes
+
+    @staticmethod
+    def __index_element_keys(element_type, indexes, uid_str, element):
+        # (Re)sets the entries of an element in the name, type and ontology_uid indexes
+        # and adds its element_data names if the element is new in the indexes
+        keys_old = indexes['keys'].get(uid_str)
+        keys_new = (element.get('name'), element.get('type'), element.get('ontology_uid'))
+        if keys_old is None:
+            for data_name in element.get(element_type.name + '_data_pointers', {}):
+                indexes['data_name'].setdefault(data_name, dict())[uid_str] = None
+            keys_old = (None, None, None)
+        for index_name, key_old, key_new in zip(('name', 'type', 'ontology_uid'), keys_old, keys_new):
+            if key_old == key_new:
+                continue
+            if key_old is not None:
+                del indexes[index_name][key_old][uid_str]
+                if len(indexes[index_name][key_old]) == 0:
+                    del indexes[index_name][key_old]
+            if key_new is not None:
+                indexes[index_name].setdefault(key_new, dict())[uid_str] = None
+        indexes['keys'][uid_str] = keys_new
+
+    @staticmethod
+    def __unindex_element(element_type, indexes, uid_str, element):
+        keys_old = indexes['keys'].pop(uid_str, None)
+        if keys_old is not None:
+            for index_name, key_old in zip(('name', 'type', 'ontology_uid'), keys_old):
+                if key_old is not None:
+                    del indexes[index_name][key_old][uid_str]
+                    if len(indexes[index_name][key_old]) == 0:
+                        del indexes[index_name][key_old]
+        for data_name in element.get(element_type.name + '_data_pointers', {}):
+            uids = indexes['data_name'].get(data_name)
+            if uids is not None:
+                uids.pop(uid_str, None)
+                if len(uids) == 0:
+                    del indexes['data_name'][data_name]
+
+    @staticmethod
+    def __element_has_key(element_type, element, index_name, key):
+        if index_name == 'data_name':
+            return key in element.get(element_type.name + '_data_pointers', {})
+        return element.get(index_name) == key
+
+    def __query_indexes(self, element_type, index_name, key):
+        # Returns the uids of the Elements with the given key (e.g. name) using the indexes.
+        # The returned Elements are checked, and indexes rebuilt once in case they have been modified directly.
+        # If no Element is found, the Elements are scanned, and indexes rebuilt if the scan finds any
+        for attempt in range(0, 2):
+            indexes = self.__get_indexes(element_type)
+            uids_str = list(indexes[index_name].get(key, ()))
+            elements = indexes['elements']
+            valid = True
+            for uid_str in uids_str:
+                element = elements.get(uid_str)
+                valid = element is not None and self.__element_has_key(element_type, element, index_name, key)
+                if not valid:
+                    break
+            if valid:
+                break
+            del self.__indexes[element_type]
+
+        if len(uids_str) == 0:
+            uids_str = [uid_str for uid_str, element in indexes['elements'].items()
+                        if self.__element_has_key(element_type, element, index_name, key)]
+            if len(uids_str) > 0:
+                # Elements have been modified directly to match the key
+                del self.__indexes[element_type]
+        return uids_str
+
     def __add_frames(self, frame_intervals, element_type, uid):
         assert(isinstance(frame_intervals, FrameIntervals))
         assert(isinstance(element_type, ElementType))
@@ -437,8 +612,8 @@ class VCD:
                 for f in range(fi[0], fi[1]+1):
                     # Add frame
                     self.__add_frame(f)
-                    # Add element entry
-                    frame = self.get_frame(f)
+                    # Add element entry (get_frame is not used to write, as lazy frames read by it can be evicted)
+                    frame = self.data['vcd']['frames'][f]
                     frame.setdefault(element_type.name + 's', {})
                     frame[element_type.name + 's'].setdefault(uid.as_str(), {})
 
@@ -473,6 +648,7 @@ class VCD:
         # element_data_pointers and frame intervals
         uidstr = uid.as_str()
         element_existed = self.has(element_type, uidstr)# note: public functions use int or str for uids
+        self.__touch_element_data(element_type, uidstr)
         self.data['vcd'].setdefault(element_type.name + 's', {})
         self.data['vcd'][element_type.name + 's'].setdefault(uidstr, {})
         element = self.data['vcd'][element_type.name + 's'][uidstr]
@@ -503,8 +679,17 @@ class VCD:
             if 'rdf_objects' not in element:
                 element['rdf_objects'] = []
 
+        # 2.ter.- Update indexes (if used)
+        num_elements = len(self.data['vcd'][element_type.name + 's'])
+        indexes = self.__get_valid_indexes(element_type, num_elements if element_existed else num_elements - 1)
+        if indexes is not None:
+            self.__index_element_keys(element_type, indexes, uidstr, element)
+            indexes['size'] = num_elements
+
         # 3.- Reshape element_data_pointers according to this new frame intervals
-        if element_type.name + '_data_pointers' in element:
+        # If the element has only been extended, the frame intervals of the pointers (inside the old ones) are kept
+        extended = not fis_old.empty() and not frame_intervals.empty() and frame_intervals.contains(fis_old)
+        if element_type.name + '_data_pointers' in element and not extended:
             edps = element[element_type.name + '_data_pointers']
             for edp_name in edps:
                 # NOW, we have to UPDATE frame intervals of pointers because we have modified the frame_intervals
@@ -531,14 +716,9 @@ class VCD:
                 # 2.1.b) This is a substitution: depending on the new frame_intervals, we may need to delete/add frames
                 # Add
                 fis_new = frame_intervals
-                for fi in fis_new.get():
-                    for f in range(fi[0], fi[1] + 1):
-                        is_inside = fis_old.has_frame(f)
-                        if not is_inside:
-                            # New frame is not inside -> let's add this frame
-                            fi_ = FrameIntervals(f)
-                            self.__add_frames(fi_, element_type, uid)
-                            self.__update_vcd_frame_intervals(fi_)
+                # New frames not inside old ones -> let's add these frames
+                self.__add_frames(fis_new.difference(fis_old), element_type, uid)
+                self.__update_vcd_frame_intervals(fis_new)
                 # Remove
                 if element_existed and fis_old.empty():
                     # Ok, the element was originally static (thus with fisOld empty)
@@ -547,29 +727,27 @@ class VCD:
                     # element entries (pointers) in all OTHER frames
                     vcd_frame_intervals = self.get_frame_intervals()
                     if not vcd_frame_intervals.empty():
-                        for fi in vcd_frame_intervals.get():
+                        # Only for those OTHER frames not those just added
+                        for fi in vcd_frame_intervals.difference(fis_new).get():
                             for f in range(fi[0], fi[1] + 1):
-                                if not fis_new.has_frame(f):  # Only for those OTHER frames not those just added
-                                    elements_in_frame = self.data['vcd']['frames'][f][element_type.name + 's']
-                                    if uidstr in elements_in_frame:
-                                        del elements_in_frame[uidstr]
-                                        if len(elements_in_frame) == 0:
-                                            del self.data['vcd']['frames'][f][element_type.name + 's']
-                                            if len(self.data['vcd']['frames'][f]) == 0:
-                                                self.__rm_frame(f)
+                                elements_in_frame = self.data['vcd']['frames'][f][element_type.name + 's']
+                                if uidstr in elements_in_frame:
+                                    del elements_in_frame[uidstr]
+                                    if len(elements_in_frame) == 0:
+                                        del self.data['vcd']['frames'][f][element_type.name + 's']
+                                        if len(self.data['vcd']['frames'][f]) == 0:
+                                            self.__rm_frame(f)
 
                 # Next loop for is for the case fis_old wasn't empty, so we just need to remove old content
-                for fi in fis_old.get():
+                # Old frames not inside new ones -> let's remove these frames
+                for fi in fis_old.difference(fis_new).get():
                     for f in range(fi[0], fi[1] + 1):
-                        is_inside = fis_new.has_frame(f)
-                        if not is_inside:
-                            # Old frame not inside new ones -> let's remove this frame
-                            elements_in_frame = self.data['vcd']['frames'][f][element_type.name + 's']
-                            del elements_in_frame[uidstr]
-                            if len(elements_in_frame) == 0:
-                                del self.data['vcd']['frames'][f][element_type.name + 's']
-                                if len(self.data['vcd']['frames'][f]) == 0:
-                                    self.__rm_frame(f)
+                        elements_in_frame = self.data['vcd']['frames'][f][element_type.name + 's']
+                        del elements_in_frame[uidstr]
+                        if len(elements_in_frame) == 0:
+                            del self.data['vcd']['frames'][f][element_type.name + 's']
+                            if len(self.data['vcd']['frames'][f]) == 0:
+                                self.__rm_frame(f)
         else:
             # 2.2.- The element is declared as static
             if element_type is not ElementType.relation:  # frame-less relation must remain frame-less
@@ -641,7 +819,7 @@ class VCD:
                     fis_old = self.get_element_data_frame_intervals(element_type, uid.as_str(), element_data.data['name'])
                     if not fis_old.empty():
                         self.rm_element_data_from_frames_by_name(element_type, uid, element_data.data['name'], fis_old)
-                self.__set_element_data_content(element_type, element, element_data)
+                self.__set_element_data_content(element_type, uid.as_str(), None, element, element_data)
             # Set the pointers
             self.__set_element_data_pointers(element_type, uid, element_data, frame_intervals)
         else:  # set_mode = SetMode.union
@@ -673,7 +851,86 @@ class VCD:
             elif isinstance(element_data, types.mesh):
                 # This is only for mesh case that can have this static part
                 # (because it is an object data type which is both static and dynamic)
-                self.__set_element_data_content(element_type, element, element_data)
+                self.__set_element_data_content(element_type, uid.as_str(), None, element, element_data)
+
+    def __get_element_data_index(self, key, frame_num, ed, size):
+        # Returns a dict name -> {type: position} of the element_data container ed. Indexes are cached per frame_num
+        # (None for the root of the elements) and (element_type, uid), and rebuilt if the container has been replaced
+        # or its size has changed (e.g. direct manipulation of self.data)
+        indexes = self.__ed_index.setdefault(frame_num, dict())
+        cached = indexes.get(key)
+        if cached is not None and cached[0] is ed and cached[1] == size:
+            return cached[2]
+
+        index = dict()
+        for prop, val_array in ed.items():
+            for i, val in enumerate(val_array):
+                index.setdefault(val['name'], dict()).setdefault(prop, i)
+        indexes[key] = [ed, size, index]
+        return index
+
+    def __lookup_element_data_index(self, key, frame_num, ed, size, data_name, data_type):
+        positions = self.__get_element_data_index(key, frame_num, ed, size).get(data_name)
+        if positions is None:
+            return None
+        if data_type is None:
+            prop = next(iter(positions))
+            return prop, positions[prop]
+        if data_type in positions:
+            return data_type, positions[data_type]
+        return None
+
+    @staticmethod
+    def __scan_element_data(ed, data_name, data_type):
+        for prop, val_array in ed.items():
+            if data_type is None or prop == data_type:
+                for i, val in enumerate(val_array):
+                    if val['name'] == data_name:
+                        return prop, i
+        return None
+
+    def __find_element_data(self, element_type, uid_str, frame_num, element, data_name, data_type=None):
+        # Returns the (type, position) of the element_data with the given name (and type, if not None), at the root
+        # of the element if frame_num is None, or inside the frame otherwise. Returns None if not found
+        ed = element.get(element_type.name + '_data')
+        if ed is None:
+            return None
+        size = 0
+        for val_array in ed.values():
+            size += len(val_array)
+        if size <= ELEMENT_DATA_INDEX_MIN_SIZE:
+            # Small containers are faster to scan than to index
+            return self.__scan_element_data(ed, data_name, data_type)
+        if frame_num is not None:
+            frames = self.data['vcd'].get('frames')
+            if isinstance(frames, jsonio.LazyFrames) and not frames.is_kept(frame_num):
+                # The frame is no longer in memory, so an index would just keep it alive
+                return self.__scan_element_data(ed, data_name, data_type)
+
+        key = (element_type, uid_str)
+        pos = self.__lookup_element_data_index(key, frame_num, ed, size, data_name, data_type)
+        if pos is None:
+            # The index is trusted, as it matches the container and its size (names modified in place are found once
+            # the index is rebuilt, e.g. when their former name is looked up)
+            return None
+        val_array = ed.get(pos[0])
+        if val_array is not None and pos[1] < len(val_array) and val_array[pos[1]]['name'] == data_name:
+            return pos
+
+        # The content has been modified in place, so let's rebuild the index
+        self.__rm_element_data_index(element_type, uid_str, frame_num)
+        return self.__lookup_element_data_index(key, frame_num, ed, size, data_name, data_type)
+
+    def __rm_element_data_index(self, element_type, uid_str, frame_num):
+        indexes = self.__ed_index.get(frame_num)
+        if indexes is not None:
+            indexes.pop((element_type, uid_str), None)
+            if len(indexes) == 0:
+                del self.__ed_index[frame_num]
+
+    def __rm_frame_element_data_index(self, frame_num):
+        # Drops the indexes of the element_data of a frame removed (or evicted from the cache of lazy frames)
+        self.__ed_index.pop(frame_num, None)
 
     def __set_element_data_content_at_frames(self, element_type, uid, element_data, frame_intervals):
         # Loop over the specified frame_intervals to create or substitute the content
@@ -682,33 +939,39 @@ class VCD:
         for fi in fis:
             for f in range(fi[0], fi[1] + 1):
                 # Add element_data entry
-                frame = self.get_frame(f)
-                if frame is None:
-                    self.__add_frame(f)
-                    frame = self.get_frame(f)
+                self.__add_frame(f)
+                frame = self.data['vcd']['frames'][f]
 
                 frame.setdefault(element_type.name + 's', {})
                 frame[element_type.name + 's'].setdefault(uid.as_str(), {})
                 element = frame[element_type.name + 's'][uid.as_str()]
-                self.__set_element_data_content(element_type, element, element_data)
+                self.__set_element_data_content(element_type, uid.as_str(), f, element, element_data)
 
-    @staticmethod
-    def __set_element_data_content(element_type, element, element_data):
+    def __set_element_data_content(self, element_type, uid_str, frame_num, element, element_data):
         # Adds the element_data to the corresponding container
         # If an element_data with same name exists, it is substituted
+        self.__touch_element_data(element_type, uid_str)
         element.setdefault(element_type.name + '_data', {})
         element[element_type.name + '_data'].setdefault(element_data.type.name, [])
         # Find if element_data already there
         list_aux = element[element_type.name + '_data'][element_data.type.name]
-        pos_list = [idx for idx, val in enumerate(list_aux) if val['name'] == element_data.data['name']]
+        name = element_data.data['name']
+        pos = self.__find_element_data(element_type, uid_str, frame_num, element, name, element_data.type.name)
 
-        if len(pos_list) == 0:
-            # Not found, then just push this new element data
-            element[element_type.name + '_data'][element_data.type.name].append(element_data.data)
-        else:
+        if pos is not None:
             # Found: let's substitute
-            pos = pos_list[0]
-            element[element_type.name + '_data'][element_data.type.name][pos] = element_data.data
+            list_aux[pos[1]] = element_data.data
+        else:
+            # Not found, then just push this new element data, and keep the index up to date (if any)
+            list_aux.append(element_data.data)
+            cached = self.__ed_index.get(frame_num, dict()).get((element_type, uid_str))
+            if cached is not None:
+                ed = element[element_type.name + '_data']
+                if cached[0] is ed and cached[1] + 1 == sum(len(val_array) for val_array in ed.values()):
+                    cached[1] += 1
+                    cached[2].setdefault(name, dict()).setdefault(element_data.type.name, len(list_aux) - 1)
+                else:
+                    self.__rm_element_data_index(element_type, uid_str, frame_num)
 
     def __set_element_data_pointers(self, element_type, uid, element_data, frame_intervals):
         assert(isinstance(uid, UID))
@@ -726,8 +989,67 @@ class VCD:
                 for attr in element_data.data['attributes'][attr_type]:
                     edp[element_data.data['name']]['attributes'][attr['name']] = attr_type
 
+        indexes = self.__get_valid_indexes(element_type, len(self.data['vcd'][element_type.name + 's']))
+        if indexes is not None:
+            indexes['data_name'].setdefault(element_data.data['name'], dict())[uid.as_str()] = None
+
+    def __set_element_data_batch(self, element_type, element_data_list):
+        # Equivalent to calling __set_element_data with SetMode.union for each (uid, element_data, frame_value) of
+        # the list, but the frame intervals of each Element and each element_data_pointer are computed only once
+        items_per_uid = dict()  # keeps order of first appearance
+        for uid, element_data, frame_value in element_data_list:
+            items_per_uid.setdefault(UID(uid).as_str(), []).append((element_data, FrameIntervals(frame_value)))
+
+        for uid_str, items in items_per_uid.items():
+            uid = UID(uid_str)
+            if not self.has(element_type, uid_str):
+                warnings.warn("WARNING: Trying to set element_data for a non-existing element.")
+                continue
+
+            # Static element_data (and meshes) follow the regular path
+            items_dynamic = []
+            for element_data, fis in items:
+                if 'coordinate_system' in element_data.data:
+                    if not self.has_coordinate_system(element_data.data['coordinate_system']):
+                        warnings.warn("WARNING: Trying to set element_data with a non-declared coordinate system.")
+                        continue
+                if fis.empty():
+                    self.__set_element_data(element_type, uid, element_data, fis, SetMode.union)
+                else:
+                    items_dynamic.append((element_data, fis))
+            if len(items_dynamic) == 0:
+                continue
+
+            # 1.- Extend the Element, only once, to the union of all the new frame intervals
+            element = self.get_element(element_type, uid_str)
+            ont_uid = UID(element.get('ontology_uid'))
+            fis_tuples = []
+            fis_tuples_per_name = dict()
+            for element_data, fis in items_dynamic:
+                fis_tuples += fis.get()
+                fis_tuples_per_name.setdefault(element_data.data['name'], []).extend(fis.get())
+            self.__set_element(element_type, element['name'], element['type'], FrameIntervals(fis_tuples), uid,
+                               ont_uid, element.get('coordinate_system'), SetMode.union)
+
+            # 2.- Set the content at frames
+            for element_data, fis in items_dynamic:
+                self.__set_element_data_content_at_frames(element_type, uid, element_data, fis)
+
+            # 3.- Set the pointers, once per element_data name, using the last element_data with that name
+            last_element_data = dict()
+            for element_data, fis in items_dynamic:
+                last_element_data[element_data.data['name']] = element_data
+            edps = element.get(element_type.name + '_data_pointers', {})
+            for name, element_data in last_element_data.items():
+                fis_existing = FrameIntervals()
+                if name in edps:
+                    fis_existing = FrameIntervals(edps[name]['frame_intervals'])
+                fis_union = fis_existing.union(FrameIntervals(fis_tuples_per_name[name]))
+                self.__set_element_data_pointers(element_type, uid, element_data, fis_union)
+
     def __rm_frame(self, frame_num):
         # This function deletes a frame entry from frames, and updates VCD accordingly
+        self.__rm_frame_element_data_index(frame_num)
         if 'frames' in self.data['vcd']:
             if frame_num in self.data['vcd']['frames']:
                 del self.data['vcd']['frames'][frame_num]
@@ -736,14 +1058,18 @@ class VCD:
 
         # Remove from VCD frame intervals
         if 'frame_intervals' in self.data['vcd']:
-            fis_dict = self.data['vcd']['frame_intervals']
-            fis_dict_new = utils.rm_frame_from_frame_intervals(fis_dict, frame_num)
+            fis_num = self.__sync_vcd_frame_intervals((frame_num, frame_num)).get()
+            idx = utils.find_frame_interval(frame_num, fis_num)
+            if idx != -1:
+                self.__fis.rm_frame(frame_num)
+                # rm_frame replaces the interval at idx by zero, one or two intervals
+                num_new = len(fis_num) + 1 - len(self.__fis_dict)
+                self.__fis_dict[idx:idx + 1] = utils.as_frame_intervals_array_dict(fis_num[idx:idx + num_new])
 
             # Now substitute
-            if len(fis_dict_new) == 0:
+            if len(self.__fis_dict) == 0:
                 del self.data['vcd']['frame_intervals']
-            else:
-                self.data['vcd']['frame_intervals'] = fis_dict_new
+                self.__fis_dict = None
 
 
     def __compute_data_pointers(self):
@@ -785,6 +1111,7 @@ class VCD:
                                             # No need to manage attributes
 
     def rm_element_data_from_frames_by_name(self, element_type, uid, element_data_name, frame_intervals):
+        self.__touch_element_data(element_type, uid.as_str())
         for fi in frame_intervals.get():
             for f in range(fi[0], fi[1] + 1):
                 if self.has_frame(f):
@@ -794,14 +1121,17 @@ class VCD:
                             element = frame[element_type.name + 's'][uid.as_str()]
                             if element_type.name + '_data' in element:
                                 # Delete only the element_data with the specified name
-                                for prop in element[element_type.name + '_data']:
-                                    val_array = element[element_type.name + '_data'][prop]
-                                    for i in range(0, len(val_array)):
-                                        val = val_array[i]
-                                        if val['name'] == element_data_name:
-                                            del element[element_type.name + '_data'][prop][i]
+                                pos = self.__find_element_data(element_type, uid.as_str(), f, element,
+                                                               element_data_name)
+                                while pos is not None:
+                                    del element[element_type.name + '_data'][pos[0]][pos[1]]
+                                    # Positions after the deleted one have changed
+                                    self.__rm_element_data_index(element_type, uid.as_str(), f)
+                                    pos = self.__find_element_data(element_type, uid.as_str(), f, element,
+                                                                   element_data_name)
 
     def rm_element_data_from_frames(self, element_type, uid, frame_intervals):
+        self.__touch_element_data(element_type, uid.as_str())
         for fi in frame_intervals.get():
             for f in range(fi[0], fi[1] + 1):
                 if self.has_frame(f):
@@ -812,6 +1142,7 @@ class VCD:
                             if element_type.name + '_data' in element:
                                 # Delete all its former dyamic element_data entries at old fis
                                 del element[element_type.name + '_data']
+                                self.__rm_element_data_index(element_type, uid.as_str(), f)
 
         # Clean-up data pointers of object_data that no longer exist!
         # Note, element_data_pointers are correctly updated, but there might be some now declared as static
@@ -835,8 +1166,13 @@ class VCD:
                                         break
                         if not found:
                             edp_names_to_delete.append(edp_name)
+                indexes = self.__get_valid_indexes(element_type, len(self.data['vcd'][element_type.name + 's']))
                 for edp_name in edp_names_to_delete:
                     del element[element_type.name + '_data_pointers'][edp_name]
+                    if indexes is not None and edp_name in indexes['data_name']:
+                        indexes['data_name'][edp_name].pop(uid.as_str(), None)
+                        if len(indexes['data_name'][edp_name]) == 0:
+                            del indexes['data_name'][edp_name]
 
     ##################################################
     # Public API: add, update
@@ -882,6 +1218,7 @@ class VCD:
 
     def add_coordinate_system(self, name, cs_type, parent_name="", pose_wrt_parent=[], uid=None):
         assert(isinstance(cs_type, types.CoordinateSystemType))
+        self.__cs_version += 1
         # Create entry
         self.data['vcd'].setdefault('coordinate_systems', {})
         self.data['vcd']['coordinate_systems'][name] = {'type': cs_type.name,
@@ -908,6 +1245,8 @@ class VCD:
         assert(isinstance(transform, types.Transform))
 
         self.__add_frame(frame_num)  # this function internally checks if the frame already exists
+        self.__transforms_versions[frame_num] = self.__transforms_versions.get(frame_num, 0) + 1
+        self.__transforms_versions[None] = self.__transforms_versions.get(None, 0) + 1
         self.data['vcd']['frames'][frame_num].setdefault('frame_properties', dict())
         self.data['vcd']['frames'][frame_num]['frame_properties'].setdefault('transforms', dict())
         self.data['vcd']['frames'][frame_num]['frame_properties']['transforms'].update(transform.data)
@@ -1004,56 +1343,88 @@ class VCD:
                     warnings.warn('WARNING: Trying to add stream properties for non-existing stream. '
                                   'Use add_stream first.')
 
-    def save_frame(self, frame_num, file_name, dynamic_only=True, pretty=False):
-        string = self.stringify_frame(frame_num, dynamic_only, pretty)
-        file = open(file_name, 'w')
+    def save_frame(self, frame_num, file_name, dynamic_only=True, pretty=False, validate=False):
+        string = self.stringify_frame(frame_num, dynamic_only, pretty, validate)
+        file = open(file_name, 'w', encoding='utf-8')
         file.write(string)
         file.close()
 
     def save(self, file_name, pretty=False, validate=False):
-        string = self.stringify(pretty, validate)
-        file = open(file_name, 'w')
-        file.write(string)
-        file.close()
-
-    def validate(self, stringified_vcd):
-        temp = json.loads(stringified_vcd)
+        # Frames are encoded and written one by one (see jsonio.save), and files ending with .gz are compressed
+        if validate:
+            self.validate()
+        jsonio.save(self.data, file_name, pretty)
+
+    def validate(self, stringified_vcd=None, structural_only=False):
+        # Validates the content in memory (or stringified_vcd, if provided) with a validator compiled only once
+        # (see validation.get_validator). Raises errors if not validated
+        # If structural_only, only the main invariants are checked, which is much faster
+        if stringified_vcd is not None:
+            data = jsonio.loads(stringified_vcd)
+        else:
+            data = self.data
+        if structural_only:
+            validation.validate_structure(data)
+            return
+        if not hasattr(self, 'schema'):
+            self.schema = schema.vcd_schema
+        validation.validate(data, self.schema)
+
+    def validate_frame(self, frame_num, structural_only=False):
+        # Validates a single frame (as stored, i.e. its dynamic content) in O(frame) time, so frames can be
+        # validated as they are produced. Raises errors if not validated
+        frame = self.get_frame(frame_num)
+        if frame is None:
+            warnings.warn("WARNING: Trying to validate a non-existing frame.")
+            return
+        validation.validate_frame_structure(self.data['vcd'], frame_num, frame)
+        if not structural_only:
+            if not hasattr(self, 'schema'):
+                self.schema = schema.vcd_schema
+            validation.validate_frame(frame, self.schema)
+
+    def validate_element(self, element_type, uid):
+        # Validates the static content of a single element. Raises errors if not validated
+        element = self.get_element(element_type, uid)
+        if element is None:
+            warnings.warn("WARNING: Trying to validate a non-existing element.")
+            return
         if not hasattr(self, 'schema'):
             self.schema = schema.vcd_schema
-        validate(instance=temp, schema=self.schema)
+        validation.validate_element(element_type.name, element, self.schema)
 
     def stringify(self, pretty=True, validate=True):
-        if pretty:
-            stringified_vcd = json.dumps(self.data, indent=4, sort_keys=False)
-
-        else:
-            stringified_vcd = json.dumps(self.data, separators=(',', ':'), sort_keys=False)
+        # The content is validated as it is, before encoding it
         if validate:
-            self.validate(stringified_vcd)
-        return stringified_vcd
+            self.validate()
+        # Encoded with the fastest JSON backend available (see jsonio.set_backend)
+        return jsonio.dumps(self.data, pretty)
 
-    def stringify_frame(self, frame_num, dynamic_only=True, pretty=False):
+    def stringify_frame(self, frame_num, dynamic_only=True, pretty=False, validate=False):
         if frame_num not in self.data['vcd']['frames']:
             warnings.warn("WARNING: Trying to stringify a non-existing frame.")
             return ''
+        if validate:
+            self.validate_frame(frame_num)
 
         if dynamic_only:
             if pretty:
-                return json.dumps(self.data['vcd']['frames'][frame_num], indent=4, sort_keys=True)
+                return jsonio.dumps(self.get_frame(frame_num), pretty=True, sort_keys=True)
             else:
-                return json.dumps(self.data['vcd']['frames'][frame_num])
+                # Compact frames keep the separators of json.dumps (unlike stringify)
+                return jsonio.dumps(self.get_frame(frame_num), separators=FRAME_SEPARATORS)
 
         else:
             # Need to compose dynamic and static information into a new structure
             # Copy the dynamic info first
-            frame_static_dynamic = copy.deepcopy(self.data['vcd']['frames'][frame_num])  # Needs to be a copy!
+            frame_static_dynamic = copy.deepcopy(self.get_frame(frame_num))  # Needs to be a copy!
 
             # Now the static info for objects, actions, events, contexts and relations
             # Relations can be frame-less or frame-specific
             for element_type in ElementType:
                 # First, elements explicitly defined for this frame
-                if element_type.name + 's' in self.data['vcd']['frames'][frame_num]:
-                    for uid, content in self.data['vcd']['frames'][frame_num][element_type.name + 's'].items():
+                if element_type.name + 's' in self.get_frame(frame_num):
+                    for uid, content in self.get_frame(frame_num)[element_type.name + 's'].items():
                         frame_static_dynamic[element_type.name + 's'][uid].update(
                             self.data['vcd'][element_type.name + 's'][uid]
                         )
@@ -1079,9 +1450,9 @@ class VCD:
                                 del frame_static_dynamic[element_type.name + 's'][uid]['frame_intervals']
 
             if pretty:
-                return json.dumps(frame_static_dynamic, indent=4, sort_keys=True)
+                return jsonio.dumps(frame_static_dynamic, pretty=True, sort_keys=True)
             else:
-                return json.dumps(frame_static_dynamic)
+                return jsonio.dumps(frame_static_dynamic, separators=FRAME_SEPARATORS)
 
     def add_object(self, name, semantic_type='', frame_value=None, uid=None, ont_uid=None, coordinate_system=None,
                    set_mode=SetMode.union):
@@ -1228,6 +1599,28 @@ class VCD:
         return self.__set_element_data(element_type, UID(uid), element_data, FrameIntervals(frame_value),
                                        set_mode)
 
+    def add_object_data_batch(self, object_data_list):
+        self.add_element_data_batch(ElementType.object, object_data_list)
+
+    def add_action_data_batch(self, action_data_list):
+        self.add_element_data_batch(ElementType.action, action_data_list)
+
+    def add_event_data_batch(self, event_data_list):
+        self.add_element_data_batch(ElementType.event, event_data_list)
+
+    def add_context_data_batch(self, context_data_list):
+        self.add_element_data_batch(ElementType.context, context_data_list)
+
+    def add_element_data_batch(self, element_type, element_data_list):
+        """
+        Adds many element_data at once, e.g. all the detections of a sequence.
+        element_data_list is an iterable of (uid, element_data, frame_value) tuples. The result is the same as
+        calling add_element_data(element_type, uid, element_data, frame_value) for each entry, with SetMode.union,
+        but Elements and element_data_pointers are updated once per Element instead of once per entry.
+        """
+        assert(isinstance(element_type, ElementType))
+        self.__set_element_data_batch(element_type, element_data_list)
+
     ##################################################
     # Get / Read
     ##################################################
@@ -1320,6 +1713,9 @@ class VCD:
     def get_element_uid_by_name(self, element_type, name):
         if not self.has_elements(element_type):
             return None
+        if self.use_indexes:
+            uids_str = self.__query_indexes(element_type, 'name', name)
+            return uids_str[0] if len(uids_str) > 0 else None
         element_type_name = element_type.name
         elements = self.data['vcd'][element_type_name + 's']
         for uid, element in elements.items():
@@ -1347,20 +1743,40 @@ class VCD:
         if 'frames' not in self.data['vcd']:
             return None
         else:
-            frame = self.data['vcd']['frames'].get(frame_num)
+            frames = self.data['vcd']['frames']
+            if isinstance(frames, jsonio.LazyFrames):
+                # Lazy frames are read without keeping them all in memory
+                return frames.peek(frame_num)
+            frame = frames.get(frame_num)
             return frame
 
     def get_elements_of_type(self, element_type, semantic_type):
         uids_str = []
         if not element_type.name + 's' in self.data['vcd']:
             return uids_str
+        if self.use_indexes:
+            return self.__query_indexes(element_type, 'type', semantic_type)
         for uid_str, element in self.data['vcd'][element_type.name + 's'].items():
             if element['type'] == semantic_type:
                 uids_str.append(uid_str)
         return uids_str
 
+    def get_elements_with_ontology_uid(self, element_type, ont_uid):
+        uids_str = []
+        if not element_type.name + 's' in self.data['vcd']:
+            return uids_str
+        ont_uid_str = UID(ont_uid).as_str()
+        if self.use_indexes:
+            return self.__query_indexes(element_type, 'ontology_uid', ont_uid_str)
+        for uid_str, element in self.data['vcd'][element_type.name + 's'].items():
+            if element.get('ontology_uid') == ont_uid_str:
+                uids_str.append(uid_str)
+        return uids_str
+
     def get_elements_with_element_data_name(self, element_type, data_name):
         uids_str = []
+        if self.use_indexes:
+            return self.__query_indexes(element_type, 'data_name', data_name)
         for uid_str in self.data['vcd'][element_type.name + 's']:
             element = self.data['vcd'][element_type.name + 's'][uid_str]
             if element_type.name + '_data_pointers' in element:
@@ -1438,7 +1854,7 @@ class VCD:
 
     def get_element_data(self, element_type, uid, data_name, frame_num=None):
         element_exists = self.has(element_type, uid)
-        vcd_has_frames = not self.get_frame_intervals().empty()
+        vcd_has_frames = not self.__sync_vcd_frame_intervals().empty()
 
         if not element_exists:  # the element does not exist
             return None
@@ -1449,42 +1865,24 @@ class VCD:
         frame_num_is_number = isinstance(frame_num, int)
         uid_str = UID(uid).as_str()
 
-        element_exists_in_this_frame = False
         if frame_num is not None and frame_num_is_number:
             # The user is asking for frame-specific attributes
-
-            found_in_frame = False
             frame = self.get_frame(frame_num)
-            if frame is not None:
-                if element_type.name + 's' in frame:
-                    if uid_str in frame[element_type.name + 's']:
-                        element_exists_in_this_frame = True
-                        element = frame[element_type.name + 's'][uid_str]
-                        if element_type.name + '_data' in element:
-                            for prop in element[element_type.name + '_data']:
-                                val_array = element[element_type.name + '_data'][prop]
-                                for val in val_array:
-                                    if val['name'] == data_name:
-                                        return val
-            if not found_in_frame:
+            if frame is None or element_type.name + 's' not in frame or uid_str not in frame[element_type.name + 's']:
                 # The user has asked to get an element_data for a certain frame, but there is no info about this
-                # element or element_data at this frame
-                if not element_exists_in_this_frame:
-                    return None
-                element = self.data['vcd'][element_type.name + 's'][uid_str]  # the element exists because of prev. ctrl
-                for prop in element[element_type.name + '_data']:
-                    val_array = element[element_type.name + '_data'][prop]
-                    for val in val_array:
-                        if val['name'] == data_name:
-                            return val
-        else:
-            # The user is asking for static attributes at the root of the element
-            element = self.data['vcd'][element_type.name + 's'][uid_str]  # the element exists because of prev. ctrl
-            for prop in element[element_type.name + '_data']:
-                val_array = element[element_type.name + '_data'][prop]
-                for val in val_array:
-                    if val['name'] == data_name:
-                        return val
+                # element at this frame
+                return None
+            element = frame[element_type.name + 's'][uid_str]
+            pos = self.__find_element_data(element_type, uid_str, frame_num, element, data_name)
+            if pos is not None:
+                return element[element_type.name + '_data'][pos[0]][pos[1]]
+
+        # The user is asking for static attributes at the root of the element, or there is no such element_data at
+        # the asked frame
+        element = self.data['vcd'][element_type.name + 's'][uid_str]  # the element exists because of prev. ctrl
+        pos = self.__find_element_data(element_type, uid_str, None, element, data_name)
+        if pos is not None:
+            return element[element_type.name + '_data'][pos[0]][pos[1]]
         return None
 
     def get_object_data(self, uid, data_name, frame_num=None):
@@ -1574,6 +1972,24 @@ class VCD:
                 return True
         return False
 
+    def get_coordinate_systems_version(self):
+        # Counter of the changes made to the coordinate systems through this API (e.g. used by scl.Scene to know
+        # when its cached transforms are outdated)
+        return self.__cs_version
+
+    def get_transforms_version(self, frame_num=None):
+        # Counter of the changes made to the transforms of frame_num (or of any frame, if None) through add_transform
+        return self.__transforms_versions.get(frame_num, 0)
+
+    def get_element_data_version(self, element_type, uid):
+        # Counter of the changes made to the element_data of an Element, at any frame, through this API (e.g. used
+        # by draw.Image and draw.TopView to know when their cached trajectories are outdated)
+        return self.__element_data_versions.get((element_type, UID(uid).as_str()), 0)
+
+    def __touch_element_data(self, element_type, uid_str):
+        key = (element_type, uid_str)
+        self.__element_data_versions[key] = self.__element_data_versions.get(key, 0) + 1
+
     def get_coordinate_systems(self):
         if 'coordinate_systems' in self.data['vcd']:
             return copy.deepcopy(self.data['vcd']['coordinate_systems'])
@@ -1606,10 +2022,9 @@ class VCD:
             return None
 
     def get_frame_intervals(self):
-        if 'frame_intervals' in self.data['vcd']:
-            return FrameIntervals(self.data['vcd']['frame_intervals'])
-        else:
-            return FrameIntervals()
+        # Returns a copy, so the caller can't modify the live frame intervals of the VCD (all of them are checked,
+        # as the copy is linear anyway)
+        return FrameIntervals(list(self.__sync_vcd_frame_intervals((-math.inf, math.inf)).get()))
 
     def get_element_frame_intervals(self, element_type, uid):
         uid_str = UID(uid).as_str()
@@ -1638,13 +2053,8 @@ class VCD:
     # Remove
     ##################################################
     def rm_element_by_type(self, element_type, semantic_type):
-        elements = self.data['vcd'][element_type.name + 's']
-
         # Get Element from summary
-        uids_to_remove_str = []
-        for uid_str, element in elements.items():
-            if element['type'] == semantic_type:
-                uids_to_remove_str.append(uid_str)
+        uids_to_remove_str = self.get_elements_of_type(element_type, semantic_type)
         for uid_str in uids_to_remove_str:
             self.rm_element(element_type, uid_str)
 
@@ -1671,6 +2081,7 @@ class VCD:
         # Get element from summary
         if not self.has(element_type, uid):
             return
+        self.__touch_element_data(element_type, uid_str)
 
         # Remove from frames: let's read frame_intervals from summary
         elements = self.data['vcd'][element_type.name + 's']
@@ -1679,6 +2090,7 @@ class VCD:
             for i in range(0, len(element['frame_intervals'])):
                 fi = element['frame_intervals'][i]
                 for frame_num in range(fi['frame_start'], fi['frame_end']+1):
+                    self.__rm_element_data_index(element_type, uid_str, frame_num)
                     elements_in_frame = self.data['vcd']['frames'][frame_num][element_type.name + 's']
                     if uid in elements_in_frame:
                         del elements_in_frame[uid_str]
@@ -1689,6 +2101,11 @@ class VCD:
                             self.__rm_frame(frame_num)
 
         # Delete this element from summary
+        self.__rm_element_data_index(element_type, uid_str, None)
+        indexes = self.__get_valid_indexes(element_type, len(elements))
+        if indexes is not None:
+            self.__unindex_element(element_type, indexes, uid_str, element)
+            indexes['size'] -= 1
         del elements[uid_str]
         if len(elements) == 0:
             del self.data['vcd'][element_type.name + 's']
@@ -12,8 +12,16 @@ VCD is distributed under MIT License. See LICENSE.
 """
 
 import copy
+import hashlib
+import json
+import os
+import collections
+import multiprocessing
+import uuid
+import zipfile
 from random import randint
 import vcd.core as core
+import vcd.types as types
 import vcd.utils as utils
 import vcd.scl as scl
 import numpy as np
@@ -22,6 +30,12 @@ import warnings
 
 import matplotlib.pyplot as plt
 
+# Number of pixels of the top view projected at once to compute its remap tables
+TOPVIEW_MAPS_BLOCK_SIZE = 16384
+
+# State of the processes of a FrameRenderer: the render function of the process, created once
+_render_worker = dict()
+
 
 class SetupViewer:
     def __init__(self, scene, coordinate_system):
@@ -112,7 +126,9 @@ class TopView:
         def __init__(self, stepX=None, stepY=None, background_color=None, topViewSize=None, rangeX=None, rangeY=None,
                      colorMap=None, ignore_classes=None,
                      draw_grid=None,
-                     draw_only_current_image=None):
+                     draw_only_current_image=None,
+                     maps_cache_dir=None,
+                     bev_fixed_point=None):
             self.topViewSize = (1920, 1080)  # width, height
             if topViewSize is not None:
                 assert (isinstance(topViewSize, tuple))
@@ -175,6 +191,18 @@ class TopView:
             else:
                 self.draw_only_current_image = draw_only_current_image
 
+            # Directory where the remap tables of static cameras are stored, so they are computed only once
+            # (None means no disk cache)
+            self.maps_cache_dir = maps_cache_dir
+
+            # BEV compositing with fixed-point remap tables and pre-normalised weights, restricted to the region of
+            # the top view seen by each camera. Faster for video-rate rendering, with differences of a few gray levels
+            # with respect to the float compositing
+            if bev_fixed_point is None:
+                self.bev_fixed_point = False
+            else:
+                self.bev_fixed_point = bev_fixed_point
+
     def __init__(self, scene, coordinate_system, params=None):
         # scene contains the VCD and helper functions for transforms and projections
         assert(isinstance(scene, scl.Scene))
@@ -193,6 +221,13 @@ class TopView:
         self.topView.fill(self.params.backgroundColor) 
         self.images = {}
 
+        # Buffers of the fixed-point BEV compositing, reused at each frame
+        self.__acc8 = None
+        self.__acc32 = None
+
+        # Trajectories of the cuboids of objects, by (uid, cuboid name)
+        self.__trajectories = dict()
+
     def add_images(self, imgs, frameNum):
         """
         This function adds images to the TopView representation. By specifying the frame num and the camera name,
@@ -201,6 +236,9 @@ class TopView:
 
         The function pre-computes all the necessary variables to create the TopView, such as the homography from
         image plane to world plane, or the camera region of interest, which is stored in scene.cameras dictionary
+
+        The remap tables of static cameras are computed only once, and stored in params.maps_cache_dir (if defined)
+        so they are loaded in subsequent runs
         :param imgs: dictionary of images
         :param frameNum: frame number
         :return: nothing
@@ -219,8 +257,6 @@ class TopView:
             num_cams = len(imgs)
             cams = {}
             need_to_recompute_weights_acc = False
-            need_to_recompute_maps = {}
-            need_to_recompute_weights = {}
             for cam_name, img in imgs.items():
                 assert self.scene.vcd.has_coordinate_system(cam_name)
                 cam = self.scene.get_camera(cam_name, frameNum, compute_remaps=False)  # this call creates an entry inside scene
@@ -229,64 +265,130 @@ class TopView:
                 self.images[cam_name]['img'] = img
                 t_ref_to_cam_4x4, static = self.scene.get_transform(self.coordinate_system, cam_name, frameNum)
 
-                # Compute distances to this camera and add to weight map
-                need_to_recompute_maps[cam_name] = False
-                need_to_recompute_weights[cam_name] = False
-
-                if (num_cams > 1 and not static) or (
-                        num_cams > 1 and static and 'weights' not in self.images[cam_name]):
-                    need_to_recompute_weights[cam_name] = True
-                    need_to_recompute_weights_acc = True
-
-                if (not static) or (static and 'mapX' not in self.images[cam_name]):
-                    need_to_recompute_maps[cam_name] = True
-
+                # Static cameras keep their maps and weights, dynamic ones need them at each frame
+                need_to_recompute_maps = (not static) or (static and 'mapX' not in self.images[cam_name])
+                need_to_recompute_weights = (num_cams > 1 and not static) or (
+                        num_cams > 1 and static and 'weights' not in self.images[cam_name])
+                if not need_to_recompute_maps and not need_to_recompute_weights:
+                    continue
 
-                if need_to_recompute_maps[cam_name]:
+                cache_file_name = None
+                if static and self.params.maps_cache_dir is not None:
+                    cache_file_name = self.__get_maps_cache_file_name(cam_name, frameNum, t_ref_to_cam_4x4)
+                maps = None
+                if cache_file_name is not None:
+                    maps = self.__load_maps_cache(cache_file_name)
+                    if maps is not None:
+                        print(cam_name + ' top view remap loaded from ' + cache_file_name)
+                if maps is not None:
+                    mapX, mapY, weights = maps
+                else:
                     print(cam_name + ' top view remap computation...')
-                    self.images[cam_name]['mapX'] = np.zeros((h, w), dtype=np.float32)
-                    self.images[cam_name]['mapY'] = np.zeros((h, w), dtype=np.float32)
-
-                if need_to_recompute_weights[cam_name]:
-                    print(cam_name + ' top view weights computation...')
-                    self.images[cam_name].setdefault('weights', np.zeros((h, w, 3), dtype=np.float32))
-
-            # Loop over top view domain
-            for i in range(0, h):
-                # Read all pixels pos of this row
-                points2d_z0_3xN = np.array([np.linspace(0, w - 1, num=w),
-                                            i * np.ones(w),
-                                            np.ones(w)])
-                # from pixels to points 3d
-                temp = utils.inv(self.params.S).dot(points2d_z0_3xN)
-                # hom. coords.
-                points3d_z0_4xN = np.vstack((temp[0, :], temp[1, :], np.zeros(w), temp[2, :]))
-
-                # Loop over cameras
-                for idx, (cam_name, cam) in enumerate(cams.items()):
-                    # Convert into camera coordinate system for all M cameras
-                    t_ref_to_cam_4x4, static = self.scene.get_transform(self.coordinate_system, cam_name, frameNum)
-                    points3d_cam_4xN = t_ref_to_cam_4x4.dot(points3d_z0_4xN)
-
-                    if need_to_recompute_weights[cam_name]:
-                            self.images[cam_name]['weights'][i, :, 0] = 1.0/np.linalg.norm(points3d_cam_4xN, axis=0)
-                            self.images[cam_name]['weights'][i, :, 1] = self.images[cam_name]['weights'][i, :, 0]
-                            self.images[cam_name]['weights'][i, :, 2] = self.images[cam_name]['weights'][i, :, 0]
-
-                    if need_to_recompute_maps[cam_name]:
-                        # Project into image
-                        points2d_dist_3xN, idx_valid = cam.project_points3d(points3d_cam_4xN)
-
-                        # Assign into map
-                        self.images[cam_name]['mapX'][i, :] = points2d_dist_3xN[0, :]
-                        self.images[cam_name]['mapY'][i, :] = points2d_dist_3xN[1, :]
+                    mapX, mapY, weights = self.__compute_maps(cam, t_ref_to_cam_4x4)
+                    if cache_file_name is not None:
+                        self.__save_maps_cache(cache_file_name, mapX, mapY, weights)
+
+                if need_to_recompute_maps:
+                    self.images[cam_name]['mapX'] = mapX
+                    self.images[cam_name]['mapY'] = mapY
+                    if self.params.bev_fixed_point:
+                        self.__convert_maps_fixed_point(cam_name)
+                if need_to_recompute_weights:
+                    self.images[cam_name]['weights'] = np.repeat(weights[:, :, np.newaxis], 3, axis=2)
+                    need_to_recompute_weights_acc = True
 
             # Compute accumulated weights if more than 1 camera
             if need_to_recompute_weights_acc:
                 self.images['weights_acc'] = np.zeros((h, w, 3), dtype=np.float32)
                 for idx, (cam_name, cam) in enumerate(cams.items()):
                     self.images['weights_acc'] = cv.add(self.images[cam_name]['weights'], self.images['weights_acc'])
-
+                if self.params.bev_fixed_point:
+                    # Weights are normalised once, so the BEVs are composed without divisions at each frame
+                    for cam_name in cams:
+                        roi = self.images[cam_name]['roi']
+                        if roi is not None:
+                            r0, r1, c0, c1 = roi
+                            self.images[cam_name]['weights_norm'] = cv.divide(
+                                self.images[cam_name]['weights'][r0:r1, c0:c1],
+                                self.images['weights_acc'][r0:r1, c0:c1])
+
+    def __compute_maps(self, cam, t_ref_to_cam_4x4):
+        # Computes the remap tables (mapX, mapY) from the camera image to the top view, and the weights of the
+        # camera for each pixel of the top view (inverse of the distance to the camera)
+        # Pixels are projected in blocks of rows, which keeps the arrays small enough to be processed in cache
+        h = self.params.topViewSize[1]
+        w = self.params.topViewSize[0]
+        mapX = np.zeros((h, w), dtype=np.float32)
+        mapY = np.zeros((h, w), dtype=np.float32)
+        weights = np.zeros((h, w), dtype=np.float32)
+        S_inv = utils.inv(self.params.S)
+        block_rows = max(1, TOPVIEW_MAPS_BLOCK_SIZE // w)
+        for i in range(0, h, block_rows):
+            rows = min(block_rows, h - i)
+            # Read all pixels pos of these rows
+            cols_block, rows_block = np.meshgrid(np.arange(0, w, dtype=float), np.arange(i, i + rows, dtype=float))
+            points2d_z0_3xN = np.vstack((cols_block.flatten(), rows_block.flatten(), np.ones(w * rows)))
+            # from pixels to points 3d
+            temp = S_inv.dot(points2d_z0_3xN)
+            # hom. coords.
+            points3d_z0_4xN = np.vstack((temp[0, :], temp[1, :], np.zeros(w * rows), temp[2, :]))
+
+            # Convert into camera coordinate system
+            points3d_cam_4xN = t_ref_to_cam_4x4.dot(points3d_z0_4xN)
+            weights[i:i + rows, :] = (1.0 / np.linalg.norm(points3d_cam_4xN, axis=0)).reshape(rows, w)
+
+            # Project into image
+            points2d_dist_3xN, idx_valid = cam.project_points3d(points3d_cam_4xN)
+            mapX[i:i + rows, :] = points2d_dist_3xN[0, :].reshape(rows, w)
+            mapY[i:i + rows, :] = points2d_dist_3xN[1, :].reshape(rows, w)
+        return mapX, mapY, weights
+
+    def __get_maps_cache_file_name(self, cam_name, frameNum, t_ref_to_cam_4x4):
+        # The remap tables depend on the calibration of the camera (intrinsics, at frameNum if defined there, and
+        # pose with respect to the top view) and on the size and range of the top view
+        stream_properties = self.scene.vcd.get_stream(cam_name).get('stream_properties', {})
+        if frameNum is not None:
+            vcd_frame = self.scene.vcd.get_frame(frameNum)
+            if vcd_frame is not None:
+                stream_properties = vcd_frame.get('frame_properties', {}).get('streams', {}).get(cam_name, {}).get(
+                    'stream_properties', stream_properties)
+        key = hashlib.sha1()
+        key.update(json.dumps(stream_properties, sort_keys=True).encode('utf-8'))
+        key.update(np.ascontiguousarray(t_ref_to_cam_4x4, dtype=float).tobytes())
+        key.update(np.ascontiguousarray(self.params.S, dtype=float).tobytes())
+        key.update(str(self.params.topViewSize).encode('utf-8'))
+        return os.path.join(self.params.maps_cache_dir, 'topview_' + cam_name + '_' + key.hexdigest() + '.npz')
+
+    def __load_maps_cache(self, cache_file_name):
+        # Returns the (mapX, mapY, weights) of a cache file, or None if it does not exist or can't be read (e.g. it
+        # was written by a process which was killed), so they are computed again
+        if not os.path.isfile(cache_file_name):
+            return None
+        shape = (self.params.topViewSize[1], self.params.topViewSize[0])
+        try:
+            with np.load(cache_file_name) as maps:
+                mapX, mapY, weights = maps['mapX'], maps['mapY'], maps['weights']
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            warnings.warn("WARNING: Unable to read the top view remap cache " + cache_file_name + ", recomputing it.")
+            return None
+        if mapX.shape != shape or mapY.shape != shape or weights.shape != shape:
+            warnings.warn("WARNING: Unable to read the top view remap cache " + cache_file_name + ", recomputing it.")
+            return None
+        return mapX, mapY, weights
+
+    def __save_maps_cache(self, cache_file_name, mapX, mapY, weights):
+        # The maps are written into a temporary file of the same directory, which then replaces the cache file, so
+        # other processes sharing the cache never read a partially written file
+        os.makedirs(self.params.maps_cache_dir, exist_ok=True)
+        temp_file_name = os.path.join(self.params.maps_cache_dir,
+                                      '.' + uuid.uuid4().hex[0:8] + '.' + os.path.basename(cache_file_name))
+        try:
+            with open(temp_file_name, 'wb') as file:
+                np.savez(file, mapX=mapX, mapY=mapY, weights=weights)
+            os.replace(temp_file_name, cache_file_name)
+        finally:
+            if os.path.isfile(temp_file_name):
+                os.remove(temp_file_name)
 
     def draw(self, frameNum, uid=None, _drawTrajectory=True):
         """
@@ -443,44 +545,7 @@ class TopView:
                                                uid)
 
                         if _drawTrajectory:
-                            fis_object = self.scene.vcd.get_object_data_frame_intervals(uid, cuboid_name)
-                            if fis_object.empty():
-                                # So this object is static, let's project its cuboid into the current transform
-                                fis = self.scene.vcd.get_frame_intervals().get_dict()
-                            else:
-                                fis = fis_object.get_dict()
-
-                            for fi in fis:
-                                prev_center = dict()
-                                for f in range(fi['frame_start'], _frameNum + 1):
-                                    object_data_item = self.scene.vcd.get_object_data(uid, cuboid_name, f)
-
-                                    cuboid_vals = object_data_item['val']
-                                    cuboid_vals_transformed = cuboid_vals
-                                    if cs_data != self.coordinate_system:
-                                        src_cs = cs_data
-                                        dst_cs = self.coordinate_system
-                                        transform_src_dst, static = self.scene.get_transform(src_cs,
-                                                                                dst_cs, f)
-                                        if transform_src_dst is not None:
-                                            cuboid_vals_transformed = utils.transform_cuboid(
-                                                cuboid_vals, transform_src_dst)
-
-                                    name = object_data_item['name']
-
-                                    center = (cuboid_vals_transformed[0], cuboid_vals_transformed[1])
-                                    center_pix = self.point2Pixel(center)
-
-                                    # this is a dict to allow multiple trajectories
-                                    # (e.g. several cuboids per object)
-                                    if prev_center.get(name) is not None:
-                                        cv.line(_img, prev_center[name], center_pix, (0, 0, 0),
-                                                1, cv.LINE_AA)
-
-                                    cv.circle(_img, center_pix, 2,
-                                              self.params.colorMap[object_class], -1)
-
-                                    prev_center[name] = center_pix
+                            self.__draw_trajectory(_img, uid, cuboid_name, cs_data, object_class, _frameNum)
                     ########################################
                     # mat - points3d_4xN
                     ########################################
@@ -491,7 +556,7 @@ class TopView:
                         if height == 4:
                             # These are points 4xN
                             color = self.params.colorMap[object_class]
-                            points3d_4xN = np.array(object_data_item['val']).reshape(height, width)
+                            points3d_4xN = types.get_mat_array(object_data_item)
                             points_cs = object_data_item['coordinate_system']
 
                             # First convert from the src coordinate system into the camera coordinate system
@@ -508,6 +573,57 @@ class TopView:
 
                             self.draw_points3d(_img, points3d_4xN_transformed, color)
 
+    def __get_trajectory(self, uid, cuboid_name, cs_data):
+        # Returns the frame intervals of the cuboid of the object, and the centers of the cuboid in the coordinate
+        # system of the TopView at all the frames where it is defined, as arrays of N frame numbers and Nx2 centers
+        # The trajectory is computed once per sequence, and again if the frame intervals of the cuboid, the
+        # object_data of the object or the coordinate systems and transforms of the VCD change through its API
+        fis_object = self.scene.vcd.get_object_data_frame_intervals(uid, cuboid_name)
+        if fis_object.empty():
+            # So this object is static, let's project its cuboid into the current transform
+            fis_object = self.scene.vcd.get_frame_intervals()
+        fis = fis_object.get()
+
+        vcd = self.scene.vcd
+        key = (fis, cs_data, vcd.get_element_data_version(core.ElementType.object, uid),
+               vcd.get_coordinate_systems_version(), vcd.get_transforms_version())
+        trajectory = self.__trajectories.get((uid, cuboid_name))
+        if trajectory is not None and trajectory[0] == key:
+            return fis, trajectory[1], trajectory[2]
+
+        frame_nums = [f for fi in fis for f in range(fi[0], fi[1] + 1)]
+        idx = []
+        centers = []
+        for i, f in enumerate(frame_nums):
+            object_data_item = self.scene.vcd.get_object_data(uid, cuboid_name, f)
+            if object_data_item is not None:
+                idx.append(i)
+                centers.append(list(object_data_item['val'][0:3]) + [1.0])
+        centers_4xN = np.array(centers, dtype=float).reshape(-1, 4).T
+        if cs_data != self.coordinate_system and len(idx) > 0:
+            # Transforms at all frames, composed at once
+            transforms_4x4xN, static = self.scene.get_transforms(cs_data, self.coordinate_system, fis)
+            centers_4xN = np.einsum('ijn,jn->in', transforms_4x4xN[:, :, idx], centers_4xN)
+
+        frames = np.array(frame_nums, dtype=int)[idx]
+        centers_Nx2 = centers_4xN[0:2, :].T
+        self.__trajectories[(uid, cuboid_name)] = (key, frames, centers_Nx2)
+        return fis, frames, centers_Nx2
+
+    def __draw_trajectory(self, _img, uid, cuboid_name, cs_data, object_class, _frameNum):
+        fis, frames, centers_Nx2 = self.__get_trajectory(uid, cuboid_name, cs_data)
+        for fi in fis:
+            # Centers from the start of the interval to the current frame
+            start = np.searchsorted(frames, fi[0])
+            end = np.searchsorted(frames, _frameNum, side='right')
+            if start >= end:
+                continue
+            centers_pix = np.round(centers_Nx2[start:end] * [self.params.scaleX, self.params.scaleY] +
+                                   [self.params.offsetX, self.params.offsetY]).astype(np.int32)
+            cv.polylines(_img, [centers_pix], False, (0, 0, 0), 1, cv.LINE_AA)
+            for center_pix in centers_pix.tolist():
+                cv.circle(_img, tuple(center_pix), 2, self.params.colorMap[object_class], -1)
+
     def draw_objects_at_frame(self, topView, uid, _frameNum, _drawTrajectory):
         img = topView
 
@@ -575,6 +691,12 @@ class TopView:
         if num_cams == 0:
             return
 
+        if self.params.bev_fixed_point:
+            acc8 = self.__compose_BEVs_fixed_point(_frameNum)
+            # Copy into topView only new pixels
+            np.copyto(self.topView, acc8, where=acc8 > 0)
+            return
+
         h = self.params.topViewSize[1]
         w = self.params.topViewSize[0]
         # Prepare image with drawing for this call
@@ -601,6 +723,60 @@ class TopView:
         self.topView[nonzero] = acc8[nonzero]
 
 
+    def __convert_maps_fixed_point(self, cam_name):
+        # Converts the remap tables of the camera to fixed-point, only for the region of interest (rows r0:r1 and
+        # columns c0:c1) of the top view where the camera image is seen, so pixels outside are not processed
+        image = self.images[cam_name]
+        h_img, w_img = image['img'].shape[0:2]
+        valid = (image['mapX'] > -1) & (image['mapX'] < w_img) & (image['mapY'] > -1) & (image['mapY'] < h_img)
+        rows = np.flatnonzero(valid.any(axis=1))
+        cols = np.flatnonzero(valid.any(axis=0))
+        if len(rows) == 0:
+            image['roi'] = None
+            return
+        r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        image['roi'] = (r0, r1, c0, c1)
+        image['map1'], image['map2'] = cv.convertMaps(np.ascontiguousarray(image['mapX'][r0:r1, c0:c1]),
+                                                      np.ascontiguousarray(image['mapY'][r0:r1, c0:c1]),
+                                                      cv.CV_16SC2)
+        image['bev8'] = np.zeros((r1 - r0, c1 - c0) + image['img'].shape[2:], dtype=np.uint8)
+        image['bev32'] = np.zeros((r1 - r0, c1 - c0) + image['img'].shape[2:], dtype=np.float32)
+
+    def __compose_BEVs_fixed_point(self, _frameNum):
+        # Composes the BEVs of all cameras, remapping with the fixed-point tables and accumulating each BEV weighted
+        # by its pre-normalised weights, only in the region of interest of each camera
+        h = self.params.topViewSize[1]
+        w = self.params.topViewSize[0]
+        if self.__acc8 is None or self.__acc8.shape != (h, w, 3):
+            self.__acc8 = np.zeros((h, w, 3), dtype=np.uint8)
+            self.__acc32 = np.zeros((h, w, 3), dtype=np.float32)
+        self.__acc8.fill(0)
+
+        weighted = 'weights_acc' in self.images
+        if weighted:
+            self.__acc32.fill(0)
+        for cam_name, image in self.images.items():
+            if cam_name == 'weights_acc' or self.scene.get_camera(cam_name, _frameNum) is None:
+                continue
+            if image.get('roi') is None:
+                continue
+            r0, r1, c0, c1 = image['roi']
+            if weighted:
+                bev8 = cv.remap(image['img'], image['map1'], image['map2'], interpolation=cv.INTER_LINEAR,
+                                dst=image['bev8'], borderMode=cv.BORDER_CONSTANT)
+                cv.multiply(bev8, image['weights_norm'], dst=image['bev32'], dtype=cv.CV_32F)
+                acc32_roi = self.__acc32[r0:r1, c0:c1]
+                cv.add(acc32_roi, image['bev32'], dst=acc32_roi)
+            else:
+                # A single camera is not weighted
+                cv.remap(image['img'], image['map1'], image['map2'], interpolation=cv.INTER_LINEAR,
+                         dst=image['bev8'], borderMode=cv.BORDER_CONSTANT)
+                self.__acc8[r0:r1, c0:c1] = image['bev8']
+
+        if weighted:
+            np.copyto(self.__acc8, self.__acc32, casting='unsafe')
+        return self.__acc8
+
     def size2Pixel(self, _size):
         return (int(round(_size[0] * abs(self.params.scaleX))),
                 int(round(_size[1] * abs(self.params.scaleY))))
@@ -647,6 +823,9 @@ class Image:
         self.camera = self.scene.get_camera(self.camera_coordinate_system)
         self.params = Image.Params()
 
+        # Trajectories of the bboxes of objects, by uid
+        self.__trajectories = dict()
+
     def draw_points3d(self, _img, points3d_4xN, _color):
         # this function may return LESS than N points IF 3D points are BEHIND the camera
         points2d_3xN, idx_valid = self.camera.project_points3d(points3d_4xN)
@@ -694,39 +873,47 @@ class Image:
         cv.putText(_img, _object_class, (pta[0], pta[1] + 10), cv.FONT_HERSHEY_PLAIN, 0.6, (0,0,0), 1, cv.LINE_AA)
         cv.rectangle(_img, pt1, pt2, _color, 2)
 
-    def draw_trajectory(self, _img, _object_id, _frameNum, _params):
-        object_class = self.scene.vcd.get_object(_object_id)['type']
-        fis = (self.scene.vcd.get_element_frame_intervals(core.ElementType.object, _object_id)).get_dict()
-
+    def __get_trajectories(self, _object_id):
+        # Returns the frame intervals of the object, and the centers of its bboxes at all its frames, by bbox name (to
+        # allow multiple trajectories, e.g. several bbox per object), as arrays of N frame numbers and Nx2 centers
+        # The trajectories are computed once per sequence, and again if the frame intervals or the object_data of
+        # the object change through the API of the VCD
+        fis = self.scene.vcd.get_element_frame_intervals(core.ElementType.object, _object_id).get()
+        key = (fis, self.scene.vcd.get_element_data_version(core.ElementType.object, _object_id))
+        trajectories = self.__trajectories.get(_object_id)
+        if trajectories is not None and trajectories[0] == key:
+            return fis, trajectories[1]
+
+        centers = dict()
         for fi in fis:
-            prev_center = dict()
-            for f in range(fi['frame_start'], _frameNum + 1):
+            for f in range(fi[0], fi[1] + 1):
                 vcd_other_frame = self.scene.vcd.get_frame(f)
-                if 'objects' in vcd_other_frame:
-                    for object_id_this, object in vcd_other_frame['objects'].items():
-                        if object_id_this is not _object_id:
-                            continue
-
-                        # Get value at this frame
-                        if "object_data" in object:
-                            for object_data_key in object['object_data'].keys():
-                                for object_data_item in object['object_data'][object_data_key]:
-                                    if object_data_key == "bbox":
-                                        bbox = object_data_item['val']
-                                        name = object_data_item['name']
-
-                                        center = (int(round(bbox[0])), int(round(bbox[1])))
-
-                                        # this is a dict to allow multiple trajectories
-                                        # (e.g. several bbox per object)
-                                        if prev_center.get(name) is not None:
-                                            cv.line(_img, prev_center[name], center, (0, 0, 0),
-                                                    1, cv.LINE_AA)
-
-                                        #cv.circle(_img, center, 2,
-                                        #          _params.colorMap[object_class], -1)
+                if vcd_other_frame is None or _object_id not in vcd_other_frame.get('objects', {}):
+                    continue
+                object_data = vcd_other_frame['objects'][_object_id].get('object_data', {})
+                for object_data_item in object_data.get('bbox', []):
+                    bbox = object_data_item['val']
+                    frames_name, centers_name = centers.setdefault(object_data_item['name'], ([], []))
+                    frames_name.append(f)
+                    centers_name.append((int(round(bbox[0])), int(round(bbox[1]))))
+
+        trajectories = {name: (np.array(frames_name, dtype=int), np.array(centers_name, dtype=np.int32))
+                        for name, (frames_name, centers_name) in centers.items()}
+        self.__trajectories[_object_id] = (key, trajectories)
+        return fis, trajectories
 
-                                        prev_center[name] = center
+    def draw_trajectory(self, _img, _object_id, _frameNum, _params):
+        fis, trajectories = self.__get_trajectories(_object_id)
+        for fi in fis:
+            # Centers from the start of the interval to the current frame, drawn at once
+            polylines = []
+            for frames, centers in trajectories.values():
+                start = np.searchsorted(frames, fi[0])
+                end = np.searchsorted(frames, _frameNum, side='right')
+                if end - start > 1:
+                    polylines.append(centers[start:end])
+            if len(polylines) > 0:
+                cv.polylines(_img, polylines, False, (0, 0, 0), 1, cv.LINE_AA)
 
     '''
     def draw_barrel_distortion_grid(self, img, color, only_outer=True, extended=False):
@@ -878,7 +1065,7 @@ class Image:
                                 if height == 4:
                                     # These are points 4xN
                                     color = self.params.colorMap[object_class]
-                                    points3d_4xN = np.array(object_data_item['val']).reshape(height, width)
+                                    points3d_4xN = types.get_mat_array(object_data_item)
                                     points_cs = object_data_item['coordinate_system']
 
                                     # First convert from the src coordinate system into the camera coordinate system
@@ -998,3 +1185,112 @@ class TextDrawer:
             count += 1
 
         return img
+
+
+def _create_render_function(vcd, create_render_function):
+    # Loads the (read-only) VCD if needed, and creates the render function with its Scene
+    if not isinstance(vcd, core.VCD):
+        vcd = core.VCD(vcd)
+    return create_render_function(scl.Scene(vcd))
+
+
+def _init_render_worker(vcd, create_render_function):
+    # Each process of the pool creates its drawers only once
+    _render_worker['render'] = _create_render_function(vcd, create_render_function)
+
+
+def _render_frame(frame_num, img):
+    return frame_num, _render_worker['render'](frame_num, img)
+
+
+class FrameRenderer:
+    """
+    This class renders the frames of a VCD in a pool of processes, e.g. to record a video of a whole sequence,
+    and returns them in the same order they are provided.
+
+    Each process holds a Scene of the VCD (a core.VCD, or the name of its file, read by each process), and the render
+    function created by create_render_function(scene). The render function is called as render(frame_num, img), and
+    returns the rendered image, e.g.:
+
+    def create_render_function(scene):
+        drawerCamera = draw.Image(scene, "CAM_LEFT")
+        def render(frame_num, img):
+            drawerCamera.draw(img, frame_num, _params=imageParams)
+            return img
+        return render
+
+    As frames are distributed among processes, the render function must not depend on the previous frames (e.g. a
+    TopView with draw_only_current_image=False), and colorMaps should be provided, as random colors are different in
+    each process. create_render_function must be a module-level function if processes are spawned.
+    """
+    def __init__(self, vcd, create_render_function, num_processes=None, max_pending=None):
+        self.vcd = vcd
+        self.create_render_function = create_render_function
+        # num_processes=1 renders in this process, without pool
+        if num_processes is None:
+            self.num_processes = multiprocessing.cpu_count()
+        else:
+            self.num_processes = num_processes
+        # Frames sent to the pool and not returned yet, this bounds the memory used by images
+        if max_pending is None:
+            self.max_pending = 2 * self.num_processes
+        else:
+            self.max_pending = max_pending
+
+    def render(self, frames):
+        """
+        Renders frames, provided as an iterable of (frame_num, img) (e.g. images read from a video), or of frame_num
+        if there are no input images (img is None).
+        :param frames: iterable of (frame_num, img) or of frame_num
+        :return: generator of (frame_num, rendered image), in the order of frames
+        """
+        if self.num_processes <= 1:
+            # The render function is kept by this call, so several renderers can be used in this process
+            render = _create_render_function(self.vcd, self.create_render_function)
+            for frame in frames:
+                frame_num, img = frame if isinstance(frame, tuple) else (frame, None)
+                yield frame_num, render(frame_num, img)
+            return
+
+        with multiprocessing.Pool(self.num_processes, initializer=_init_render_worker,
+                                  initargs=(self.vcd, self.create_render_function)) as pool:
+            pending = collections.deque()
+            for frame in frames:
+                frame_num, img = frame if isinstance(frame, tuple) else (frame, None)
+                pending.append(pool.apply_async(_render_frame, (frame_num, img)))
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def write_video(self, file_name, frames, fps=30.0, fourcc='mp4v'):
+        """
+        Renders frames (see render) into a video file, with the size of the first rendered image.
+        :return: number of frames written
+        """
+        video_writer = None
+        count = 0
+        try:
+            for frame_num, img in self.render(frames):
+                if video_writer is None:
+                    video_writer = cv.VideoWriter(file_name, cv.VideoWriter_fourcc(*fourcc), fps,
+                                                  (img.shape[1], img.shape[0]))
+                video_writer.write(img)
+                count += 1
+        finally:
+            if video_writer is not None:
+                video_writer.release()
+        return count
+
+    def write_images(self, file_name_pattern, frames):
+        """
+        Renders frames (see render) into image files, named as file_name_pattern % frame_num (e.g. "img_%06d.png").
+        :return: list of written file names
+        """
+        file_names = []
+        for frame_num, img in self.render(frames):
+            file_name = file_name_pattern % frame_num
+            if not cv.imwrite(file_name, img):
+                raise Exception("ERROR: Could not write image " + file_name)
+            file_names.append(file_name)
+        return file_names
@@ -0,0 +1,623 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import gzip
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional, faster, backend
+    orjson = None
+
+# Read chunk size (in characters) of the incremental reader
+CHUNK_SIZE = 1 << 20
+
+# Files up to this size (in bytes, as stored) are decoded at once by load with the orjson backend, larger files are
+# read chunk by chunk, so memory is bounded
+LOAD_AT_ONCE_MAX_SIZE = 64 << 20
+
+# Minimum length (in characters) of the text given to orjson to decode a value by the incremental reader
+ORJSON_WINDOW_SIZE = 1 << 10
+
+# Maximum number of parsed frames kept by LazyFrames (besides frames accessed for modification)
+LAZY_CACHE_SIZE = 256
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_INDENT = re.compile(rb'(?m)^( +)')
+
+_scanstring = json.decoder.scanstring
+
+# Value not decoded by orjson in the incremental reader
+_NOT_DECODED = object()
+
+# Marker of the frames in the encoded skeleton of a VCD (see dump), which can't be found in regular content
+_FRAMES_MARKER = '\x00frames\x00'
+
+# JSON backend used to encode and decode VCD content: 'orjson' if installed, 'json' (stdlib) otherwise
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+####################################################
+# Backends
+####################################################
+def _default(obj):
+    # Numeric content can be held as numpy arrays (e.g. the val of a mat, see vcd.types), written as JSON arrays
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Object of type " + type(obj).__name__ + " is not JSON serializable")
+
+
+def _has_non_finite(obj):
+    # Whether obj contains NaN or infinite floats, which the stdlib writes as NaN, Infinity and -Infinity, while
+    # orjson writes them as null
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, dict):
+            pending.extend(dict.values(item))  # not through LazyFrames.values, which reads the frames
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+        elif isinstance(item, (float, np.floating)):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, np.ndarray) and item.dtype.kind in 'fc':
+            if not np.isfinite(item).all():
+                return True
+    return False
+
+
+def set_backend(name):
+    global BACKEND
+    if name not in ('json', 'orjson'):
+        raise Exception("ERROR: Unknown JSON backend " + str(name))
+    if name == 'orjson' and orjson is None:
+        raise Exception("ERROR: orjson is not installed")
+    BACKEND = name
+
+
+def dumps_bytes(obj, pretty=False, sort_keys=False):
+    """
+    Encodes obj as UTF-8 JSON bytes, with the current backend. Non-string keys (e.g. int frame numbers) are
+    written as strings and key order is preserved, as with the stdlib. Pretty output is indented with 4 spaces,
+    compact output has no spaces. Backends may differ in the text of floats (e.g. 1e-05 and 0.00001) and in the
+    escaping of non-ASCII characters, but not in the decoded content: content with NaN or infinite floats, which
+    orjson would write as null, is encoded with the stdlib.
+    """
+    if BACKEND == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        try:
+            encoded = orjson.dumps(obj, default=_default, option=option)
+        except TypeError:
+            # Content not supported by orjson (e.g. big ints, frames of LazyFrames not loaded yet)
+            pass
+        else:
+            # Non-finite floats are written as null, so they are looked for only if there are nulls
+            if b'null' in encoded and _has_non_finite(obj):
+                return dumps(obj, pretty, sort_keys, backend='json').encode('utf-8')
+            if pretty:
+                # JSON strings can't contain newlines, so all leading spaces are indentation
+                encoded = _INDENT.sub(lambda m: m.group(1) * 2, encoded)
+            return encoded
+    return dumps(obj, pretty, sort_keys, backend='json').encode('utf-8')
+
+
+def dumps(obj, pretty=False, sort_keys=False, backend=None, separators=None):
+    """
+    Encodes obj as a JSON string, see dumps_bytes. If separators is not None, compact output uses these
+    (item, key) separators, e.g. (', ', ': ') as json.dumps by default, and is encoded with the stdlib.
+    """
+    if separators is not None and not pretty:
+        return json.dumps(obj, separators=separators, sort_keys=sort_keys, default=_default)
+    if (backend or BACKEND) == 'json':
+        if pretty:
+            return json.dumps(obj, indent=4, sort_keys=sort_keys, default=_default)
+        return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, default=_default)
+    return dumps_bytes(obj, pretty, sort_keys).decode('utf-8')
+
+
+def loads(text):
+    """
+    Decodes a JSON string or bytes with the current backend. Text orjson can't decode (e.g. NaN or Infinity,
+    written by the stdlib) is decoded with the stdlib.
+    """
+    if BACKEND == 'orjson':
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+####################################################
+# Incremental reading
+####################################################
+class JSONChunkReader:
+    """
+    Reads a JSON text from a file object chunk by chunk. Structural tokens ('{', ':', ',', '}') are consumed one
+    by one, while values are decoded as soon as they are complete in the buffer, with orjson if use_orjson (by
+    default, if it is the current backend), or with the stdlib decoder.
+    Consumed text is discarded, so memory is bounded by the largest value that is decoded at once.
+    """
+    def __init__(self, file, chunk_size=CHUNK_SIZE, use_orjson=None):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0  # number of characters read and discarded before buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        if use_orjson is None:
+            use_orjson = BACKEND == 'orjson'
+        self.use_orjson = use_orjson and orjson is not None
+        self.window_size = ORJSON_WINDOW_SIZE
+
+    def __fill(self):
+        # Reads more text, at least as much as the pending one, so decoding a large value is not quadratic
+        chunk = self.file.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.offset += self.pos
+        self.pos = 0
+        return True
+
+    def tell(self):
+        return self.offset + self.pos
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.__fill():
+                return ''
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise json.JSONDecodeError("Expecting '" + token + "'", self.buf, self.pos)
+        self.pos += 1
+
+    def __value_orjson(self):
+        # orjson decodes a whole text, so it is given the text from the value on (up to a window, which grows if
+        # the value is longer, and adapts to the length of the previous value): if there is more content after the
+        # value, its error reports where that content starts, which is then checked to be a delimiter, and the text
+        # up to there is decoded.
+        # Returns _NOT_DECODED if the value can't be decoded this way (e.g. NaN), so the stdlib decodes it
+        window_size = self.window_size
+        while True:
+            end = min(self.pos + window_size, len(self.buf))
+            text = self.buf[self.pos:end]
+            try:
+                val = orjson.loads(text)
+            except orjson.JSONDecodeError as error:
+                if error.pos < len(text):
+                    if text[error.pos] not in ',:]}':
+                        return _NOT_DECODED
+                    try:
+                        val = orjson.loads(text[0:error.pos])
+                    except orjson.JSONDecodeError:
+                        return _NOT_DECODED
+                    self.pos += error.pos
+                    self.window_size = max(ORJSON_WINDOW_SIZE, 2 * error.pos)
+                    return val
+            else:
+                # The value is the whole text, but it might be truncated (e.g. a number) if more text follows
+                if end == len(self.buf) and self.eof:
+                    self.pos = end
+                    return val
+                if end < len(self.buf):
+                    if self.buf[end] in ',:]} \t\n\r':
+                        self.pos = end
+                        return val
+                    return _NOT_DECODED
+            # More text is needed
+            if end < len(self.buf):
+                window_size *= 4
+            elif self.eof:
+                return _NOT_DECODED
+            else:
+                self.__fill()
+
+    def value(self):
+        self.peek()
+        if self.use_orjson:
+            val = self.__value_orjson()
+            if val is not _NOT_DECODED:
+                return val
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value at the very end of the buffer might be truncated (e.g. a number)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.__fill()
+
+    def key(self):
+        # Keys are strings, decoded directly with the string scanner of the stdlib
+        if self.peek() != '"':
+            return self.value()
+        while True:
+            try:
+                key, end = _scanstring(self.buf, self.pos + 1)
+                self.pos = end
+                return key
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.__fill()
+
+    def members(self):
+        # Iterates over the keys of an object, consuming the braces and commas. The caller must consume each value
+        self.expect('{')
+        first = True
+        while self.peek() != '}':
+            if not first:
+                self.expect(',')
+            first = False
+            key = self.key()
+            self.expect(':')
+            yield key
+        self.expect('}')
+
+
+def iter_vcd(file, chunk_size=CHUNK_SIZE):
+    """
+    Iterates over the content of a VCD file object, yielding (path, value) tuples:
+    - ((key,), value) for the top level entries (e.g. 'VCD' for VCD 3.x files),
+    - (('vcd', key), value) for the entries of 'vcd', where 'frames' is yielded as an empty dict,
+    - (('vcd', 'frames', frame_num), frame) for each frame, with int frame_num.
+    Each frame is decoded on its own, so frames can be consumed without loading the entire file.
+    """
+    reader = JSONChunkReader(file, chunk_size)
+    for key in reader.members():
+        if key != 'vcd' or reader.peek() != '{':
+            yield (key,), reader.value()
+            continue
+        for vcd_key in reader.members():
+            if vcd_key != 'frames' or reader.peek() != '{':
+                yield ('vcd', vcd_key), reader.value()
+                continue
+            yield ('vcd', 'frames'), dict()
+            for frame_key in reader.members():
+                yield ('vcd', 'frames', int(frame_key)), reader.value()
+
+
+def open_file(file_name, mode='r'):
+    # Files ending with .gz are (de)compressed with gzip
+    if file_name.endswith('.gz'):
+        if 'b' in mode:
+            return gzip.open(file_name, mode)
+        return gzip.open(file_name, mode + 't', encoding='utf-8')
+    if 'b' in mode:
+        return open(file_name, mode)
+    return open(file_name, mode, encoding='utf-8')
+
+
+def iter_frames(file_name, chunk_size=CHUNK_SIZE):
+    """
+    Yields (frame_num, frame) tuples of a VCD file, one at a time.
+    """
+    with open_file(file_name) as file:
+        for path, value in iter_vcd(file, chunk_size):
+            if len(path) == 3:
+                yield path[2], value
+
+
+def load(file_name, frame_callback=None, chunk_size=CHUNK_SIZE):
+    """
+    Loads a VCD file into a dict, just like json.load, but frames are parsed one by one and directly stored
+    with int keys. If frame_callback is provided, it is called as frame_callback(frame_num, frame) for each frame
+    and frames are not stored (bounded-memory mode), so the returned dict has no 'frames' entry.
+    With the orjson backend, files up to LOAD_AT_ONCE_MAX_SIZE (and no frame_callback) are decoded at once, which
+    is faster but needs the entire text in memory, and larger files are read chunk by chunk, decoding each value
+    with orjson.
+    """
+    if BACKEND == 'orjson' and frame_callback is None and os.path.getsize(file_name) <= LOAD_AT_ONCE_MAX_SIZE:
+        with open_file(file_name, 'rb') as file:
+            data = loads(file.read())
+        if isinstance(data.get('vcd'), dict) and isinstance(data['vcd'].get('frames'), dict):
+            data['vcd']['frames'] = {int(frame_key): frame for frame_key, frame in data['vcd']['frames'].items()}
+        return data
+
+    data = dict()
+    with open_file(file_name) as file:
+        for path, value in iter_vcd(file, chunk_size):
+            if len(path) == 1:
+                data[path[0]] = value
+            elif len(path) == 2:
+                data.setdefault('vcd', dict())
+                if path[1] == 'frames' and frame_callback is not None:
+                    continue
+                data['vcd'][path[1]] = value
+            else:
+                if frame_callback is not None:
+                    frame_callback(path[2], value)
+                else:
+                    data['vcd']['frames'][path[2]] = value
+    return data
+
+
+def as_json_frames(data):
+    """
+    Returns a shallow copy of a VCD dict where frame keys are strings, as they are in JSON (e.g. for validation).
+    """
+    if 'vcd' not in data or not data['vcd'].get('frames'):
+        return data
+    data_json = dict(data)
+    data_json['vcd'] = dict(data['vcd'])
+    data_json['vcd']['frames'] = {str(frame_num): frame for frame_num, frame in data['vcd']['frames'].items()}
+    return data_json
+
+
+####################################################
+# Lazy frames
+####################################################
+_NOT_LOADED = object()
+
+
+class LazyFrames(dict):
+    """
+    Dictionary of frames which are parsed from the file only when accessed, using a frame offset index.
+    Frames accessed through [] (e.g. to be modified) are kept, while frames read with peek() (e.g. by VCD.get_frame)
+    are kept in a LRU cache of cache_size frames. If on_evict is not None, it is called with the frame number of
+    each frame evicted from the cache.
+    """
+    def __init__(self, file_name, frame_offsets, cache_size=LAZY_CACHE_SIZE):
+        super().__init__()
+        self.file_name = file_name
+        self.offsets = dict()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.on_evict = None
+        for frame_num, start, end in frame_offsets:
+            dict.__setitem__(self, frame_num, _NOT_LOADED)
+            self.offsets[frame_num] = (start, end)
+
+    def __read(self, frame_num):
+        start, end = self.offsets[frame_num]
+        with open(self.file_name, 'rb') as file:
+            file.seek(start)
+            return loads(file.read(end - start))
+
+    def __getitem__(self, frame_num):
+        frame = dict.__getitem__(self, frame_num)
+        if frame is _NOT_LOADED:
+            if frame_num in self.cache:
+                frame = self.cache.pop(frame_num)
+            else:
+                frame = self.__read(frame_num)
+            dict.__setitem__(self, frame_num, frame)
+        return frame
+
+    def __setitem__(self, frame_num, frame):
+        self.cache.pop(frame_num, None)
+        dict.__setitem__(self, frame_num, frame)
+
+    def __delitem__(self, frame_num):
+        self.cache.pop(frame_num, None)
+        dict.__delitem__(self, frame_num)
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def get(self, frame_num, default=None):
+        if frame_num in self:
+            return self[frame_num]
+        return default
+
+    def pop(self, frame_num, *default):
+        if frame_num in self:
+            frame = self.peek(frame_num)
+            del self[frame_num]
+            return frame
+        return dict.pop(self, frame_num, *default)
+
+    def peek(self, frame_num):
+        # Returns the frame without keeping it (unless it is already kept), or None if it does not exist
+        frame = dict.get(self, frame_num)
+        if frame is not _NOT_LOADED:
+            return frame
+        if frame_num in self.cache:
+            self.cache.move_to_end(frame_num)
+            return self.cache[frame_num]
+        frame = self.__read(frame_num)
+        self.cache[frame_num] = frame
+        while len(self.cache) > self.cache_size:
+            frame_num_evicted, frame_evicted = self.cache.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(frame_num_evicted)
+        return frame
+
+    def is_kept(self, frame_num):
+        # Returns True if the frame is in memory, either kept or in the cache
+        return dict.get(self, frame_num, _NOT_LOADED) is not _NOT_LOADED or frame_num in self.cache
+
+    def items(self):
+        return [(frame_num, self.peek(frame_num)) for frame_num in self]
+
+    def values(self):
+        return [self.peek(frame_num) for frame_num in self]
+
+
+def build_frame_index(file_name, chunk_size=CHUNK_SIZE):
+    """
+    Scans a VCD file and returns a dict with the byte offsets of the 'frames' section ('frames_span', or None if
+    there are no frames) and of each frame ('frames', list of [frame_num, start, end]).
+    """
+    frames_span = None
+    frame_offsets = []
+    # latin-1 maps each byte to one character, so character positions are byte positions
+    with open(file_name, 'r', encoding='latin-1', newline='') as file:
+        reader = JSONChunkReader(file, chunk_size)
+        for key in reader.members():
+            if key != 'vcd' or reader.peek() != '{':
+                reader.value()
+                continue
+            for vcd_key in reader.members():
+                if vcd_key != 'frames' or reader.peek() != '{':
+                    reader.value()
+                    continue
+                frames_start = reader.tell()
+                for frame_key in reader.members():
+                    reader.peek()
+                    start = reader.tell()
+                    reader.value()
+                    frame_offsets.append([int(frame_key), start, reader.tell()])
+                frames_span = [frames_start, reader.tell()]
+
+    stat = os.stat(file_name)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'frames_span': frames_span, 'frames': frame_offsets}
+
+
+def load_frame_index(file_name, index_file_name=None, chunk_size=CHUNK_SIZE):
+    """
+    Returns the frame index of a VCD file. If index_file_name is provided, the index is read from it if it
+    corresponds to the current file, or built and written into it otherwise.
+    """
+    if index_file_name is not None and os.path.isfile(index_file_name):
+        with open(index_file_name, 'r') as index_file:
+            index = json.load(index_file)
+        stat = os.stat(file_name)
+        if index.get('size') == stat.st_size and index.get('mtime_ns') == stat.st_mtime_ns:
+            return index
+
+    index = build_frame_index(file_name, chunk_size)
+    if index_file_name is not None:
+        with open(index_file_name, 'w') as index_file:
+            json.dump(index, index_file, separators=(',', ':'))
+    return index
+
+
+def load_lazy(file_name, cache_size=LAZY_CACHE_SIZE, index_file_name=None):
+    """
+    Loads the static content of a VCD file, while frames are loaded on demand (see LazyFrames).
+    Compressed files can't be accessed by offset, so they are entirely loaded.
+    """
+    if file_name.endswith('.gz'):
+        return load(file_name)
+    index = load_frame_index(file_name, index_file_name)
+    if index['frames_span'] is None:
+        return load(file_name)
+
+    # The static content is everything but the frames, which are substituted by an empty dict
+    frames_start, frames_end = index['frames_span']
+    with open(file_name, 'rb') as file:
+        head = file.read(frames_start)
+        file.seek(frames_end)
+        tail = file.read()
+    data = loads(head + b'{}' + tail)
+    data['vcd']['frames'] = LazyFrames(file_name, index['frames'], cache_size)
+    return data
+
+
+####################################################
+# Incremental writing
+####################################################
+def dump(data, file, pretty=False):
+    """
+    Writes a VCD dict into a binary file object, with the same text as dumps(data, pretty), but encoding and
+    writing one frame at a time, so the entire text is never in memory. Frames of LazyFrames are read without
+    keeping them.
+    """
+    frames = data.get('vcd', dict()).get('frames')
+    if not frames:
+        file.write(dumps_bytes(data, pretty))
+        return
+
+    # The skeleton is the VCD without frames, which are written in place of the marker
+    skeleton = dict(data)
+    skeleton['vcd'] = dict(data['vcd'])
+    skeleton['vcd']['frames'] = _FRAMES_MARKER
+    head, tail = dumps_bytes(skeleton, pretty).split(dumps_bytes(_FRAMES_MARKER), 1)
+
+    if pretty:
+        # Frames are at the third level of indentation
+        separator = b',\n' + b' ' * 12
+        key_separator = b': '
+        opening = b'{\n' + b' ' * 12
+        closing = b'\n' + b' ' * 8 + b'}'
+    else:
+        separator = b','
+        key_separator = b':'
+        opening = b'{'
+        closing = b'}'
+
+    file.write(head)
+    file.write(opening)
+    first = True
+    for frame_num in frames:
+        if isinstance(frames, LazyFrames):
+            frame = frames.peek(frame_num)
+        else:
+            frame = frames[frame_num]
+        if not first:
+            file.write(separator)
+        first = False
+        file.write(dumps_bytes(str(frame_num)) + key_separator)
+        encoded_frame = dumps_bytes(frame, pretty)
+        if pretty:
+            encoded_frame = encoded_frame.replace(b'\n', b'\n' + b' ' * 12)
+        file.write(encoded_frame)
+    file.write(closing)
+    file.write(tail)
+
+
+def save(data, file_name, pretty=False):
+    """
+    Writes a VCD dict into a file, frame by frame (see dump). Files ending with .gz are compressed with gzip.
+    The content is written into a temporary file of the same directory, which then replaces file_name, so
+    file_name can be the file the LazyFrames of data are read from (which are then indexed in the new file).
+    """
+    frames = data.get('vcd', dict()).get('frames')
+    same_source = isinstance(frames, LazyFrames) and os.path.isfile(file_name) \
+        and os.path.samefile(frames.file_name, file_name)
+
+    # The temporary file name ends with file_name, so it is compressed in the same way
+    directory, base_name = os.path.split(os.path.abspath(file_name))
+    temp_file_name = os.path.join(directory, '.' + uuid.uuid4().hex[0:8] + '.' + base_name)
+    try:
+        with open_file(temp_file_name, 'wb') as file:
+            dump(data, file, pretty)
+        if os.path.isfile(file_name):
+            shutil.copymode(file_name, temp_file_name)
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        if os.path.isfile(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+
+    if same_source:
+        frames.file_name = file_name
+        frames.offsets = {frame_num: (start, end) for frame_num, start, end in build_frame_index(file_name)['frames']}
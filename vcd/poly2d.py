@@ -12,320 +12,253 @@ VCD is distributed under MIT License. See LICENSE.
 """
 import numpy as np
 import math
+import collections
+import multiprocessing
+
+try:
+    import cv2 as cv
+except ImportError:  # OpenCV is only needed to convert masks to and from poly2d
+    cv = None
+
+
+# Absolute directions of the chain codes, as indexes of the 3x3 neighbourhood [dy + 1][dx + 1] of a pixel (9 is the
+# pixel itself), and their (dx, dy) steps
+static_direction_kernel = np.array([[5, 6, 7], [4, 9, 0], [3, 2, 1]])
+direction_steps = np.array([[1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1], [1, -1]])
+
+# Chain codes are relative to the previous direction: 0 keeps the direction, 1 and 2 turn +1 and -1, 3 and 4 turn +2
+# and -2, and 5 reverses the direction (turns +4) without moving. Turns of +3, -3 and +4 are coded as a 5 followed by
+# the move from the reversed direction. E.g. going in direction 0, the moves to the 3x3 neighbourhood are
+# [[5, 4, 2], [5, 9, 0], [5, 3, 1]], and going in direction 1, [[5, 5, 4], [5, 9, 2], [3, 1, 0]]
+# The polygon contouring starts always going down (direction 2).
+initial_direction = 2
+move_of_turn = np.array([4, 2, 0, 1, 3])  # for turns -2, -1, 0, 1, 2
+turn_of_move = np.array([0, 1, -1, 2, -2, 4, 0, 0])  # for moves 0 to 7 (6 and 7 are runs of 0, see below)
+
+
+def computeMovements(coords):
+    """
+    Computes the chain code movements (0 to 5) of the polygon coords (x0, y0, x1, y1, ...).
+    The segment from one point to the next is coded as max(|dx|, |dy|) steps in the direction of (sign(dx),
+    sign(dy)).
+    :return: array of movements, array of the number of movements at the end of each segment, xinit and yinit
+    """
+    xinit = int(coords[0])
+    yinit = int(coords[1])
+    points = np.round(np.asarray(coords[2:2 * (len(coords) // 2)], dtype=float).reshape(-1, 2)).astype(np.int64)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), xinit, yinit
+
+    # Steps of each segment, and their direction
+    diffs = np.diff(np.vstack(([xinit, yinit], points)), axis=0)
+    fins = np.abs(diffs).max(axis=1)
+    signs = np.sign(diffs)
+    directions = static_direction_kernel[signs[:, 1] + 1, signs[:, 0] + 1]
+
+    # Segments without steps don't change the direction
+    moving = fins > 0
+    directions_moving = directions[moving]
+    previous_directions = np.concatenate(([initial_direction], directions_moving[:-1]))
+    turns = (directions_moving - previous_directions + 3) % 8 - 3  # from -3 to 4
+    reverse = np.abs(turns) >= 3
+    turns[turns >= 3] -= 4
+    turns[turns == -3] += 4
+
+    # First movement of each segment (preceded by a 5 if reversed), and 0s for the rest of its steps
+    lengths = np.zeros(len(fins), dtype=np.int64)
+    lengths[moving] = fins[moving] + reverse
+    ends = np.cumsum(lengths)
+    starts = ends[moving] - lengths[moving]
+    movements = np.zeros(ends[-1], dtype=np.int64)
+    movements[starts[reverse]] = 5
+    movements[starts + reverse] = move_of_turn[turns + 2]
+    return movements, ends, xinit, yinit
+
+
+def getZeroRuns(movements, ends=None):
+    """
+    Splits movements into tokens: each non-zero movement, and each run of 0s (also split at the ends of the segments,
+    if given).
+    :return: arrays of the start, length and movement of each token, and flag of the tokens that start a run of 0s
+    """
+    n = len(movements)
+    is_zero = movements == 0
+    token_start = np.ones(n, dtype=bool)
+    token_start[1:] = ~is_zero[1:] | ~is_zero[:-1]
+    if ends is not None:
+        ends = ends[(ends > 0) & (ends < n)]
+        token_start[ends] = True
+    starts = np.flatnonzero(token_start)
+    lengths = np.diff(np.append(starts, n))
+    symbols = movements[starts]
+    run_start = (symbols == 0) & ((starts == 0) | ~is_zero[starts - 1])
+    return starts, lengths, symbols, run_start
+
+
+def collapseZeroRuns(symbols, symbols_counts):
+    # Composes the chain code from tokens, each one with (up to) three symbols and their number of repetitions
+    return np.repeat(symbols.ravel(), symbols_counts.ravel()).tolist()
 
 
 def computeRS6FCC(coords):
-    _distances = []
     high_symbol = 7
     low_symbol = 6
 
     if len(coords) == 0:
         return [], 0, 0, 0, 0
 
-    _xinit = int(coords[0])
-    _yinit = int(coords[1])
-    xinit = _xinit
-    yinit = _yinit
-
-    static_direction_kernel = np.array([[5, 6, 7], [4, 9, 0], [3, 2, 1]])
-
-    kernel_direction_data = np.array([[[5, 4, 2], [5, 9, 0], [5, 3, 1]],  # direction 0 updated kernel
-                                      [[5, 5, 4], [5, 9, 2], [3, 1, 0]],  # direction 1 updated kernel
-                                      [[5, 5, 5], [3, 9, 4], [1, 0, 2]],  # direction 2 updated kernel
-                                      [[3, 5, 5], [1, 9, 5], [0, 2, 4]],  # direction 3 updated kernel
-                                      [[1, 3, 5], [0, 9, 5], [2, 4, 5]],  # direction 4 updated kernel
-                                      [[0, 1, 3], [2, 9, 5], [4, 5, 5]],  # direction 5 updated kernel
-                                      [[2, 0, 1], [4, 9, 3], [5, 5, 5]],  # direction 6 updated kernel
-                                      [[4, 2, 0], [5, 9, 1], [5, 5, 3]]]) # direction 7 updated kernel
-    # the polygon contouring starts always going down.
-    previous_direction = 2
-
-    for i in range(2, len(coords), 2):
-        x = round(coords[i])
-        y = round(coords[i + 1])
-        xi = x - xinit
-        yi = y - yinit
-        temp = []
-        fin = max(abs(xi), abs(yi))
-
-        xii = int(xi / abs(xi)) if xi != 0 else 0
-        yii = int(yi / abs(yi)) if yi != 0 else 0
-
-        for j in range(0, fin):
-            move = kernel_direction_data[previous_direction][yii + 1][xii + 1]
-            if move < 5:
-                temp.append(move)
-                previous_direction = static_direction_kernel[yii + 1][xii + 1]
-            elif move == 5:
-                temp.append(move)
-                previous_direction = (previous_direction+4) % 8
-                move = kernel_direction_data[previous_direction][yii+1][xii+1]
-                temp.append(move)
-                previous_direction = static_direction_kernel[yii+1][xii+1]
-
-        for k in range(0, len(temp)):
-            _distances.append(temp[k])
-
-        xinit = x
-        yinit = y
-
-    if len(_distances) != 0:
-        _distances, RS6FCC_Low_simplifier, RS6FCC_High_simplifier = simplifyCalculatedFrontSequenceMovements(_distances, low_symbol, high_symbol)
+    movements, ends, _xinit, _yinit = computeMovements(coords)
+    if len(movements) == 0:
+        return [], 0, 0, _xinit, _yinit
+
+    # Count the runs of 0s of each length (>1), in order of appearance
+    starts, lengths, symbols, run_start = getZeroRuns(movements)
+    run_lengths = lengths[run_start]
+    run_lengths = run_lengths[run_lengths > 1]
+    values, first, counts = np.unique(run_lengths, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    repetitionCounterMap = dict(zip(values[order].tolist(), counts[order].tolist()))
+
+    if len(repetitionCounterMap) == 0:
+        return movements.tolist(), -1, -1, _xinit, _yinit
+    elif len(repetitionCounterMap) == 1:
+        _low = run_lengths[0].item()
+        _high = -1
+    elif len(repetitionCounterMap) == 2:
+        _low, _high = list(repetitionCounterMap.keys())
     else:
-        RS6FCC_High_simplifier = 0
-        RS6FCC_Low_simplifier = 0
+        _low, _high = extractMultiplierMap2(repetitionCounterMap)
 
-    return _distances, RS6FCC_Low_simplifier, RS6FCC_High_simplifier, _xinit, _yinit
+    # Runs of at least _low 0s are replaced by high_symbols (_high 0s), low_symbols (_low 0s) and the rest of 0s
+    tokens_symbols = np.zeros((len(starts), 3), dtype=np.int64)
+    tokens_counts = np.zeros((len(starts), 3), dtype=np.int64)
+    tokens_symbols[:, 0] = symbols
+    tokens_counts[:, 0] = lengths
+    simplified = (symbols == 0) & (lengths >= _low)
+    n = lengths[simplified]
+    tokens_symbols[simplified] = [high_symbol, low_symbol, 0]
+    if _high != -1:
+        tokens_counts[simplified] = np.column_stack((n // _high, n % _high // _low, n % _high % _low))
+    else:
+        tokens_counts[simplified] = np.column_stack((np.zeros(len(n), dtype=np.int64), n // _low, n % _low))
+    return collapseZeroRuns(tokens_symbols, tokens_counts), _low, _high, _xinit, _yinit
 
 
 def extractRS6FCC2Points(_chaincode, _xinit, _yinit, _low, _high):
-    RS6FCC_High_simplifier = _high
-    RS6FCC_Low_simplifier = _low
     RS6FCC_High_symbol = 7
     RS6FCC_Low_symbol = 6
-    _coords = []
-    _coords.append(int(_xinit))
-    _coords.append(int(_yinit))
-    xinit = int(_xinit)
-    yinit = int(_yinit)
+    _coords = [int(_xinit), int(_yinit)]
     if len(_chaincode) == 0:
         return _coords
 
-    static_direction_kernel = np.array([[5, 6, 7], [4, 9, 0], [3, 2, 1]])
-
-    kernel_direction_data = np.array([[[5, 4, 2], [5, 9, 0], [5, 3, 1]],  # direction 0 updated kernel
-                                      [[5, 5, 4], [5, 9, 2], [3, 1, 0]],  # direction 1 updated kernel
-                                      [[5, 5, 5], [3, 9, 4], [1, 0, 2]],  # direction 2 updated kernel
-                                      [[3, 5, 5], [1, 9, 5], [0, 2, 4]],  # direction 3 updated kernel
-                                      [[1, 3, 5], [0, 9, 5], [2, 4, 5]],  # direction 4 updated kernel
-                                      [[0, 1, 3], [2, 9, 5], [4, 5, 5]],  # direction 5 updated kernel
-                                      [[2, 0, 1], [4, 9, 3], [5, 5, 5]],  # direction 6 updated kernel
-                                      [[4, 2, 0], [5, 9, 1], [5, 5, 3]]]) # direction 7 updated kernel
-    # the polygon contouring starts always going down.
-    previous_direction = 2
-
-    counter = 0
-    for i in range(0, len(_chaincode)):
-        if 6 > _chaincode[i] > 0:
-            if counter > 0:
-                x, y = checkPixelInMat(kernel_direction_data[previous_direction], 0)
-                xinit += x * counter if x != 0 else 0
-                yinit += y * counter if y != 0 else 0
-                _coords.append(xinit)
-                _coords.append(yinit)
-                counter = 0
-
-            if _chaincode[i] == 5:
-                previous_direction = (previous_direction+4) % 8
-            else:
-                xi, yi = checkPixelInMat(kernel_direction_data[previous_direction], _chaincode[i])
-                xinit += xi
-                yinit += yi
-                _coords.append(xinit)
-                _coords.append(yinit)
-                previous_direction = static_direction_kernel[yi+1][xi+1]
-
-        elif _chaincode[i] == 0:
-            counter += 1
-        elif _chaincode[i] == RS6FCC_Low_symbol:
-            counter += RS6FCC_Low_simplifier
-        elif _chaincode[i] == RS6FCC_High_symbol:
-            counter += RS6FCC_High_simplifier
-
-        if i == len(_chaincode)-1 and counter >0:
-            x, y = checkPixelInMat(kernel_direction_data[previous_direction], 0)
-            xinit += x * counter if x != 0 else 0
-            yinit += y * counter if y != 0 else 0
-            _coords.append(xinit)
-            _coords.append(yinit)
+    chaincode = np.asarray(_chaincode, dtype=np.int64)
 
+    # Direction after each symbol, and number of steps in that direction (symbols 6 and 7 are runs of 0s)
+    directions = (initial_direction + np.cumsum(turn_of_move[chaincode])) % 8
+    counts = np.where(chaincode == 5, 0, 1)
+    counts[chaincode == RS6FCC_Low_symbol] = _low
+    counts[chaincode == RS6FCC_High_symbol] = _high
+    positions = np.cumsum(direction_steps[directions] * counts[:, np.newaxis], axis=0) + [int(_xinit), int(_yinit)]
+
+    # Points are added after each turn, and at the end of each run of 0s (before a turn, or at the end)
+    straight = (chaincode == 0) | (chaincode >= 6)
+    run_end = straight & np.append(~straight[1:], True)
+    points = positions[((chaincode > 0) & (chaincode < 5)) | run_end]
+    _coords.extend(points.flatten().tolist())
     return _coords
 
+
 def computeSRF6DCC(_coords):
-    _distances = []
     SRF6DCC_High_simplifier = 15
     SRF6DCC_Low_simplifier = 3
     SRF6DCC_High_symbol = 7
     SRF6DCC_Low_symbol = 6
     if len(_coords) == 0:
         return [], 0, 0
-    _xinit = int(_coords[0])
-    _yinit = int(_coords[1])
-    xinit = _xinit
-    yinit = _yinit
-
-    static_direction_kernel = np.array([[5, 6, 7], [4, 9, 0], [3, 2, 1]])
-
-    kernel_direction_data = np.array([[[5, 4, 2], [5, 9, 0], [5, 3, 1]],  # direction 0 updated kernel
-                                      [[5, 5, 4], [5, 9, 2], [3, 1, 0]],  # direction 1 updated kernel
-                                      [[5, 5, 5], [3, 9, 4], [1, 0, 2]],  # direction 2 updated kernel
-                                      [[3, 5, 5], [1, 9, 5], [0, 2, 4]],  # direction 3 updated kernel
-                                      [[1, 3, 5], [0, 9, 5], [2, 4, 5]],  # direction 4 updated kernel
-                                      [[0, 1, 3], [2, 9, 5], [4, 5, 5]],  # direction 5 updated kernel
-                                      [[2, 0, 1], [4, 9, 3], [5, 5, 5]],  # direction 6 updated kernel
-                                      [[4, 2, 0], [5, 9, 1], [5, 5, 3]]]) # direction 7 updated kernel
-    # the polygon contouring starts always going down.
-    # the polygon contouring starts always going down.
-    previous_direction = 2
-    for i in range(2, len(_coords), 2):
-        x = round(_coords[i])
-        y = round(_coords[i + 1])
-        xi = x - xinit
-        yi = y - yinit
-        temp = []
-        fin = max(abs(xi), abs(yi))
-
-        xii = int(xi / abs(xi)) if xi != 0 else 0
-        yii = int(yi / abs(yi)) if yi != 0 else 0
-
-        for j in range(0, fin):
-            move = kernel_direction_data[previous_direction][yii+1][xii+1]
-            if move < 5:
-                temp.append(move)
-                previous_direction = static_direction_kernel[yii+1][xii+1]
-            elif move == 5:
-                temp.append(move)
-                previous_direction = (previous_direction + 4) % 8
-                move = kernel_direction_data[previous_direction][yii+1][xii+1]
-                temp.append(move)
-                previous_direction = static_direction_kernel[yii+1][xii+1]
-
-        for k in range(0, len(temp)):
-            _distances.append(temp[k])
-
-        xinit = x
-        yinit = y
-
-        if len(_distances) != 0:
-            _distances = simplifyAllFrontSequenceMovements(_distances, SRF6DCC_Low_simplifier, SRF6DCC_High_simplifier, SRF6DCC_Low_symbol, SRF6DCC_High_symbol)
-    return _distances, _xinit, _yinit
+
+    movements, ends, _xinit, _yinit = computeMovements(_coords)
+    if len(movements) == 0:
+        return [], _xinit, _yinit
+
+    # Runs of 0s are simplified as the movements of each segment are added, so a run that continues in the next
+    # segment is simplified in pieces: each piece replaces the 0s that are left from the previous piece, and its own
+    # 0s, by high and low symbols. As the high simplifier is a multiple of the low one, the 0s left after each piece
+    # are the number of 0s of the run so far modulo the low simplifier
+    starts, lengths, symbols, run_start = getZeroRuns(movements, ends)
+    is_zero = symbols == 0
+    zeros_before = np.cumsum(np.where(is_zero, lengths, 0)) - np.where(is_zero, lengths, 0)
+    run_zeros_before = zeros_before - np.maximum.accumulate(np.where(run_start, zeros_before, 0))
+    n = run_zeros_before % SRF6DCC_Low_simplifier + lengths
+    run_end = is_zero & np.append(~is_zero[1:] | run_start[1:], True)
+
+    tokens_symbols = np.zeros((len(starts), 3), dtype=np.int64)
+    tokens_counts = np.zeros((len(starts), 3), dtype=np.int64)
+    tokens_symbols[:, 0] = symbols
+    tokens_counts[:, 0] = 1
+    tokens_symbols[is_zero] = [SRF6DCC_High_symbol, SRF6DCC_Low_symbol, 0]
+    tokens_counts[is_zero] = np.column_stack((n[is_zero] // SRF6DCC_High_simplifier,
+                                              n[is_zero] % SRF6DCC_High_simplifier // SRF6DCC_Low_simplifier,
+                                              np.where(run_end, run_zeros_before + lengths, 0)[is_zero]
+                                              % SRF6DCC_Low_simplifier))
+    return collapseZeroRuns(tokens_symbols, tokens_counts), _xinit, _yinit
+
 
 def extractSRF6DCC2Points(_chaincode, _xinit, _yinit ):
     SRF6DCC_High_simplifier = 15
     SRF6DCC_Low_simplifier = 3
     return extractRS6FCC2Points(_chaincode, _xinit, _yinit, SRF6DCC_Low_simplifier, SRF6DCC_High_simplifier)
 
-def checkPixelInMat(_kernel_direction_data, target):
-    for row in range(0, 3):
-        for col in range(0, 3):
-            if _kernel_direction_data[row][col] == target:
-                return col - 1, row - 1
-    return 0, 0
 
+base64_alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
 
-def checkValueInKernel(_kernel_direction_data, target):
-    for row in range(0, 3):
-        for col in range(0, 3):
-            if _kernel_direction_data[row][col] == target:
-                return col, row
-    return 0, 0
-
-
-def simplifyFrontSequenceMovements(_num, _low, _high, _low_symbol, _high_symbol, _next_steps):
-    if _high != -1:
-        res1 = int(math.floor(_num / _high))
-        res2 = int(_num % _high / _low)
-        res3 = int(_num % _high % _low)
-    else:
-        res1 = 0
-        res2 = int(_num / _low)
-        res3 = int(_num % _low)
-
-    for i in range(0, res1):
-        _next_steps.append(_high_symbol)  # _high_symbol: {SRF6DCC: 7} for high Roman numerals-like counting simplifications
-    for i in range(0, res2):
-        _next_steps.append(_low_symbol)  # _low_symbol: {SRF6DCC: 6} for low Roman numerals-like counting simplifications
-    for i in range(0, res3):
-        _next_steps.append(0)
-    return _next_steps
-
-
-def simplifyAllFrontSequenceMovements(_chaincode, _low, _high, _low_symbol, _high_symbol):
-    counter = 0
-    i = 0
-    while i < len(_chaincode):
-        if _chaincode[i] == 0:
-            counter += 1
-        elif _chaincode[i] != 0:
-            if counter >= _low:
-                # i - counter //position of last 0 - counter
-                next_steps = []
-                next_steps = simplifyFrontSequenceMovements(counter, _low, _high, _low_symbol, _high_symbol, next_steps)
-                del _chaincode[i - counter: i]
-                i -= counter
-                _chaincode[i:i] = next_steps
-                i += len(next_steps)
-            counter = 0
-        if i == len(_chaincode)-1:
-            if counter >= _low:
-                next_steps = []
-                next_steps = simplifyFrontSequenceMovements(counter, _low, _high, _low_symbol, _high_symbol, next_steps)
-                del _chaincode[len(_chaincode)-counter:len(_chaincode)]
-                i -= counter
-                _chaincode[len(_chaincode):len(_chaincode)] = next_steps
-                i += len(next_steps)
-            counter = 0
-        i += 1
-    return _chaincode
+# Characters of the alphabet, and 6 bits values of the (ASCII) characters. Characters out of the alphabet are decoded
+# as 63, like -1 (all bits set) was
+base64_chars = np.frombuffer(base64_alphabet.encode('ascii'), dtype=np.uint8)
+base64_values = np.full(256, 63, dtype=np.uint8)
+base64_values[base64_chars] = np.arange(64)
 
 
 def base64Encoder(_num):
-    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
-    return alphabet[_num]
+    return base64_alphabet[_num]
 
 
 def base64Decoder(_value):
-    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
-    return alphabet.find(_value)
+    return base64_alphabet.find(_value)
 
 
 # Converts a vector of chaincode integers into a json printable characters string.
 # By joining the digits to compose a 6 bits integer and the converting that integer in base64 character.
 def chainCodeBase64Encoder(_chaincodevector, _chaincode_bits):
-    # Add odd number in the vector for codification
     num_digits = int(6 / _chaincode_bits)
-    _outputstring = ""
     rest = len(_chaincodevector) % num_digits
-    if rest != 0:
-        vectrest = int(num_digits - rest)
-        for i in range(0, vectrest):
-            _chaincodevector.append(0)
-    else:
-        vectrest = 0
-    for i in range(0, len(_chaincodevector), num_digits):
-        byte = 0
-        for j in range(0, num_digits):
-            byte += _chaincodevector[i + j] << (num_digits - 1 - j) * _chaincode_bits
-        _outputstring += base64Encoder(byte)
-    return _outputstring, vectrest
+    vectrest = int(num_digits - rest) if rest != 0 else 0
+
+    # Pad a copy with zeros up to a multiple of num_digits (the vector of the caller is not modified), and pack
+    # each group of num_digits digits into a 6 bits integer, the first digit in the highest bits
+    digits = np.zeros(len(_chaincodevector) + vectrest, dtype=np.int64)
+    digits[:len(_chaincodevector)] = _chaincodevector
+    shifts = _chaincode_bits * np.arange(num_digits - 1, -1, -1)
+    bytes_6bits = (digits.reshape(-1, num_digits) << shifts).sum(axis=1)
+    return base64_chars[bytes_6bits].tobytes().decode('ascii'), vectrest
 
 
 # Converts back the json printable characters string to a vector of chaincode integers.
 # By converting from base64 to 6bits integer and then splitting in chain code vector.
 def chainCodeBase64Decoder(_chaincodebits, _chaincode_bits, _bitsvectorrest):
-    _chaincodevector = []
     num_digits = int(6 / _chaincode_bits)
-    getbits = pow(2, _chaincode_bits) - 1 # number of bits that need to move to
+    getbits = pow(2, _chaincode_bits) - 1  # number of bits that need to move to
 
-    for i in range(0, len(_chaincodebits)):
-        byte = base64Decoder(_chaincodebits[i])
-        for j in range(0, num_digits):
-            number = byte & getbits
-            _chaincodevector.insert(i * num_digits, number)
-            byte -= number
-            byte = byte >> _chaincode_bits
+    # Non ASCII characters are replaced by one '?' each, which is out of the alphabet as well
+    chars = np.frombuffer(_chaincodebits.encode('ascii', errors='replace'), dtype=np.uint8)
+    bytes_6bits = base64_values[chars].astype(np.int64)
+    shifts = _chaincode_bits * np.arange(num_digits - 1, -1, -1)
+    digits = ((bytes_6bits[:, None] >> shifts) & getbits).ravel()
+    return digits[:len(digits) - _bitsvectorrest].tolist()
 
-    for k in range(0, _bitsvectorrest):
-        _chaincodevector.pop(len(_chaincodevector) - 1)
-
-    return _chaincodevector
 
 def calculateMultiplier(val, x):
     return math.floor(val/x) + (val % x)
 
-def calculateMultiplier2(val, x, y):
-    return calculateMultiplier(math.floor(val/y) + (val % y), x)
-
 def extractMultiplierMap(map):
     min_repetition = 0
     min_suma = math.inf
@@ -339,65 +272,17 @@ def extractMultiplierMap(map):
     return min_repetition
 
 def extractMultiplierMap2(map):
-    min_suma = math.inf
-    map_items = list(map.items())
-    for val_i in map_items[:-1]:
-        for val_j in map_items[1:]:
-            suma = 0
-            for val_k in map_items:
-                suma += val_k[1] * calculateMultiplier2(val_k[0], val_i[0], val_j[0])
-            if suma < min_suma:
-                min_repetition_1 = val_i[0]
-                min_repetition_2 = val_j[0]
-                min_suma = suma
-    return min_repetition_1, min_repetition_2
-
-def simplifyCalculatedFrontSequenceMovements(_chaincode, _low_symbol, _high_symbol):
-    repetitionCounterMap = {}
-    i = 0
-    while i < len(_chaincode)-1:
-        if _chaincode[i] == 0:
-            counter = 1
-            j = i+1
-            while j < len(_chaincode):
-                if _chaincode[j] == 0:
-                    counter += 1
-                    if j == len(_chaincode)-1:
-                        i = j-1
-                else:
-                    i = j-1
-                    break
-                j = j+1
-            if counter > 1:
-                if repetitionCounterMap.get(counter) == None:
-                    repetitionCounterMap[counter] = 1
-                else:
-                    repetitionCounterMap[counter] += 1
-        i += 1
-
-    if len(repetitionCounterMap) <= 0:
-        _low = -1
-        _high = -1
-
-    elif len(repetitionCounterMap) == 1:
-        for key in repetitionCounterMap:
-            _low = key
-        _high = -1
-        _chaincode = simplifyAllFrontSequenceMovements(_chaincode, _low, _high, 6, 7)
-    elif len(repetitionCounterMap) == 2:
-        count = 0
-        for key in repetitionCounterMap:
-            if count == 0:
-                _low = key
-            else:
-                _high = key
-            count += 1
-        _chaincode = simplifyAllFrontSequenceMovements(_chaincode, _low, _high, 6, 7)
-    else:
-        _low, _high = extractMultiplierMap2(repetitionCounterMap)
-        _chaincode = simplifyAllFrontSequenceMovements(_chaincode, _low, _high, 6, 7)
-
-    return _chaincode, _low, _high
+    # Pair of repetitions (first from all but the last, second from all but the first) that minimizes the number of
+    # symbols of all the repetitions in map, computed for all pairs at once (the first minimum is kept, as in a loop)
+    lengths = np.array(list(map.keys()), dtype=np.int64)
+    counts = np.array(list(map.values()), dtype=np.int64)
+    x = lengths[:-1, np.newaxis, np.newaxis]
+    y = lengths[np.newaxis, 1:, np.newaxis]
+    val = lengths[np.newaxis, np.newaxis, :]
+    w = val // y + val % y
+    sumas = ((w // x + w % x) * counts).sum(axis=2)
+    i, j = np.unravel_index(np.argmin(sumas), sumas.shape)
+    return lengths[i].item(), lengths[j + 1].item()
 
 def getVecFromEncodedSRF6(x, y, rest, encoded_poly):
     decoded = chainCodeBase64Decoder(encoded_poly, 3, rest)
@@ -407,4 +292,246 @@ def getVecFromEncodedSRF6(x, y, rest, encoded_poly):
 def getVecFromEncodedRS6(x, y, low, high, rest, encoded_poly):
     decoded = chainCodeBase64Decoder(encoded_poly, 3, rest)
     vec = extractRS6FCC2Points(decoded, x, y, low, high)
-    return vec
\ No newline at end of file
+    return vec
+
+
+####################################################
+# Masks to and from poly2d
+####################################################
+def encodePolygon(coords, mode):
+    """
+    Encodes the polygon coords (x0, y0, x1, y1, ...) as the 'val' of a poly2d in mode (a types.Poly2DType, or its
+    name), i.e. [xinit, yinit, rest, chain] for SRF6DCC, [xinit, yinit, low, high, rest, chain] for RS6FCC, and the
+    coords themselves for any other mode (as a list, or the same array if coords is a numpy array).
+    """
+    mode = getattr(mode, 'name', mode)
+    if mode == 'MODE_POLY2D_SRF6DCC':
+        srf6, xinit, yinit = computeSRF6DCC(coords)
+        encoded_poly, rest = chainCodeBase64Encoder(srf6, 3)
+        return [str(xinit), str(yinit), str(rest), encoded_poly]
+    elif mode == 'MODE_POLY2D_RS6FCC':
+        rs6, low, high, xinit, yinit = computeRS6FCC(coords)
+        encoded_poly, rest = chainCodeBase64Encoder(rs6, 3)
+        return [str(xinit), str(yinit), str(low), str(high), str(rest), encoded_poly]
+    if isinstance(coords, np.ndarray):
+        return coords
+    return list(coords)
+
+
+def decodePolygon(val, mode):
+    """
+    Decodes the 'val' of a poly2d in mode (a types.Poly2DType, or its name) into the polygon coords (x0, y0, x1,
+    y1, ...), as a list, or the val itself if it is a numpy array (MODE_POLY2D_ABSOLUTE).
+    """
+    mode = getattr(mode, 'name', mode)
+    if mode == 'MODE_POLY2D_SRF6DCC':
+        return getVecFromEncodedSRF6(int(val[0]), int(val[1]), int(val[2]), val[3])
+    elif mode == 'MODE_POLY2D_RS6FCC':
+        return getVecFromEncodedRS6(int(val[0]), int(val[1]), int(val[2]), int(val[3]), int(val[4]), val[5])
+    if isinstance(val, np.ndarray):
+        return val
+    return list(val)
+
+
+def _checkOpenCV():
+    if cv is None:
+        raise Exception("ERROR: OpenCV is needed to convert masks to and from poly2d")
+
+
+def encodeMask(mask, mode, name='contour', offset=(0, 0)):
+    """
+    Encodes the contours of the non-zero pixels of mask (single channel) as a list of types.poly2d in mode, named
+    name + index, with the hierarchy of the contours (as cv.findContours with RETR_TREE). offset is added to the
+    coordinates, e.g. if mask is a region of a larger image.
+    """
+    import vcd.types as types  # vcd.types imports this module
+    _checkOpenCV()
+    if mask.dtype != np.uint8:
+        mask = (mask != 0).astype(np.uint8)
+    contours, hierarchy = cv.findContours(mask, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE,
+                                          offset=(int(offset[0]), int(offset[1])))
+    if len(contours) == 0:
+        return []
+    hierarchy_lists = hierarchy[0].tolist()
+    return [types.poly2d(name + str(idx), contour.ravel().tolist(), mode, closed=True,
+                         hierarchy=hierarchy_lists[idx])
+            for idx, contour in enumerate(contours)]
+
+
+def encodeLabelMask(mask, mode, labels=None, background=0, name='contour'):
+    """
+    Encodes a mask of labels (single channel, integer), e.g. the classes or the instances of a segmentation, as a
+    dict of the labels (all the values of mask but background, or those of labels) to the list of types.poly2d of
+    their contours, see encodeMask.
+    Each label is encoded from its bounding box, so the cost is that of the mask plus that of the contours, and
+    not the size of the mask times the number of labels.
+    """
+    _checkOpenCV()
+    mask = np.asarray(mask)
+    if mask.ndim != 2:
+        raise Exception("ERROR: The mask of labels must have a single channel")
+    height, width = mask.shape
+
+    # Bounding boxes of the labels, from the horizontal runs of equal labels
+    run_start = np.ones((height, width), dtype=bool)
+    run_start[:, 1:] = mask[:, 1:] != mask[:, :-1]
+    ys, xs = np.nonzero(run_start)
+    xs_end = np.append(xs[1:], width) - 1
+    xs_end[np.append(ys[1:] != ys[:-1], True)] = width - 1
+    run_labels, run_label_idx = np.unique(mask[ys, xs], return_inverse=True)
+    num_labels = len(run_labels)
+    x_min = np.full(num_labels, width)
+    y_min = np.full(num_labels, height)
+    x_max = np.full(num_labels, -1)
+    y_max = np.full(num_labels, -1)
+    np.minimum.at(x_min, run_label_idx, xs)
+    np.minimum.at(y_min, run_label_idx, ys)
+    np.maximum.at(x_max, run_label_idx, xs_end)
+    np.maximum.at(y_max, run_label_idx, ys)
+
+    polys = dict()
+    label_idx = {label: idx for idx, label in enumerate(run_labels.tolist())}
+    for label in (run_labels.tolist() if labels is None else labels):
+        if labels is None and label == background:
+            continue
+        idx = label_idx.get(label)
+        if idx is None:
+            polys[label] = []
+            continue
+        x0, y0, x1, y1 = int(x_min[idx]), int(y_min[idx]), int(x_max[idx]), int(y_max[idx])
+        roi = mask[y0:y1 + 1, x0:x1 + 1]
+        polys[label] = encodeMask((roi == label).view(np.uint8), mode, name, offset=(x0, y0))
+    return polys
+
+
+def _isValidHierarchy(hierarchy):
+    # Checks that the [next, previous, first_child, parent] indices of the hierarchy of a group of contours are
+    # within the group, and consistent with each other
+    size = len(hierarchy)
+    for idx, h in enumerate(hierarchy):
+        if len(h) != 4 or any(not -1 <= i < size for i in h):
+            return False
+        next_idx, prev_idx, child_idx, parent_idx = h
+        if (next_idx != -1 and hierarchy[next_idx][1] != idx) or (prev_idx != -1 and hierarchy[prev_idx][0] != idx) \
+                or (child_idx != -1 and hierarchy[child_idx][3] != idx):
+            return False
+    return True
+
+
+def _splitHierarchy(hierarchy):
+    # Splits the contours into consecutive groups, each of them with a hierarchy local to the group (e.g. the output
+    # of one call to encodeMask), and returns the (start, end, hierarchy) of the groups. The hierarchy of a group is
+    # None if any of its contours has no hierarchy, or if it is not valid.
+    # A group starts at the first contour of each call to cv.findContours, which has no previous nor parent contour
+    groups = []
+    start = 0
+    for idx in range(1, len(hierarchy) + 1):
+        if idx < len(hierarchy):
+            h = hierarchy[idx]
+            h_prev = hierarchy[idx - 1]
+            if (h is None) == (h_prev is None) and (h is None or h[1] != -1 or h[3] != -1):
+                continue
+        group = hierarchy[start:idx]
+        if group[0] is None or not _isValidHierarchy(group):
+            group = None
+        groups.append((start, idx, group))
+        start = idx
+    return groups
+
+
+def drawPoly2D(mask, polys, value=255, offset=(0, 0)):
+    """
+    Rasterises (filled) the poly2d in polys, either types.poly2d or their data (e.g. the 'poly2d' list of an
+    object_data), into mask, with value. Consecutive polygons with a hierarchy (e.g. those returned by each call to
+    encodeMask) are drawn at once, so the holes of the contours are kept.
+    """
+    _checkOpenCV()
+    contours = []
+    hierarchy = []
+    for poly in polys:
+        data = getattr(poly, 'data', poly)
+        points = decodePolygon(data['val'], data['mode'])
+        contours.append(np.asarray(points, dtype=np.int32).reshape(-1, 1, 2))
+        h = data.get('hierarchy')
+        hierarchy.append(None if h is None else [int(i) for i in h])
+    for start, end, group_hierarchy in _splitHierarchy(hierarchy):
+        if group_hierarchy is not None:
+            group_hierarchy = np.asarray(group_hierarchy, dtype=np.int32).reshape(1, -1, 4)
+        cv.drawContours(mask, contours[start:end], -1, value, thickness=cv.FILLED, hierarchy=group_hierarchy,
+                        offset=(int(offset[0]), int(offset[1])))
+    return mask
+
+
+####################################################
+# Encoding in a pool of processes
+####################################################
+def _encodeLabelMaskTask(mask, mode, labels, background, name):
+    if isinstance(mask, str):
+        _checkOpenCV()
+        file_name = mask
+        mask = cv.imread(file_name, cv.IMREAD_UNCHANGED)
+        if mask is None:
+            raise Exception("ERROR: Unable to read the mask " + file_name)
+    return encodeLabelMask(mask, mode, labels, background, name)
+
+
+def _encodePolygonsTask(polygons, mode, name, first_idx, hierarchies):
+    import vcd.types as types  # vcd.types imports this module
+    return [types.poly2d(name + str(first_idx + idx), list(coords), mode, closed=True,
+                         hierarchy=None if hierarchies is None else list(hierarchies[idx]))
+            for idx, coords in enumerate(polygons)]
+
+
+def encodeLabelMasks(masks, mode, labels=None, background=0, name='contour', num_processes=None,
+                     max_pending=None):
+    """
+    Encodes many masks of labels (see encodeLabelMask) in a pool of processes, e.g. all the images of a dataset.
+    masks is an iterable of masks, or of the names of their files, which are then read by the processes (so the
+    images are not sent to them). The results are returned in the order of masks, and are the same as those of
+    encodeLabelMask, so the VCD built from them are identical to those built sequentially.
+    :param num_processes: number of processes (all the CPUs by default), 1 encodes in this process, without pool
+    :param max_pending: masks sent to the pool and not returned yet (2 * num_processes by default)
+    :return: generator of the dicts of the labels to their list of types.poly2d, one per mask
+    """
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    if num_processes <= 1:
+        for mask in masks:
+            yield _encodeLabelMaskTask(mask, mode, labels, background, name)
+        return
+    if max_pending is None:
+        max_pending = 2 * num_processes
+
+    with multiprocessing.Pool(num_processes) as pool:
+        pending = collections.deque()
+        for mask in masks:
+            pending.append(pool.apply_async(_encodeLabelMaskTask, (mask, mode, labels, background, name)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def encodePolygons(polygons, mode, name='contour', hierarchies=None, num_processes=None, chunk_size=256):
+    """
+    Encodes many polygons (x0, y0, x1, y1, ...) in a pool of processes, as a list of closed types.poly2d in mode,
+    named name + index, in the order of polygons. hierarchies is None, or the hierarchy of each polygon.
+    Polygons are sent to the processes in chunks of chunk_size.
+    :param num_processes: number of processes (all the CPUs by default), 1 encodes in this process, without pool
+    """
+    polygons = list(polygons)
+    if hierarchies is not None:
+        hierarchies = list(hierarchies)
+        if len(hierarchies) != len(polygons):
+            raise Exception("ERROR: There must be a hierarchy per polygon")
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    if num_processes <= 1 or len(polygons) <= chunk_size:
+        return _encodePolygonsTask(polygons, mode, name, 0, hierarchies)
+
+    tasks = [(polygons[i:i + chunk_size], mode, name, i,
+              None if hierarchies is None else hierarchies[i:i + chunk_size])
+             for i in range(0, len(polygons), chunk_size)]
+    with multiprocessing.Pool(min(num_processes, len(tasks))) as pool:
+        chunks = pool.starmap(_encodePolygonsTask, tasks)
+    return [p for chunk in chunks for p in chunk]
@@ -14,11 +14,12 @@ VCD is distributed under MIT License. See LICENSE.
 import numpy as np
 import warnings
 import cv2 as cv
-from collections import deque, namedtuple
+from collections import OrderedDict
 import time
 
 from numpy import float64
 
+import vcd.core as core
 import vcd.utils as utils
 import math
 
@@ -127,94 +128,8 @@ from vcd.types import areaReference
 
 '''
 
-# From https://dev.to/mxl/dijkstras-algorithm-in-python-algorithms-for-beginners-dkc
-# we'll use infinity as a default distance to nodes.
-inf = float('inf')
-Edge = namedtuple('Edge', 'start, end, cost')
-
-
-def make_edge(start, end, cost=1):
-    return Edge(start, end, cost)
-
-
-class Graph:
-    def __init__(self, edges):
-        # let's check that the data is right
-        wrong_edges = [i for i in edges if len(i) not in [2, 3]]
-        if wrong_edges:
-            raise ValueError('Wrong edges data: {}'.format(wrong_edges))
-
-        self.edges = [make_edge(*edge) for edge in edges]
-
-    @property
-    def vertices(self):
-        return set(
-            sum(
-                ([edge.start, edge.end] for edge in self.edges), []
-            )
-        )
-
-    @staticmethod
-    def get_node_pairs(n1, n2, both_ends=True):
-        if both_ends:
-            node_pairs = [[n1, n2], [n2, n1]]
-        else:
-            node_pairs = [[n1, n2]]
-        return node_pairs
-
-    def remove_edge(self, n1, n2, both_ends=True):
-        node_pairs = self.get_node_pairs(n1, n2, both_ends)
-        edges = self.edges[:]
-        for edge in edges:
-            if [edge.start, edge.end] in node_pairs:
-                self.edges.remove(edge)
-
-    def add_edge(self, n1, n2, cost=1, both_ends=True):
-        node_pairs = self.get_node_pairs(n1, n2, both_ends)
-        for edge in self.edges:
-            if [edge.start, edge.end] in node_pairs:
-                return ValueError('Edge {} {} already exists'.format(n1, n2))
-
-        self.edges.append(Edge(start=n1, end=n2, cost=cost))
-        if both_ends:
-            self.edges.append(Edge(start=n2, end=n1, cost=cost))
-
-    @property
-    def neighbours(self):
-        neighbours = {vertex: set() for vertex in self.vertices}
-        for edge in self.edges:
-            neighbours[edge.start].add((edge.end, edge.cost))
-
-        return neighbours
-
-    def dijkstra(self, source, dest):
-        assert source in self.vertices, 'Such source node doesn\'t exist'
-        distances = {vertex: inf for vertex in self.vertices}
-        previous_vertices = {
-            vertex: None for vertex in self.vertices
-        }
-        distances[source] = 0
-        vertices = self.vertices.copy()
-
-        while vertices:
-            current_vertex = min(
-                vertices, key=lambda vertex: distances[vertex])
-            vertices.remove(current_vertex)
-            if distances[current_vertex] == inf:
-                break
-            for neighbour, cost in self.neighbours[current_vertex]:
-                alternative_route = distances[current_vertex] + cost
-                if alternative_route < distances[neighbour]:
-                    distances[neighbour] = alternative_route
-                    previous_vertices[neighbour] = current_vertex
-
-        path, current_vertex = deque(), dest
-        while previous_vertices[current_vertex] is not None:
-            path.appendleft(current_vertex)
-            current_vertex = previous_vertices[current_vertex]
-        if path:
-            path.appendleft(current_vertex)
-        return path
+# Maximum number of frame-specific transforms cached by each Scene, see Scene.get_transform
+TRANSFORM_CACHE_SIZE = 4096
 
 
 class Scene:
@@ -222,6 +137,14 @@ class Scene:
         self.vcd = vcd
         self.cameras = dict()
 
+        # Structures derived from the coordinate systems, see __update_cs_tree
+        self.__cs_tree_key = None
+        self.__cs_parents = dict()
+        self.__chains = dict()
+        self.__static_steps = dict()
+        self.__static_transforms = dict()
+        self.__frame_transforms = OrderedDict()
+
     def camera_roi_z0(self, camera_name, cs, frameNum):
         """
         This function computes the region of the image which maps into the reference (cs) Z=0 plane
@@ -562,18 +485,73 @@ class Scene:
 
         return camera
 
+    def __update_cs_tree(self):
+        # The tree of coordinate systems (and what is derived from it) is only rebuilt when coordinate systems change
+        cs_all = self.vcd.data['vcd'].get('coordinate_systems', dict())
+        key = (id(cs_all), len(cs_all), self.vcd.get_coordinate_systems_version())
+        if key == self.__cs_tree_key:
+            return
+        self.__cs_tree_key = key
+        self.__cs_parents = dict()
+        for cs_name, cs_body in cs_all.items():
+            parent = cs_body.get('parent', '')
+            self.__cs_parents[cs_name] = parent if parent in cs_all else None
+        self.__chains = dict()
+        self.__static_steps = dict()
+        self.__static_transforms = dict()
+        self.__frame_transforms = OrderedDict()
+
+    def __get_ancestors(self, cs):
+        # Returns [cs, parent, grandparent, ..., root]
+        ancestors = [cs]
+        parent = self.__cs_parents.get(cs)
+        while parent is not None and parent not in ancestors:
+            ancestors.append(parent)
+            parent = self.__cs_parents.get(parent)
+        return ancestors
+
     def __get_transform_chain(self, cs_src, cs_dst):
-        # Create graph with the poses defined for each coordinate_system
-        # These are poses valid "statically"
-        lista = []
-        for cs_name, cs_body in self.vcd.data['vcd']['coordinate_systems'].items():
-            for child in cs_body['children']:
-                lista.append((cs_name, child, 1))
-                lista.append((child, cs_name, 1))
-
-        graph = Graph(lista)
-        result = graph.dijkstra(cs_src, cs_dst)
-        return result
+        # Coordinate systems form a tree (each one has a single parent), so the chain goes from cs_src up to the
+        # lowest common ancestor, and then down to cs_dst. Chains are computed only once
+        self.__update_cs_tree()
+        chain = self.__chains.get((cs_src, cs_dst))
+        if chain is None:
+            ancestors_src = self.__get_ancestors(cs_src)
+            ancestors_dst = self.__get_ancestors(cs_dst)
+            position_dst = {cs: i for i, cs in enumerate(ancestors_dst)}
+            chain = []  # not connected
+            for i, cs in enumerate(ancestors_src):
+                if cs in position_dst:
+                    chain = ancestors_src[:i + 1] + ancestors_dst[:position_dst[cs]][::-1]
+                    break
+            self.__chains[(cs_src, cs_dst)] = chain
+        return chain
+
+    def __get_static_step(self, cs_1, cs_2):
+        # Transform of a step of a chain, from the static pose of the child wrt the parent. Computed only once
+        t_4x4 = self.__static_steps.get((cs_1, cs_2))
+        if t_4x4 is None:
+            # Check if this edge is from child to parent or viceversa
+            cs_all = self.vcd.data['vcd']['coordinate_systems']
+            if cs_2 == cs_all[cs_1]['parent']:
+                t_4x4 = np.array(cs_all[cs_1]['pose_wrt_parent'], dtype=float).reshape(4, 4)
+            elif cs_1 == cs_all[cs_2]['parent']:
+                t_4x4 = utils.inv(np.array(cs_all[cs_2]['pose_wrt_parent'], dtype=float).reshape(4, 4))
+            else:
+                t_4x4 = np.identity(4, dtype=float)
+            self.__static_steps[(cs_1, cs_2)] = t_4x4
+        return t_4x4
+
+    def __get_static_transform(self, cs_src, cs_dst):
+        # Static transform between two coordinate systems of a chain, composed only once
+        t_4x4 = self.__static_transforms.get((cs_src, cs_dst))
+        if t_4x4 is None:
+            chain = self.__get_transform_chain(cs_src, cs_dst)
+            t_4x4 = np.identity(4, dtype=float)
+            for cs_1, cs_2 in zip(chain[:-1], chain[1:]):
+                t_4x4 = self.__get_static_step(cs_1, cs_2).dot(t_4x4)
+            self.__static_transforms[(cs_src, cs_dst)] = t_4x4
+        return t_4x4
 
     def get_transform(self, cs_src, cs_dst, frameNum=None):
         """
@@ -584,6 +562,8 @@ class Scene:
 
         If the frameNum is specified, the function searches if any specific transform step at frameNum. If not found,
         static transforms are returned.
+        Chains and static transforms are computed once, and recomputed only if coordinate systems are modified.
+        Transforms at frames are cached too (up to TRANSFORM_CACHE_SIZE), until VCD.add_transform modifies the frame.
         :param cs_src: source coordinate frame (e.g. "CAM_LEFT", or "WORLD")
         :param cs_dst: destination coordinate frame (e.g. "VELO", or "CAM_LEFT")
         :param frameNum: frame number where to look for specific transform steps
@@ -597,63 +577,137 @@ class Scene:
             return np.eye(4), static
 
         # Get chain of transforms
+        # e.g. a) chain = ["cam_left", "velo_top", "vehicle-iso8855"]
+        # e.g. b) chain = ["vehicle-iso8855", "velo_top", "cam_left"]
         chain = self.__get_transform_chain(cs_src, cs_dst)
 
+        # Transforms at the requested frame, if any
+        transforms = None
+        if frameNum is not None:
+            frame = self.vcd.get_frame(frameNum)
+            if frame is not None:
+                transforms = frame.get('frame_properties', dict()).get('transforms')
+
+        if not transforms or not chain:
+            # Static transform
+            return self.__get_static_transform(cs_src, cs_dst).copy(), static
+
+        # Maybe already computed for this frame
+        key = (cs_src, cs_dst, frameNum)
+        version = (self.__cs_tree_key, self.vcd.get_transforms_version(frameNum))
+        cached = self.__frame_transforms.get(key)
+        if cached is not None and cached[0] == version:
+            self.__frame_transforms.move_to_end(key)
+            return cached[1].copy(), cached[2]
+
         # Let's build the transform using atomic transforms (which exist in VCD)
+        # Steps without transform at this frame are static, so each run of them is a cached static transform
         t_4x4 = np.identity(4, dtype=float)
-        for counter, value in enumerate(chain):
-            # e.g. a) result = {("cam_left", "velo_top"), ("velo_top", "vehicle-iso8855")}
-            # e.g. b) result = {("vehicle-iso8855", "velo_top"), ("velo_top", "cam_left")}
-            if counter == len(chain) - 1:
-                break
-            cs_1 = chain[counter]
-            cs_2 = chain[counter + 1]
-
+        run_start = 0
+        for counter, (cs_1, cs_2) in enumerate(zip(chain[:-1], chain[1:])):
             t_name = cs_1 + "_to_" + cs_2
             t_name_inv = cs_2 + "_to_" + cs_1
 
             # NOTE: this entire function works under the consensus that pose_src_wrt_dst = transform_src_to_dst, using
             # alias rotation of coordinate systems and linear 4x4
-            if frameNum is None:
-                # No frame info, let's read from coordinate_system poses
-                # Check if this edge is from child to parent or viceversa
-                if cs_2 == self.vcd.data['vcd']['coordinate_systems'][cs_1]['parent']:
-                    t_4x4 = (
-                        np.array([self.vcd.data['vcd']['coordinate_systems'][cs_1]['pose_wrt_parent']]).reshape(4, 4)).dot(
-                        t_4x4)
-                elif cs_1 == self.vcd.data['vcd']['coordinate_systems'][cs_2]['parent']:
-                    temp = np.array([self.vcd.data['vcd']['coordinate_systems'][cs_2]['pose_wrt_parent']])
-                    t_4x4 = utils.inv(temp.reshape(4, 4)).dot(t_4x4)
+            if t_name in transforms:
+                transform = transforms[t_name]
+                t_step = np.array(transform['transform_src_to_dst_4x4'], dtype=float).reshape(4, 4)
+            elif t_name_inv in transforms:
+                transform = transforms[t_name_inv]
+                t_step = utils.inv(np.array(transform['transform_src_to_dst_4x4'], dtype=float).reshape(4, 4))
             else:
-                # So the user has asked for a specific frame, let's look for this frame if a transform exist
-                transform_at_this_frame = False
-                if frameNum in self.vcd.data['vcd']['frames']:
-                    if 'frame_properties' in self.vcd.data['vcd']['frames'][frameNum]:
-                        if 'transforms' in self.vcd.data['vcd']['frames'][frameNum]['frame_properties']:
-                            if t_name in self.vcd.data['vcd']['frames'][frameNum]['frame_properties']['transforms']:
-                                transform = self.vcd.data['vcd']['frames'][frameNum]['frame_properties']['transforms'][t_name]
-                                t_4x4 = (np.array([transform['transform_src_to_dst_4x4']]).reshape(4, 4)).dot(t_4x4)
-                                static = False  # with one non-static step the entire chain can be considered not static
-                                transform_at_this_frame = True
-                            elif t_name_inv in self.vcd.data['vcd']['frames'][frameNum]['frame_properties']['transforms']:
-                                transform = self.vcd.data['vcd']['frames'][frameNum]['frame_properties']['transforms'][
-                                    t_name_inv]
-                                temp = np.array([transform['transform_src_to_dst_4x4']])
-                                t_4x4 = utils.inv(temp.reshape(4, 4)).dot(t_4x4)
-                                static = False
-                                transform_at_this_frame = True
-                if not transform_at_this_frame:
-                    # Reached this point means no transforms were defined at the requested frameNum
-                    # Check if this edge is from child to parent or viceversa
-                    if cs_2 == self.vcd.data['vcd']['coordinate_systems'][cs_1]['parent']:
-                        t_4x4 = (np.array([self.vcd.data['vcd']['coordinate_systems'][cs_1]['pose_wrt_parent']]).reshape(4,
-                                                                                                                    4)).dot(
-                            t_4x4)
-                    elif cs_1 == self.vcd.data['vcd']['coordinate_systems'][cs_2]['parent']:
-                        temp = np.array([self.vcd.data['vcd']['coordinate_systems'][cs_2]['pose_wrt_parent']])
-                        t_4x4 = utils.inv(temp.reshape(4, 4)).dot(t_4x4)
-
-        return t_4x4, static
+                continue
+            t_4x4 = t_step.dot(self.__get_static_transform(chain[run_start], cs_1).dot(t_4x4))
+            run_start = counter + 1
+            static = False  # with one non-static step the entire chain can be considered not static
+        t_4x4 = self.__get_static_transform(chain[run_start], chain[-1]).dot(t_4x4)
+
+        self.__frame_transforms[key] = (version, t_4x4, static)
+        if len(self.__frame_transforms) > TRANSFORM_CACHE_SIZE:
+            self.__frame_transforms.popitem(last=False)
+        return t_4x4.copy(), static
+
+    def get_transforms(self, cs_src, cs_dst, frame_intervals):
+        """
+        Batched version of get_transform, for all the frames of frame_intervals. Transform steps are read for each
+        frame, but matrices are composed (and inverted) with vectorised operations.
+        :param cs_src: source coordinate frame (e.g. "CAM_LEFT", or "WORLD")
+        :param cs_dst: destination coordinate frame (e.g. "VELO", or "CAM_LEFT")
+        :param frame_intervals: frames where to look for specific transform steps (e.g. (0, 100), [(0, 10), (20, 30)]
+        or a FrameIntervals)
+        :return: 4x4xN array of transforms, for the N frames in increasing order, and array of N booleans that
+        specifies if each transform is static or not
+        """
+        assert (self.vcd.has_coordinate_system(cs_src))
+        assert (self.vcd.has_coordinate_system(cs_dst))
+
+        if not isinstance(frame_intervals, core.FrameIntervals):
+            frame_intervals = core.FrameIntervals(frame_intervals)
+        frame_nums = [f for fi in frame_intervals.get() for f in range(fi[0], fi[1] + 1)]
+        n = len(frame_nums)
+        static_n = np.ones(n, dtype=bool)
+        t_nx4x4 = np.tile(np.identity(4, dtype=float), (n, 1, 1))
+        if cs_src == cs_dst or n == 0:
+            return np.moveaxis(t_nx4x4, 0, 2), static_n
+
+        # Transforms at each frame
+        frames_transforms = []
+        for f in frame_nums:
+            frame = self.vcd.get_frame(f)
+            transforms = None
+            if frame is not None:
+                transforms = frame.get('frame_properties', dict()).get('transforms')
+            frames_transforms.append(transforms or dict())
+
+        chain = self.__get_transform_chain(cs_src, cs_dst)
+        for cs_1, cs_2 in zip(chain[:-1], chain[1:]):
+            t_name = cs_1 + "_to_" + cs_2
+            t_name_inv = cs_2 + "_to_" + cs_1
+            idx = []
+            idx_inv = []
+            values = []
+            values_inv = []
+            for i, transforms in enumerate(frames_transforms):
+                if t_name in transforms:
+                    idx.append(i)
+                    values.append(transforms[t_name]['transform_src_to_dst_4x4'])
+                elif t_name_inv in transforms:
+                    idx_inv.append(i)
+                    values_inv.append(transforms[t_name_inv]['transform_src_to_dst_4x4'])
+
+            if len(idx) + len(idx_inv) == 0:
+                # Static step for all frames
+                t_nx4x4 = np.matmul(self.__get_static_step(cs_1, cs_2), t_nx4x4)
+                continue
+            if len(idx) + len(idx_inv) < n:
+                steps_nx4x4 = np.tile(self.__get_static_step(cs_1, cs_2), (n, 1, 1))
+            else:
+                steps_nx4x4 = np.empty((n, 4, 4), dtype=float)
+            if idx:
+                steps_nx4x4[idx] = np.array(values, dtype=float).reshape(-1, 4, 4)
+            if idx_inv:
+                steps_nx4x4[idx_inv] = np.linalg.inv(np.array(values_inv, dtype=float).reshape(-1, 4, 4))
+            static_n[idx] = False
+            static_n[idx_inv] = False
+            t_nx4x4 = np.matmul(steps_nx4x4, t_nx4x4)
+
+        return np.moveaxis(t_nx4x4, 0, 2), static_n
+
+    def transform_points3d_4xN_frames(self, points3d_4xN, frame_nums, cs_src, cs_dst):
+        """
+        Transforms 3D points which belong to different frames (e.g. the positions of an object along a trajectory),
+        each one with the transform of its frame, in a single batched call (see get_transforms).
+        :param points3d_4xN: array of 4xN 3D points in cs_src coordinate system
+        :param frame_nums: sequence of N frame numbers, one for each point
+        :return: array of 4xN 3D points in cs_dst coordinate system
+        """
+        frame_nums = np.asarray(frame_nums, dtype=int)
+        if frame_nums.size == 0:
+            return np.array([])
+        frames_unique, frame_index = np.unique(frame_nums, return_inverse=True)
+        t_4x4xF, static = self.get_transforms(cs_src, cs_dst, [(int(f), int(f)) for f in frames_unique])
+        return np.einsum('ijn,jn->in', t_4x4xF[:, :, frame_index], points3d_4xN)
 
     def transform_points3d_4xN(self, points3d_4xN, cs_src, cs_dst, frameNum=None):
         transform_src_dst, static = self.get_transform(cs_src, cs_dst, frameNum)
@@ -1017,15 +1071,14 @@ class CameraPinhole(Camera):
         if self.is_distorted():
             if not self.is_fisheye:
                 if self.r_limit is not None:
-                    for i in range(0, N):
-                        if idx_valid[i]:  # ignore those already filtered
-                            xp = rays3d_3xN[0, i] / rays3d_3xN[2, i]  # this is x'=x/z as in opencv docs
-                            yp = rays3d_3xN[1, i] / rays3d_3xN[2, i]  # this is y'=y/z
-                            r = np.sqrt(xp * xp + yp * yp)
+                    # Points already filtered are nan, so they are not selected
+                    xp = rays3d_3xN[0, :] / rays3d_3xN[2, :]  # this is x'=x/z as in opencv docs
+                    yp = rays3d_3xN[1, :] / rays3d_3xN[2, :]  # this is y'=y/z
+                    r = np.sqrt(xp * xp + yp * yp)
 
-                            if r >= self.r_limit * 0.8:  # 0.8 to also remove very close to limit
-                                idx_valid[i] = False
-                                rays3d_3xN[:, i] = np.nan
+                    idx_outside = r >= self.r_limit * 0.8  # 0.8 to also remove very close to limit
+                    idx_valid[idx_outside] = False
+                    rays3d_3xN[:, idx_outside] = np.nan
 
             if apply_distortion:
                 # Now distort (only non-nans)
@@ -1075,37 +1128,12 @@ class CameraPinhole(Camera):
         N = points2d_und_3xN.shape[1]
         if N == 0:
             return np.array([[]]), []
-        idx_valid = [True] * N
 
         # Get ray 3D (expressed in camera coordinate system)
         rays3d_3xN = self.get_rays3d(points2d_und_3xN, self.K_und_3x3)
 
-        # Use Plucker intersection line-plane
-        # Create Plucker line using 2 points: origin of camera and origin of camera + ray
-        P1 = np.vstack((0, 0, 0, 1))
-        P2array = np.vstack((rays3d_3xN, np.ones((1, N))))
-        # Plane equation in plucker coordinates (wrt to world)
-        P = np.asarray(plane_cs).reshape(4, 1)
-        # Line equation in plucker coordinates
-        p3dNx4 = np.array([])
-        count = 0
-        for P2 in P2array.T:
-            P2 = P2.reshape(4, 1)
-            L = np.matmul(P1, np.transpose(P2)) - np.matmul(P2, np.transpose(P1))
-            # Intersection is a 3D point
-            p3Dlcs = np.matmul(L, P)
-            if p3Dlcs[3][0] != 0:
-                p3Dlcs /= p3Dlcs[3][0]  # homogeneous
-            else:
-                # This is an infinite point: return direction vector instead
-                norm = np.linalg.norm(p3Dlcs[:3][0])
-                p3Dlcs /= norm
-                idx_valid[count] = False
-            p3dNx4 = np.append(p3dNx4, p3Dlcs)
-            count += 1
-        p3dNx4 = p3dNx4.reshape(p3dNx4.shape[0] // 4, 4)
-        p3d_4xN = np.transpose(p3dNx4)
-        return p3d_4xN, idx_valid
+        # Use Plucker intersection line-plane, for all the rays at once (infinite points are not valid)
+        return utils.intersect_rays3d_plane(rays3d_3xN, plane_cs)
 
 
 class CameraFisheye(Camera):
@@ -1427,7 +1455,6 @@ class CameraFisheye(Camera):
         N = points2d_3xN.shape[1]
         if N == 0:
             return np.array([[]]), []
-        idx_valid = [True] * N
 
         # Undistort rays
         if apply_undistorsion:
@@ -1439,29 +1466,5 @@ class CameraFisheye(Camera):
             rays3d_dist_3xN = utils.inv(self.K_und_3x3).dot(points2d_3xN)
             rays3d_3xN = rays3d_dist_3xN
 
-        # Use Plucker intersection line-plane
-        # Create Plucker line using 2 points: origin of camera and origin of camera + ray
-        P1 = np.vstack((0, 0, 0, 1))
-        P2array = np.vstack((rays3d_3xN, np.ones((1, N))))
-        # Plane equation in plucker coordinates (wrt to world)
-        P = np.asarray(plane_cs).reshape(4, 1)
-        # Line equation in plucker coordinates
-        p3dNx4 = np.array([])
-        count = 0
-        for P2 in P2array.T:
-            P2 = P2.reshape(4, 1)
-            L = np.matmul(P1, np.transpose(P2)) - np.matmul(P2, np.transpose(P1))
-            # Intersection is a 3D point
-            p3Dlcs = np.matmul(L, P)
-            if p3Dlcs[3][0] != 0:
-                p3Dlcs /= p3Dlcs[3][0]  # homogeneous
-            else:
-                # This is an infinite point: return direction vector instead
-                norm = np.linalg.norm(p3Dlcs[:3][0])
-                p3Dlcs /= norm
-                idx_valid[count] = False
-            p3dNx4 = np.append(p3dNx4, p3Dlcs)
-            count += 1
-        p3dNx4 = p3dNx4.reshape(p3dNx4.shape[0] // 4, 4)
-        p3d_4xN = np.transpose(p3dNx4)
-        return p3d_4xN, idx_valid
+        # Use Plucker intersection line-plane, for all the rays at once (infinite points are not valid)
+        return utils.intersect_rays3d_plane(rays3d_3xN, plane_cs)
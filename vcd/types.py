@@ -13,6 +13,7 @@ VCD is distributed under MIT License. See LICENSE.
 
 from builtins import bool
 from enum import Enum
+import numpy as np
 import vcd.poly2d as poly
 
 
@@ -252,20 +253,14 @@ class boolean(ObjectData):
 class poly2d(ObjectDataGeometry):
     def __init__(self, name, val, mode, closed, hierarchy=None, coordinate_system=None, properties=None):
         ObjectDataGeometry.__init__(self, name, coordinate_system, properties)
-        assert (isinstance(val, (tuple, list)))
+        assert (isinstance(val, (tuple, list, np.ndarray)))
         assert(isinstance(mode, Poly2DType))
         assert(isinstance(closed, bool))
-        if isinstance(val, tuple) or isinstance(val, list):
-            if mode == Poly2DType.MODE_POLY2D_SRF6DCC:
-                srf6, xinit, yinit = poly.computeSRF6DCC(val)
-                encoded_poly, rest = poly.chainCodeBase64Encoder(srf6, 3)
-                self.data['val'] = [str(xinit), str(yinit), str(rest), encoded_poly]
-            elif mode == Poly2DType.MODE_POLY2D_RS6FCC:
-                rs6, low, high, xinit, yinit = poly.computeRS6FCC(val)
-                encoded_poly, rest = poly.chainCodeBase64Encoder(rs6, 3)
-                self.data['val'] = [str(xinit), str(yinit), str(low), str(high), str(rest), encoded_poly]
-            else:
-                self.data['val'] = list(val)
+        if isinstance(val, np.ndarray):
+            # Nx2 or flat arrays, kept as an array (a copy, so later changes of val don't modify this poly2d) in
+            # MODE_POLY2D_ABSOLUTE
+            val = np.array(val, copy=True).reshape(-1)
+        self.data['val'] = poly.encodePolygon(val, mode)
         self.data['mode'] = mode.name
         self.data['closed'] = closed
         self.type = ObjectDataType.poly2d
@@ -278,12 +273,17 @@ class poly2d(ObjectDataGeometry):
 class poly3d(ObjectDataGeometry):
     def __init__(self, name, val, closed, coordinate_system=None, properties=None):
         ObjectDataGeometry.__init__(self, name, coordinate_system, properties)
-        assert (isinstance(val, (tuple, list)))
+        assert (isinstance(val, (tuple, list, np.ndarray)))
         assert (isinstance(closed, bool))
         if isinstance(val, tuple):
             self.data['val'] = val
         elif isinstance(val, list):
             self.data['val'] = tuple(val)
+        else:
+            # Nx3 or flat arrays are kept as a flat copy, so later changes of val don't modify this poly3d, see
+            # get_poly3d_array
+            assert (val.size % 3 == 0)
+            self.data['val'] = np.array(val, copy=True).reshape(-1)
         self.data['closed'] = closed
         self.type = ObjectDataType.poly3d
 
@@ -333,16 +333,22 @@ class image(ObjectData):
 class mat(ObjectData):
     def __init__(self, name, val, channels, width, height, dataType, coordinate_system=None, properties=None):
         ObjectData.__init__(self, name, coordinate_system, properties)
-        assert (isinstance(val, (tuple, list)))
+        assert (isinstance(val, (tuple, list, np.ndarray)))
         assert(isinstance(width, int))
         assert (isinstance(height, int))
         assert (isinstance(channels, int))
         assert(isinstance(dataType, str))
-        assert (len(val) == width * height * channels)
         if isinstance(val, tuple):
+            assert (len(val) == width * height * channels)
             self.data['val'] = val
         elif isinstance(val, list):
+            assert (len(val) == width * height * channels)
             self.data['val'] = tuple(val)
+        else:
+            # Arrays of any shape (e.g. 4xN points) are kept as a flat copy, so later changes of val don't modify
+            # this mat, see get_mat_array
+            assert (val.size == width * height * channels)
+            self.data['val'] = np.array(val, copy=True).reshape(-1)
         self.data['channels'] = channels
         self.data['width'] = width
         self.data['height'] = height
@@ -365,11 +371,14 @@ class binary(ObjectData):
 class vec(ObjectData):
     def __init__(self, name, val, coordinate_system=None, properties=None):
         ObjectData.__init__(self, name, coordinate_system, properties)
-        assert (isinstance(val, (tuple, list)))
+        assert (isinstance(val, (tuple, list, np.ndarray)))
         if isinstance(val, tuple):
             self.data['val'] = val
         elif isinstance(val, list):
             self.data['val'] = tuple(val)
+        else:
+            # Kept as a flat copy, see get_vec_array
+            self.data['val'] = np.array(val, copy=True).reshape(-1)
         self.type = ObjectDataType.vec
 
 
@@ -525,3 +534,44 @@ class mesh(ObjectDataGeometry):
         result = result.replace(",]", "]")
 
         return result
+
+
+####################################################
+# Numeric content as numpy arrays
+####################################################
+# The val of mat, vec, poly3d and poly2d (in MODE_POLY2D_ABSOLUTE) can be numpy arrays, which are written as JSON
+# arrays. These functions return the val of the object data (the types.ObjectData, or its data, e.g. as returned
+# by core.VCD.get_object_data) as an array, without copy if it is already an array, and as a new array otherwise
+# (e.g. if loaded from a file).
+def get_mat_array(mat):
+    """
+    Returns the val of a mat as an array of shape (height, width), or (height, width, channels) if it has more
+    than one channel (e.g. 4xN for points3d_4xN).
+    """
+    data = getattr(mat, 'data', mat)
+    array = np.asarray(data['val'])
+    if data['channels'] == 1:
+        return array.reshape(data['height'], data['width'])
+    return array.reshape(data['height'], data['width'], data['channels'])
+
+
+def get_vec_array(vec):
+    data = getattr(vec, 'data', vec)
+    return np.asarray(data['val'])
+
+
+def get_poly3d_array(poly3d):
+    """
+    Returns the val of a poly3d as an array of shape (N, 3).
+    """
+    data = getattr(poly3d, 'data', poly3d)
+    return np.asarray(data['val']).reshape(-1, 3)
+
+
+def get_poly2d_array(poly2d):
+    """
+    Returns the points of a poly2d as an array of shape (N, 2). Encoded modes (e.g. MODE_POLY2D_RS6FCC) are
+    decoded into a new array.
+    """
+    data = getattr(poly2d, 'data', poly2d)
+    return np.asarray(poly.decodePolygon(data['val'], data['mode'])).reshape(-1, 2)
@@ -16,7 +16,7 @@ import numpy as np
 
 import math
 
-from bisect import bisect_left
+from bisect import bisect_left, bisect_right
 from enum import Enum
 
 ####################################################
@@ -196,15 +196,103 @@ def fuse_frame_intervals(frame_intervals):
     if num_fis == 1:
         return frame_intervals
 
-    # Read first element
-    frame_intervals_fused = [frame_intervals[0]]
-    i = 1
-    while i < num_fis:
-        frame_intervals_fused = fuse_frame_interval_dict(frame_intervals[i], frame_intervals_fused)
-        i += 1
+    # Sort and fuse in a single pass
+    fis_tuples = fuse_frame_interval_tuples(as_frame_intervals_array_tuples(frame_intervals))
+    return as_frame_intervals_array_dict(fis_tuples)
 
-    frame_intervals_fused_sorted = sort_frame_intervals(frame_intervals_fused)
-    return frame_intervals_fused_sorted
+
+def fuse_frame_interval_tuples(frame_intervals):
+    # Sorts a list of (frame_start, frame_end) tuples and fuses overlapping or consecutive ones
+    # e.g. input: [(8, 10), (0, 5), (3, 6)] output: [(0, 6), (8, 10)]
+    fis_sorted = sorted(frame_intervals)
+    fis_fused = []
+    for fi in fis_sorted:
+        if fis_fused and fi[0] <= fis_fused[-1][1] + 1:
+            if fi[1] > fis_fused[-1][1]:
+                fis_fused[-1] = (fis_fused[-1][0], fi[1])
+        else:
+            fis_fused.append((fi[0], fi[1]))
+    return fis_fused
+
+
+def union_sorted_frame_intervals(fis_a, fis_b):
+    # Linear merge of two sorted and fused lists of (frame_start, frame_end) tuples
+    fis_union = []
+    i = 0
+    j = 0
+    while i < len(fis_a) or j < len(fis_b):
+        if j == len(fis_b) or (i < len(fis_a) and fis_a[i][0] <= fis_b[j][0]):
+            fi = fis_a[i]
+            i += 1
+        else:
+            fi = fis_b[j]
+            j += 1
+        if fis_union and fi[0] <= fis_union[-1][1] + 1:
+            if fi[1] > fis_union[-1][1]:
+                fis_union[-1] = (fis_union[-1][0], fi[1])
+        else:
+            fis_union.append(fi)
+    return fis_union
+
+
+def intersection_sorted_frame_intervals(fis_a, fis_b):
+    # Linear sweep over two sorted and fused lists of (frame_start, frame_end) tuples
+    fis_int = []
+    i = 0
+    j = 0
+    while i < len(fis_a) and j < len(fis_b):
+        max_start_val = max(fis_a[i][0], fis_b[j][0])
+        min_end_val = min(fis_a[i][1], fis_b[j][1])
+        if max_start_val <= min_end_val:
+            fis_int.append((max_start_val, min_end_val))
+        if fis_a[i][1] < fis_b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return fis_int
+
+
+def difference_sorted_frame_intervals(fis_a, fis_b):
+    # Linear sweep returning the frames of fis_a which are not in fis_b, both sorted and fused lists of tuples
+    fis_diff = []
+    j = 0
+    for fi in fis_a:
+        frame_start = fi[0]
+        while j < len(fis_b) and fis_b[j][1] < frame_start:
+            j += 1
+        k = j
+        while k < len(fis_b) and fis_b[k][0] <= fi[1]:
+            if fis_b[k][0] > frame_start:
+                fis_diff.append((frame_start, fis_b[k][0] - 1))
+            frame_start = fis_b[k][1] + 1
+            k += 1
+        if frame_start <= fi[1]:
+            fis_diff.append((frame_start, fi[1]))
+    return fis_diff
+
+
+def insert_frame_interval(frame_interval, frame_intervals):
+    # Inserts a (frame_start, frame_end) tuple into a sorted and fused list of tuples, in place, fusing it with
+    # overlapping or consecutive intervals. Returns the slice (lo, hi) of the original list that has been substituted
+    # by the fused interval (now at position lo), so other representations of the same list can be patched
+    frame_start, frame_end = frame_interval
+    lo = bisect_right(frame_intervals, (frame_start - 1, math.inf)) - 1
+    if lo < 0 or frame_intervals[lo][1] < frame_start - 1:
+        lo += 1
+    hi = bisect_right(frame_intervals, (frame_end + 1, math.inf))
+    if lo < hi:
+        frame_start = min(frame_start, frame_intervals[lo][0])
+        frame_end = max(frame_end, frame_intervals[hi - 1][1])
+    frame_intervals[lo:hi] = [(frame_start, frame_end)]
+    return lo, hi
+
+
+def find_frame_interval(frame_num, frame_intervals):
+    # Returns the index of the interval of a sorted and fused list of tuples which contains frame_num, or -1
+    idx = bisect_right(frame_intervals, (frame_num, math.inf)) - 1
+    if idx >= 0 and frame_intervals[idx][1] >= frame_num:
+        return idx
+    return -1
 
 
 def get_frame_start(a):
@@ -338,11 +426,8 @@ def inv(m):
         return np.linalg.inv(m)
     else:
         assert(m.ndim == 3)  # so batch for N matrices
-        m_inv = np.zeros(m.shape, dtype=m.dtype)
-        n = m.shape[2]
-        for i in range(0, n):
-            m_inv[:, :, i] = np.linalg.inv(m[:, :, i])
-        return m_inv
+        # np.linalg.inv inverts stacks of matrices along the first axis
+        return np.moveaxis(np.linalg.inv(np.moveaxis(m, 2, 0)), 0, 2)
 
 
 def identity(dim):
@@ -692,6 +777,23 @@ def transform_plane(plane, T_ref_to_dst):
     return plane_transformed.flatten().tolist()
 
 
+def intersect_rays3d_plane(rays3d_3xN, plane):
+    # Intersection of the 3D rays from the origin (e.g. the optical center of a camera) with a plane (a, b, c, d)
+    # such that ax + by + cz + d = 0. This is the closed form of the Plucker formulation L = P1 P2^T - P2 P1^T with
+    # P1 = (0, 0, 0, 1) and P2 = (ray, 1), whose intersection with the plane is L * plane = (-d * ray, n * ray)
+    # Returns the 3D points as 4xN array in homogeneous coordinates, and the array of booleans of valid points
+    # Rays parallel to the plane produce infinite points: their direction vector is returned and they are not valid
+    plane = np.asarray(plane, dtype=float).flatten()
+    w = plane[0:3].dot(rays3d_3xN)
+    points3d_4xN = np.vstack((-plane[3] * rays3d_3xN, w))
+    idx_valid = w != 0
+    points3d_4xN[:, idx_valid] /= w[idx_valid]
+    if not np.all(idx_valid):
+        norms = np.linalg.norm(points3d_4xN[0:3, ~idx_valid], axis=0)
+        points3d_4xN[:, ~idx_valid] /= np.where(norms != 0, norms, 1)
+    return points3d_4xN, idx_valid
+
+
 def generate_cuboid_points_object_4x8(sx, sy, sz):
     points_cuboid_4x8 = np.array([[-sx / 2, -sx / 2, sx / 2, sx / 2, -sx / 2, -sx / 2, sx / 2, sx / 2],
                                   [sy / 2, -sy / 2, -sy / 2, sy / 2, sy / 2, -sy / 2, -sy / 2, sy / 2],
@@ -0,0 +1,152 @@
+"""
+VCD (Video Content Description) library v4.3.1
+
+Project website: http://vcd.vicomtech.org
+
+Copyright (C) 2021, Vicomtech (http://www.vicomtech.es/),
+(Spain) all rights reserved.
+
+VCD is a Python library to create and manage VCD content version 4.3.1.
+VCD is distributed under MIT License. See LICENSE.
+
+"""
+
+import numpy as np
+from jsonschema import validators
+from jsonschema.exceptions import ValidationError, best_match
+
+import vcd.schema as schema
+
+ELEMENT_TYPES = ['object', 'action', 'event', 'context', 'relation']
+
+# Compiled validators, by id of the schema and definition (the schema is kept with its validator, so the id is
+# not reused)
+_validators = dict()
+
+
+####################################################
+# Schema validation
+####################################################
+def _is_array(checker, instance):
+    # Content in memory can contain tuples (e.g. the val of a bbox) and numpy arrays (e.g. the val of a mat), which
+    # are written as JSON arrays
+    return isinstance(instance, (list, tuple, np.ndarray))
+
+
+def _with_str_keys(keyword_validator):
+    # Content in memory can have int keys (e.g. frame numbers, or the points of a mesh), written as strings in JSON
+    def wrapped(validator, value, instance, vcd_schema):
+        if isinstance(instance, dict) and not all(isinstance(key, str) for key in instance):
+            instance = {str(key): val for key, val in instance.items()}
+        return keyword_validator(validator, value, instance, vcd_schema)
+    return wrapped
+
+
+def get_validator(vcd_schema=None, definition=None):
+    """
+    Returns the validator of vcd_schema (schema.vcd_schema by default), or of one of its definitions (e.g. 'frame'
+    or 'object'). The schema is checked and the validator is compiled only once per process.
+    """
+    if vcd_schema is None:
+        vcd_schema = schema.vcd_schema
+    entry = _validators.get((id(vcd_schema), definition))
+    if entry is None or entry[0] is not vcd_schema:
+        if definition is None:
+            cls = validators.validator_for(vcd_schema)
+            cls.check_schema(vcd_schema)
+            keyword_validators = {keyword: _with_str_keys(cls.VALIDATORS[keyword])
+                                  for keyword in ['patternProperties', 'additionalProperties']}
+            cls = validators.extend(cls, validators=keyword_validators,
+                                    type_checker=cls.TYPE_CHECKER.redefine('array', _is_array))
+            validator = cls(vcd_schema)
+        else:
+            if definition not in vcd_schema.get('definitions', dict()):
+                raise Exception("ERROR: The schema has no definition " + str(definition))
+            # The definition is referenced, so its own references are resolved within vcd_schema
+            validator = get_validator(vcd_schema).evolve(schema={'$ref': '#/definitions/' + definition})
+        entry = (vcd_schema, validator)
+        _validators[(id(vcd_schema), definition)] = entry
+    return entry[1]
+
+
+def validate(data, vcd_schema=None):
+    """
+    Validates a VCD dict, as it is in memory (e.g. with int frame numbers), against vcd_schema.
+    Raises a jsonschema ValidationError, like jsonschema.validate, if it is not valid.
+    """
+    error = best_match(get_validator(vcd_schema).iter_errors(data))
+    if error is not None:
+        raise error
+
+
+def validate_frame(frame, vcd_schema=None):
+    """
+    Validates a single frame against the 'frame' definition of vcd_schema, in O(frame) time, e.g. to validate
+    frames as they are written, instead of the whole content at the end.
+    """
+    error = best_match(get_validator(vcd_schema, 'frame').iter_errors(frame))
+    if error is not None:
+        raise error
+
+
+def validate_element(element_type_name, element, vcd_schema=None):
+    """
+    Validates a single element (e.g. element_type_name='object') against its definition in vcd_schema.
+    """
+    error = best_match(get_validator(vcd_schema, element_type_name).iter_errors(element))
+    if error is not None:
+        raise error
+
+
+####################################################
+# Structural validation
+####################################################
+def _check_frame_intervals(frame_intervals, path):
+    if not isinstance(frame_intervals, list):
+        raise ValidationError(path + " is not a list")
+    for fi in frame_intervals:
+        if not isinstance(fi, dict) or not isinstance(fi.get('frame_start'), int) \
+                or not isinstance(fi.get('frame_end'), int) or fi['frame_start'] > fi['frame_end']:
+            raise ValidationError(path + " contains an invalid frame interval: " + str(fi))
+
+
+def validate_frame_structure(vcd, frame_num, frame):
+    """
+    Fast structural check of a frame of vcd (the 'vcd' entry of a VCD dict), see validate_structure.
+    """
+    if not isinstance(frame, dict) or not str(frame_num).isdigit():
+        raise ValidationError("Frame " + str(frame_num) + " must be a dict with a non-negative frame number")
+    for element_type in ELEMENT_TYPES:
+        if element_type + 's' not in frame:
+            continue
+        elements = vcd.get(element_type + 's', dict())
+        for uid, element in frame[element_type + 's'].items():
+            if uid not in elements or not isinstance(element, dict):
+                raise ValidationError(element_type + " " + str(uid) + " at frame " + str(frame_num) +
+                                      " is not declared at the root")
+
+
+def validate_structure(data):
+    """
+    Fast check of the main structural invariants of a VCD dict, much cheaper than the full schema validation:
+    the root entries, the frame intervals, the required fields of the elements, and that elements at frames are
+    dicts of elements declared at the root. Raises a jsonschema ValidationError if any is broken.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('vcd'), dict) or len(data) != 1:
+        raise ValidationError("The VCD content must be a dict with a single 'vcd' entry")
+    vcd = data['vcd']
+    if 'schema_version' not in vcd.get('metadata', dict()):
+        raise ValidationError("'metadata' has no 'schema_version'")
+    if 'frame_intervals' in vcd:
+        _check_frame_intervals(vcd['frame_intervals'], "'frame_intervals'")
+
+    for element_type in ELEMENT_TYPES:
+        for uid, element in vcd.get(element_type + 's', dict()).items():
+            if not isinstance(element, dict) or not isinstance(element.get('name'), str) \
+                    or not isinstance(element.get('type'), str):
+                raise ValidationError(element_type + " " + str(uid) + " must be a dict with 'name' and 'type'")
+            if 'frame_intervals' in element:
+                _check_frame_intervals(element['frame_intervals'], element_type + " " + str(uid))
+
+    for frame_num, frame in vcd.get('frames', dict()).items():
+        validate_frame_structure(vcd, frame_num, frame)